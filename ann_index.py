@@ -0,0 +1,171 @@
+"""
+Approximate maximum-inner-product (MIPS) index over the FunkSVD item factors
+
+Ranking items for a user only depends on item_bias + user·item, so each item
+becomes x = [item_factors, item_bias] and each query q = [user_factors, 1].
+The MIPS → nearest-neighbour transform appends sqrt(M² - |x|²) to items
+(and 0 to queries), after which an IVF (inverted file) index partitions the
+items with k-means. A query scores only the items in the `n_probe` lists whose
+centroids have the largest inner product with it, so cost grows with
+n_probe/n_lists instead of the catalogue size.
+
+Build (writes ann_index.npz next to the model and prints recall@k):
+    python ann_index.py --lists 64 --probe 8
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from artifacts import ROOT_DIR, load_model, model_fingerprint
+
+ANN_INDEX_FILE = "ann_index.npz"
+
+
+def augment_items(item_factors: np.ndarray, item_bias: np.ndarray) -> tuple:
+    """Return (x, x_aug): [factors, bias] and the MIPS→L2 augmented vectors"""
+    x = np.hstack([item_factors, item_bias[:, None]]).astype(np.float32)
+    sq_norms = (x ** 2).sum(axis=1)
+    extra = np.sqrt(np.maximum(sq_norms.max() - sq_norms, 0))
+    return x, np.hstack([x, extra[:, None]]).astype(np.float32)
+
+
+def kmeans(points: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 42,
+           block: int = 16384) -> tuple:
+    """Plain Lloyd's k-means; returns (centroids, assignments)"""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), n_clusters, replace=False)].copy()
+    assign = np.zeros(len(points), dtype=np.int32)
+
+    for _ in range(n_iter):
+        c_sq = (centroids ** 2).sum(axis=1)
+        for start in range(0, len(points), block):
+            chunk = points[start:start + block]
+            assign[start:start + block] = np.argmin(c_sq[None, :] - 2 * chunk @ centroids.T, axis=1)
+
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assign, points)
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(np.float32)
+        # Re-seed empty lists with random points so every list stays usable
+        centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+
+    return centroids, assign
+
+
+class IVFIndex:
+    """Inverted-file MIPS index; list members are stored contiguously for cheap probing"""
+
+    def __init__(self, centroids, offsets, list_items, list_vectors, n_probe=8, fingerprint=""):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.list_items = list_items
+        self.list_vectors = list_vectors
+        self.n_probe = int(n_probe)
+        self.fingerprint = str(fingerprint)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, item_factors, item_bias, n_lists=None, n_probe=None, n_iter=20, seed=42):
+        x, x_aug = augment_items(item_factors, item_bias)
+        n_lists = n_lists or max(1, int(np.sqrt(len(x))))
+        n_probe = n_probe or max(1, n_lists // 8)
+        centroids, assign = kmeans(x_aug, n_lists, n_iter, seed)
+
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+        return cls(centroids, offsets, order.astype(np.int32), x[order], n_probe,
+                   model_fingerprint(item_factors, item_bias))
+
+    def save(self, path: str):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, list_items=self.list_items,
+                     list_vectors=self.list_vectors, n_probe=self.n_probe, fingerprint=self.fingerprint)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            return cls(f["centroids"], f["offsets"], f["list_items"], f["list_vectors"],
+                       int(f["n_probe"]), str(f["fingerprint"]))
+
+    def candidates(self, user_vector: np.ndarray, n_probe: int = None) -> tuple:
+        """Item indices and partial scores (item_bias + user·item) in the probed lists"""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        q = np.append(user_vector, 1.0).astype(np.float32)
+
+        # Probe lists by inner product with the centroid (query's extra coordinate is 0).
+        # Dropping the |c|² term of the L2 distance gives noticeably better recall here.
+        affinity = self.centroids[:, :-1] @ q
+        probe = np.argpartition(-affinity, n_probe - 1)[:n_probe] if n_probe < self.n_lists else np.arange(self.n_lists)
+
+        spans = [slice(self.offsets[c], self.offsets[c + 1]) for c in probe]
+        items = np.concatenate([self.list_items[s] for s in spans])
+        scores = np.concatenate([self.list_vectors[s] @ q for s in spans])
+        return items, scores
+
+    def search(self, user_vector: np.ndarray, k: int, n_probe: int = None, exclude: np.ndarray = None,
+               allowed: np.ndarray = None) -> tuple:
+        """Approximate top-k (item indices, partial scores), best first; `allowed` is an optional item mask"""
+        items, scores = self.candidates(user_vector, n_probe)
+        if allowed is not None:
+            keep = allowed[items]
+            items, scores = items[keep], scores[keep]
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(items, exclude)
+            items, scores = items[keep], scores[keep]
+        k = min(k, len(items))
+        if k == 0:
+            return items, scores
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return items[top], scores[top]
+
+    def memory_bytes(self) -> int:
+        return sum(a.nbytes for a in (self.centroids, self.offsets, self.list_items, self.list_vectors))
+
+
+def recall_at_k(index: IVFIndex, user_factors, item_factors, item_bias, k=10, n_probe=None,
+                n_users=500, seed=0) -> float:
+    """Mean overlap between ANN top-k and exact top-k on a sample of users"""
+    rng = np.random.default_rng(seed)
+    users = rng.choice(len(user_factors), min(n_users, len(user_factors)), replace=False)
+    recalls = []
+    for u in users:
+        exact = item_bias + item_factors @ user_factors[u]
+        truth = np.argpartition(-exact, k - 1)[:k]
+        approx, _ = index.search(user_factors[u], k, n_probe)
+        recalls.append(len(np.intersect1d(truth, approx)) / k)
+    return float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the IVF MIPS index over item factors")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing funksvd_model.npz")
+    parser.add_argument("--lists", type=int, default=None, help="Number of IVF lists (default √items)")
+    parser.add_argument("--probe", type=int, default=None, help="Default lists probed per query")
+    parser.add_argument("--iters", type=int, default=20, help="k-means iterations")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for the recall report")
+    args = parser.parse_args()
+
+    model = load_model(args.root)
+    start = time.time()
+    index = IVFIndex.build(model["item_factors"], model["item_bias"], args.lists, args.probe, args.iters)
+    path = os.path.join(args.root, ANN_INDEX_FILE)
+    index.save(path)
+    print(f"✓ Built {index.n_lists} lists over {len(index.list_items):,} items in {time.time() - start:.1f}s → {path}")
+
+    for n_probe in sorted({1, max(1, index.n_probe // 2), index.n_probe, min(index.n_lists, index.n_probe * 2)}):
+        r = recall_at_k(index, model["user_factors"], model["item_factors"], model["item_bias"], args.k, n_probe)
+        print(f"  n_probe={n_probe:<4} recall@{args.k}={r:.4f}  (scans ~{n_probe / index.n_lists:.1%} of items)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional
-import pandas as pd
 import numpy as np
-import joblib
+import json
 import os
+import time
+import base64
+import threading
+import zlib
+from collections import OrderedDict
 from sqlalchemy import create_engine, Column, Integer, Float
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
 
 app = FastAPI(
     title="Movie Recommender API",
@@ -36,6 +41,65 @@ app.add_middleware(
 # Use environment variable or fallback to current directory
 ROOT_DIR = os.getenv("MODEL_PATH", os.path.dirname(os.path.abspath(__file__)))
 
+# Request log capture (disabled unless REQUEST_LOG_SAMPLE_RATE > 0)
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", os.path.join(ROOT_DIR, "requests.jsonl"))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0"))
+
+# Default scoring engine for personalized recommendations: "exact", "ann" or "cluster"
+RECOMMEND_ENGINE = os.getenv("RECOMMEND_ENGINE", "exact")
+
+# Switch /recommend to the user-cluster lists while more than this many requests are queued or running (0 = never)
+OVERLOAD_INFLIGHT = int(os.getenv("OVERLOAD_INFLIGHT", "0"))
+
+# Serve known users from materialized_items.npy when it matches the model (see materialize.py)
+USE_MATERIALIZED = os.getenv("USE_MATERIALIZED", "1") == "1"
+
+# Re-ranking pipeline: candidates pulled for re-ranking, per-request latency budget and
+# the re-rankers applied when a request does not choose ("mmr,genre_cap"; empty = none)
+PIPELINE_CANDIDATES = int(os.getenv("PIPELINE_CANDIDATES", "200"))
+PIPELINE_BUDGET_MS = float(os.getenv("PIPELINE_BUDGET_MS", "50"))
+RERANKERS = os.getenv("RERANKERS", "")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+GENRE_CAP_FRACTION = float(os.getenv("GENRE_CAP_FRACTION", "0.4"))
+
+# Paginated /recommend: depth ranked once per (user, model, rating version) and LRU entries kept
+RANK_DEPTH = int(os.getenv("RANK_DEPTH", "500"))
+RANKED_CACHE_SIZE = int(os.getenv("RANKED_CACHE_SIZE", "1024"))
+
+# Users whose merged (training history + stored ratings) seen set is cached per worker
+SEEN_OVERLAY_USERS = int(os.getenv("SEEN_OVERLAY_USERS", "100000"))
+
+# Cross-worker cache (shared_cache.py) for /recommend results, fold-ins and popularity; 0 keeps the per-process LRU
+SHARED_CACHE_MB = int(os.getenv("SHARED_CACHE_MB", "0"))
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+SHARED_CACHE_TTL_S = float(os.getenv("SHARED_CACHE_TTL_S", "300"))
+SHARED_CACHE_POPULARITY_TTL_S = float(os.getenv("SHARED_CACHE_POPULARITY_TTL_S", "3600"))
+SHARED_CACHE_SLOT_KB = int(os.getenv("SHARED_CACHE_SLOT_KB", "8"))
+
+# Rating storage: "sqlite" (commit per /rate call) or "write_behind" (append log + group commit)
+RATING_STORE = os.getenv("RATING_STORE", "sqlite")
+RATING_FLUSH_MS = float(os.getenv("RATING_FLUSH_MS", "5"))
+RATING_FLUSH_ROWS = int(os.getenv("RATING_FLUSH_ROWS", "1000"))
+# Split user ratings over N SQLite files by user_id hash (1 = data/user_ratings.db only; see reshard.py)
+RATING_SHARDS = int(os.getenv("RATING_SHARDS", "1"))
+
+# Append every /rate event to the segmented binary log (see event_log.py); 0 disables
+RATING_EVENTS = os.getenv("RATING_EVENTS", "1") == "1"
+RATING_EVENTS_SEGMENT_MB = int(os.getenv("RATING_EVENTS_SEGMENT_MB", "64"))
+RATING_EVENTS_SEGMENT_S = float(os.getenv("RATING_EVENTS_SEGMENT_S", "300"))
+
+# POST /ratings/bulk: accepted rows per upsert transaction and rejects listed in the response
+BULK_BATCH_ROWS = int(os.getenv("BULK_BATCH_ROWS", "50000"))
+BULK_MAX_REJECTS = int(os.getenv("BULK_MAX_REJECTS", "1000"))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", "4096"))
+
+# /export/*: rows per keyset page (one short read query each) and users ranked per streamed chunk
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", "10000"))
+EXPORT_USERS_PER_PAGE = int(os.getenv("EXPORT_USERS_PER_PAGE", "256"))
+
+# Neighbours kept per movie in the "more like this" table
+NEIGHBORS_K = int(os.getenv("NEIGHBORS_K", "50"))
+
 # NOTE: Skip validation in Docker - files are in same directory as app.py
 # ────────────────────────────────────────────────
 # Load Data & Model Artifacts
@@ -44,8 +108,10 @@ print("Loading model artifacts...")
 
 try:
     # Load ratings for popularity fallback
-    ratings_path = os.path.join(ROOT_DIR, "ratings_processed.csv")
-    ratings = pd.read_csv(ratings_path)
+    # Typed tables (data_io.py): Parquet when converted, else the CSV coerced to the same dtypes
+    from data_io import load_table
+    
+    ratings = load_table(ROOT_DIR, "ratings_processed")
     print(f"✓ Loaded {len(ratings):,} ratings")
     
     # Load FunkSVD model
@@ -73,27 +139,120 @@ try:
     model = FunkSVD()
     print(f"✓ Loaded FunkSVD model (users={len(model.user_factors)}, items={len(model.item_factors)})")
     
-    # Load ID mappings
-    mappings_path = os.path.join(ROOT_DIR, "id_mappings.pkl")
-    mappings = joblib.load(mappings_path)
-    user_map = mappings['user_map']  # {original_user_id: user_idx}
-    movie_map = mappings['movie_map']  # {original_movie_id: movie_idx}
+    # Model version, used to invalidate derived artifacts and cached rankings
+    from artifacts import model_fingerprint
+    
+    model_version = model_fingerprint(model.user_factors, model.user_bias, model.item_factors, model.item_bias)
+    
+    # Optional ANN index (built offline by ann_index.py)
+    from ann_index import ANN_INDEX_FILE, IVFIndex
+    
+    ann_index = None
+    ann_index_path = os.path.join(ROOT_DIR, ANN_INDEX_FILE)
+    if os.path.exists(ann_index_path):
+        ann_index = IVFIndex.load(ann_index_path)
+        if ann_index.fingerprint != model_fingerprint(model.item_factors, model.item_bias):
+            print("⚠ ANN index was built for a different model - ignoring it (rerun ann_index.py)")
+            ann_index = None
+        else:
+            print(f"✓ Loaded ANN index ({ann_index.n_lists} lists, n_probe={ann_index.n_probe})")
+    
+    # Optional materialized top-N table (built offline by materialize.py)
+    from materialize import load_materialized
+    
+    materialized_items, materialized_scores = None, None
+    if USE_MATERIALIZED:
+        materialized_items, materialized_scores = load_materialized(ROOT_DIR, model_version)
+        if materialized_items is not None:
+            print(f"✓ Loaded materialized top-{materialized_items.shape[1]} table")
+    
+    # Optional user-cluster lists for approximate / overload serving (built offline by user_clusters.py)
+    from user_clusters import USER_CLUSTERS_FILE, UserClusterLists, fold_in
+    
+    user_clusters = None
+    user_clusters_path = os.path.join(ROOT_DIR, USER_CLUSTERS_FILE)
+    if os.path.exists(user_clusters_path):
+        user_clusters = UserClusterLists.load(user_clusters_path)
+        if user_clusters.fingerprint != model_version:
+            print("⚠ User clusters were built for a different model - ignoring them (rerun user_clusters.py)")
+            user_clusters = None
+        else:
+            print(f"✓ Loaded {user_clusters.n_clusters} user-cluster lists")
     
-    # Create reverse mappings (CRITICAL FIX)
-    idx_to_movie_id = {idx: mid for mid, idx in movie_map.items()}
-    idx_to_user_id = {idx: uid for uid, idx in user_map.items()}
+    # Load ID mappings (sorted-array id_maps.npz, converted from id_mappings.pkl on first start)
+    from id_maps import load_id_maps
+    
+    user_map, movie_map = load_id_maps(ROOT_DIR)  # IdMap: original id ↔ model index, batch to_index / to_id
+    
+    # Dense movie_id → model index array (-1 = not in the model) for vectorized exclusions
+    movie_index_lookup = np.full(movie_map.ids[-1] + 1, -1, dtype=np.int32)
+    movie_index_lookup[movie_map.ids] = movie_map.index
     
     print(f"✓ Loaded mappings (users={len(user_map)}, movies={len(movie_map)})")
     
     # Load movies metadata
-    movies_path = os.path.join(ROOT_DIR, "movies_metadata.csv")
-    movies = pd.read_csv(movies_path)
+    movies = load_table(ROOT_DIR, "movies_metadata")
     
-    # Ensure movie_id is int for consistent filtering
-    movies['movie_id'] = movies['movie_id'].astype(int)
+    # Sorted catalogue ids for vectorized validation (bulk ingestion)
+    catalogue_movie_ids = np.unique(movies['movie_id'].to_numpy())
     
     print(f"✓ Loaded {len(movies):,} movies metadata")
     
+    # O(1) metadata lookup by movie_id (keeps result order, unlike isin filtering)
+    movie_info = movies.set_index('movie_id')[['title', 'genres']].to_dict('index')
+    
+    # Item-item neighbour table, rebuilt here if missing or built for another model
+    from neighbors import load_or_build_neighbors
+    
+    neighbor_idx, neighbor_sim = load_or_build_neighbors(
+        ROOT_DIR, model.item_factors, model.item_bias, k=NEIGHBORS_K
+    )
+    print(f"✓ Loaded neighbour table ({neighbor_idx.shape[1]} neighbours per movie)")
+    
+    # Seen-items index: training history as CSR (stored ratings merged in per user on demand)
+    from seen_items import SeenItems
+    
+    seen_items = SeenItems.from_ratings(
+        ratings['user_id'].to_numpy(), ratings['movie_id'].to_numpy(), SEEN_OVERLAY_USERS
+    )
+    print(f"✓ Built seen-items index ({seen_items.memory_bytes() / 1e6:.1f} MB)")
+    
+    # Multi-hot genres + release years over item indices (content_features.npz, rebuilt if stale)
+    from content_features import load_or_build_content_features
+    
+    content_features = load_or_build_content_features(ROOT_DIR, movies, movie_map, len(model.item_bias))
+    item_genre_matrix = content_features.genre_matrix()
+    print(f"✓ Loaded content features ({len(content_features.genre_names)} genres, "
+          f"{np.count_nonzero(content_features.years):,} release years)")
+    
+    # Genre / release-year bitsets for filtered recommendations
+    facet_index = content_features.facet_index()
+    print(f"✓ Built facet bitsets ({len(facet_index.genre_bits)} genres, {len(facet_index.decade_bits)} decades)")
+    
+    # Candidate generation → re-ranking pipeline (MMR diversity, genre caps)
+    from pipeline import GenreCapReranker, MMRReranker, RecommendationPipeline
+    
+    pipeline = RecommendationPipeline(
+        [MMRReranker(model.item_factors, MMR_LAMBDA), GenreCapReranker(item_genre_matrix, GENRE_CAP_FRACTION)],
+        n_candidates=PIPELINE_CANDIDATES,
+        budget_ms=PIPELINE_BUDGET_MS
+    )
+    
+    # Trigram title search index (ranked with popularity)
+    from title_search import TitleSearchIndex
+    
+    title_index = TitleSearchIndex.from_movies(movies, ratings['movie_id'].value_counts().to_dict())
+    print(f"✓ Built title search index ({len(title_index.postings):,} trigrams)")
+    
+    # Optional demographic-segment cold-start lists (built offline by segments.py)
+    from segments import SEGMENTS_FILE, SegmentLists
+    
+    segment_lists = None
+    segments_path = os.path.join(ROOT_DIR, SEGMENTS_FILE)
+    if os.path.exists(segments_path):
+        segment_lists = SegmentLists.load(segments_path)
+        print(f"✓ Loaded {len(segment_lists.rows):,} demographic segment lists")
+    
 except FileNotFoundError as e:
     raise RuntimeError(f"Required file not found: {e}")
 except Exception as e:
@@ -127,22 +286,126 @@ class UserRating(Base):
     from sqlalchemy import PrimaryKeyConstraint
     __table_args__ = (PrimaryKeyConstraint('user_id', 'movie_id'),)
 
+class UserRatingStats(Base):
+    """Per-user rating aggregates, refreshed by the rating store in the same transaction as each write"""
+    __tablename__ = "user_rating_stats"
+    
+    user_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
+    rating_sum = Column(Float, nullable=False)
+    rating_min = Column(Float, nullable=False)
+    rating_max = Column(Float, nullable=False)
+    last_update = Column(Float, nullable=False)  # Unix timestamp
+
 # Create tables
 Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine)
 
 print(f"✓ Database initialized at {db_path}")
 
+# Rating store used by /rate and the stats endpoint (write-behind replays its log here after a crash)
+from rating_store import (SHARDS_DIR, ShardedRatingStore, SQLiteRatingStore, WriteBehindRatingStore,
+                          read_shard_count, shard_db_paths, write_shard_count)
+
+def open_rating_store(db_file: str, db_engine=None):
+    """SQLite or write-behind store over one database file (its write-behind log sits next to it)"""
+    if db_engine is None:
+        db_engine = create_engine(f"sqlite:///{db_file}", echo=False)
+        Base.metadata.create_all(db_engine)
+    if RATING_STORE == "write_behind":
+        return WriteBehindRatingStore(
+            db_engine, UserRating.__table__, os.path.dirname(db_file), UserRatingStats.__table__,
+            flush_interval_ms=RATING_FLUSH_MS, flush_rows=RATING_FLUSH_ROWS
+        )
+    return SQLiteRatingStore(db_engine, UserRating.__table__, UserRatingStats.__table__)
+
+if RATING_SHARDS > 1 and not os.path.exists(os.path.join(db_dir, SHARDS_DIR)):
+    # First sharded start: only allowed while the single database is still empty
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM user_ratings LIMIT 1").first():
+            raise RuntimeError(f"{db_path} holds ratings: run `python reshard.py --shards {RATING_SHARDS}` "
+                               f"to split them before starting with RATING_SHARDS={RATING_SHARDS}")
+    write_shard_count(db_dir, RATING_SHARDS)
+
+if RATING_SHARDS != read_shard_count(db_dir):
+    raise RuntimeError(f"Ratings on disk are split into {read_shard_count(db_dir)} shard(s) but RATING_SHARDS="
+                       f"{RATING_SHARDS}: run `python reshard.py --shards {RATING_SHARDS}` with the API stopped")
+
+if RATING_SHARDS > 1:
+    shard_files = shard_db_paths(db_dir, RATING_SHARDS)
+    for f in shard_files:
+        os.makedirs(os.path.dirname(f), exist_ok=True)
+    rating_store = ShardedRatingStore([open_rating_store(f) for f in shard_files])
+    print(f"✓ Rating store sharded by user over {RATING_SHARDS} SQLite files")
+else:
+    rating_store = open_rating_store(db_path, engine)
+
+if RATING_STORE == "write_behind":
+    print(f"✓ Write-behind rating store ({RATING_FLUSH_MS:g} ms / {RATING_FLUSH_ROWS} rows, "
+          f"{rating_store.replayed:,} rows recovered from the log)")
+
+# Rating history (timestamped events) for time-aware training, compacted offline by event_log.py
+from event_log import EVENT_DTYPE, EVENTS_DIR, MAX_USER_ID, RatingEventLog
+
+rating_events = None
+if RATING_EVENTS:
+    rating_events = RatingEventLog(os.path.join(ROOT_DIR, EVENTS_DIR), RATING_EVENTS_SEGMENT_MB * 2**20,
+                                   RATING_EVENTS_SEGMENT_S)
+    print(f"✓ Rating event log at {rating_events.path}")
+
+from bulk_ingest import BulkIngest
+from export import (EXPORT_MEDIA_TYPES, RATING_COLUMNS, RECOMMENDATION_COLUMNS, check_format, encode_pages,
+                    iter_rating_pages, iter_recommendation_pages, iter_stored_user_ids)
+
 # ────────────────────────────────────────────────
-# Database dependency
+# Request Logging (sampled, written by a background thread)
 # ────────────────────────────────────────────────
-def get_db():
-    """FastAPI dependency for database sessions"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+request_logger = None
+
+if REQUEST_LOG_SAMPLE_RATE > 0:
+    from request_log import RequestLogger, make_record
+
+    request_logger = RequestLogger(REQUEST_LOG_PATH, sample_rate=REQUEST_LOG_SAMPLE_RATE)
+    _route_templates = {}
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        """Time sampled requests and queue a log record (endpoints annotate request.state)"""
+        if not request_logger.should_sample():
+            return await call_next(request)
+
+        # Only small JSON bodies are captured: reading a streamed upload here would buffer all of it
+        body = None
+        content_type = request.headers.get("content-type", "")
+        if (request.method == "POST" and request.url.path != "/ratings/bulk"
+                and content_type.split(";")[0].strip() == "application/json"):
+            try:
+                body = json.loads(await request.body())
+            except ValueError:
+                body = None
+
+        start = time.perf_counter()
+        response = await call_next(request)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        # Log the route template (/user/{user_id}/stats) so replays group per endpoint
+        if not _route_templates:
+            _route_templates.update({r.endpoint: r.path for r in app.routes if hasattr(r, "endpoint")})
+        endpoint = _route_templates.get(request.scope.get("endpoint"), request.url.path)
+
+        request_logger.log(make_record(
+            method=request.method,
+            endpoint=endpoint,
+            path=request.url.path,
+            params=dict(request.query_params),
+            status=response.status_code,
+            latency_ms=latency_ms,
+            source=getattr(request.state, "source", None),
+            cache_hit=getattr(request.state, "cache_hit", None),
+            body=body,
+        ))
+        return response
+
+    print(f"✓ Request logging enabled (sample rate={REQUEST_LOG_SAMPLE_RATE}) → {REQUEST_LOG_PATH}")
 
 # ────────────────────────────────────────────────
 # Pydantic Models (Request/Response schemas)
@@ -162,7 +425,7 @@ class Rating(BaseModel):
         return v
 
 class RateRequest(BaseModel):
-    user_id: int = Field(..., description="User ID", gt=0)
+    user_id: int = Field(..., description="User ID", gt=0, le=MAX_USER_ID)
     ratings: List[Rating] = Field(..., description="List of movie ratings", min_items=1)
     
     class Config:
@@ -187,26 +450,130 @@ class RecommendResponse(BaseModel):
     recommendations: List[Recommendation]
     source: str
     count: int
+    pipeline: Optional[dict] = None
+    offset: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+class SearchResult(BaseModel):
+    movie_id: int
+    title: str
+    genres: str
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    count: int
+
+class SimilarMovie(BaseModel):
+    movie_id: int
+    title: str
+    genres: str
+    similarity: float
+
+class SimilarResponse(BaseModel):
+    movie_id: int
+    title: str
+    similar: List[SimilarMovie]
+    count: int
 
 # ────────────────────────────────────────────────
 # Helper Functions
 # ────────────────────────────────────────────────
-def get_user_rated_movies(db: Session, user_id: int) -> set:
-    """Get set of movie IDs the user has already rated"""
-    user_ratings = db.query(UserRating.movie_id).filter_by(user_id=user_id).all()
-    return {r.movie_id for r in user_ratings}
-
-def get_popularity_recommendations(n: int, exclude_movie_ids: set = None) -> List[dict]:
+def get_user_rated_movies(user_id: int) -> tuple:
     """
-    Get top-N popular movies based on rating count and mean rating
+    Movies the user has already rated and how many ratings they have stored
     
-    Args:
-        n: Number of recommendations
-        exclude_movie_ids: Set of movie IDs to exclude (already rated)
+    The stats row (one primary-key lookup in the shared rating store) versions
+    the worker's cached seen set, so a rating written through any worker is
+    picked up on the next request; the movie list is only re-read when it changed.
     
     Returns:
-        List of movie dictionaries
+        (sorted movie IDs from training history + stored ratings, number of stored ratings)
     """
+    stats = rating_store.get_user_stats(user_id)
+    if stats is None:
+        return seen_items.history(user_id), 0
+    rated = seen_items.get(
+        user_id, (stats["count"], stats["last_update"]), lambda: rating_store.get_user_ratings(user_id).keys()
+    )
+    return rated, stats["count"]
+
+def as_movie_id_array(movie_ids) -> np.ndarray:
+    """Movie IDs from a set, list or array as an int64 array (empty for None)"""
+    if movie_ids is None:
+        return np.array([], dtype=np.int64)
+    if isinstance(movie_ids, np.ndarray):
+        return movie_ids.astype(np.int64, copy=False)
+    return np.fromiter(movie_ids, dtype=np.int64)
+
+def movie_indices(movie_ids) -> np.ndarray:
+    """Model item indices of the given movie IDs (movies outside the model are dropped)"""
+    ids = as_movie_id_array(movie_ids)
+    ids = ids[(ids >= 0) & (ids < len(movie_index_lookup))]
+    idx = movie_index_lookup[ids]
+    return idx[idx >= 0]
+
+def get_movie_details(movie_ids: List[int]) -> List[dict]:
+    """Join movie IDs with title/genres metadata (metadata order, not input order)"""
+    return movies[movies['movie_id'].isin(movie_ids)][
+        ['movie_id', 'title', 'genres']
+    ].to_dict('records')
+
+def apply_exclusions(scores: np.ndarray, exclude_movie_ids, allowed_mask: np.ndarray = None) -> np.ndarray:
+    """Set scores of excluded (already rated) or filtered-out movies to -inf in place"""
+    if allowed_mask is not None:
+        scores[~allowed_mask] = -np.inf
+    scores[movie_indices(exclude_movie_ids)] = -np.inf
+    return scores
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    return np.argsort(-scores)[:k]
+
+def materialized_top(
+    u_idx: int,
+    n: int,
+    exclude_movie_ids=None,
+    allowed_mask: np.ndarray = None
+) -> Optional[tuple]:
+    """
+    Filter the user's precomputed top-N by live exclusions and facets
+    
+    Returns:
+        (item_indices, scores) of the surviving rows, or None when fewer than
+        n survive and the caller should score online instead
+    """
+    items = np.asarray(materialized_items[u_idx])
+    keep = np.ones(len(items), dtype=bool)
+    exclude_idx = movie_indices(exclude_movie_ids)
+    if len(exclude_idx):
+        keep &= ~np.isin(items, exclude_idx)
+    if allowed_mask is not None:
+        keep &= allowed_mask[items]
+    if keep.sum() < n:
+        return None
+    return items[keep], np.asarray(materialized_scores[u_idx])[keep].astype(np.float64)
+
+popularity_ids = None
+
+def popularity_order() -> np.ndarray:
+    """
+    Movie ids (at least 50 ratings) by mean rating weighted by log count, best first
+    
+    Training ratings are static, so the order is computed once per model and
+    shared between workers through the shared cache when it is enabled.
+    """
+    global popularity_ids
+    if popularity_ids is not None:
+        return popularity_ids
+    
+    key = ("popularity", model_version)
+    data = shared_cache.get(key) if shared_cache is not None else None
+    if data is not None:
+        popularity_ids = unpack(data)[0]["movie_ids"]
+        return popularity_ids
+    
     # Calculate movie statistics
     movie_stats = ratings.groupby('movie_id').agg(
         mean_rating=('rating', 'mean'),
@@ -216,90 +583,448 @@ def get_popularity_recommendations(n: int, exclude_movie_ids: set = None) -> Lis
     # Filter out movies with too few ratings (noise)
     movie_stats = movie_stats[movie_stats['count'] >= 50]
     
-    # Exclude already rated movies
-    if exclude_movie_ids:
-        movie_stats = movie_stats[~movie_stats['movie_id'].isin(exclude_movie_ids)]
-    
     # Sort by mean rating (weighted by count)
     movie_stats['weighted_score'] = (
         movie_stats['mean_rating'] * np.log1p(movie_stats['count'])
     )
-    movie_stats = movie_stats.sort_values('weighted_score', ascending=False)
+    movie_stats = movie_stats.sort_values('weighted_score', ascending=False, kind='stable')
+    
+    popularity_ids = movie_stats['movie_id'].to_numpy(dtype=np.int64)
+    if shared_cache is not None:
+        shared_cache.put(key, pack({"movie_ids": popularity_ids}), ttl=SHARED_CACHE_POPULARITY_TTL_S)
+    return popularity_ids
+
+def get_popularity_recommendations(
+    n: int, 
+    exclude_movie_ids=None, 
+    allowed_mask: np.ndarray = None
+) -> List[dict]:
+    """
+    Get top-N popular movies based on rating count and mean rating
+    
+    Args:
+        n: Number of recommendations
+        exclude_movie_ids: Movie IDs to exclude (already rated), as a set or array
+        allowed_mask: Optional facet mask over model item indices
+    
+    Returns:
+        List of movie dictionaries
+    """
+    top_ids = popularity_order()
+    
+    # Exclude already rated movies
+    exclude_ids = as_movie_id_array(exclude_movie_ids)
+    if len(exclude_ids):
+        top_ids = top_ids[~np.isin(top_ids, exclude_ids)]
+    
+    # Apply genre / year filters (movies outside the model never pass a mask)
+    if allowed_mask is not None:
+        item_idx = np.full(len(top_ids), -1, dtype=np.int64)
+        in_range = top_ids < len(movie_index_lookup)
+        item_idx[in_range] = movie_index_lookup[top_ids[in_range]]
+        keep = item_idx >= 0
+        keep[keep] = allowed_mask[item_idx[keep]]
+        top_ids = top_ids[keep]
     
     # Get top N movie IDs
-    top_ids = movie_stats.head(n)['movie_id'].tolist()
+    top_ids = top_ids[:n].tolist()
     
-    # Fetch movie details
-    recs = movies[movies['movie_id'].isin(top_ids)][
-        ['movie_id', 'title', 'genres']
-    ].to_dict('records')
+    # Fetch movie details (back in popularity order)
+    position = {movie_id: i for i, movie_id in enumerate(top_ids)}
+    recs = sorted(get_movie_details(top_ids), key=lambda x: position[x['movie_id']])
     
     return recs
 
+def get_segment_recommendations(
+    n: int,
+    exclude_movie_ids=None,
+    allowed_mask: np.ndarray = None,
+    gender: Optional[str] = None,
+    age: Optional[int] = None,
+    occupation: Optional[int] = None
+) -> tuple[List[dict], Optional[str]]:
+    """
+    Get cold-start recommendations from the precomputed demographic segment list
+    
+    Returns:
+        (recommendations, segment_key) - empty list if no segment list applies
+    """
+    if segment_lists is None:
+        return [], None
+    
+    key, segment_movie_ids = segment_lists.lookup(gender, age, occupation)
+    segment_movie_ids = segment_movie_ids[~np.isin(segment_movie_ids, as_movie_id_array(exclude_movie_ids))]
+    if allowed_mask is not None:
+        item_idx = movie_map.to_index(segment_movie_ids)
+        keep = item_idx >= 0
+        keep[keep] = allowed_mask[item_idx[keep]]
+        segment_movie_ids = segment_movie_ids[keep]
+    recs = []
+    for movie_id in segment_movie_ids.tolist():
+        info = movie_info.get(movie_id)
+        if info is None:
+            continue
+        recs.append({"movie_id": movie_id, "title": info['title'], "genres": info['genres']})
+        if len(recs) >= n:
+            break
+    
+    return recs, key
+
+def generate_candidates(
+    u_idx: int,
+    k: int,
+    exclude_movie_ids=None,
+    engine: str = RECOMMEND_ENGINE,
+    n_probe: Optional[int] = None,
+    allowed_mask: np.ndarray = None,
+    min_keep: int = 1
+) -> tuple:
+    """
+    Candidate stage: top-k (item indices, predicted ratings) with excluded items dropped
+    
+    The materialized table is used for engine="exact", the user's cluster
+    list for engine="cluster" and the probed IVF lists for engine="ann" when
+    they hold at least min_keep items after exclusions; otherwise every movie
+    is scored.
+    
+    Returns:
+        (item_indices, scores, source_description)
+    """
+    cluster_rows = None
+    if engine == "cluster" and user_clusters is not None:
+        cluster = int(user_clusters.assignments[u_idx])
+        cluster_rows = user_clusters.search(cluster, k, movie_indices(exclude_movie_ids), allowed_mask)
+        if len(cluster_rows[0]) < min_keep:
+            cluster_rows = None  # Too much of the list excluded / filtered out
+    
+    ann_rows = None
+    if engine == "ann" and ann_index is not None:
+        exclude_idx = movie_indices(exclude_movie_ids).astype(np.int64)
+        ann_rows = ann_index.search(model.user_factors[u_idx], k, n_probe, exclude_idx, allowed_mask)
+        if len(ann_rows[0]) < min_keep:
+            ann_rows = None  # Probed lists hold too few items after exclusions / filters
+    
+    if ann_rows is not None:
+        # Approximate: score only items in the probed IVF lists
+        top_indices, partial = ann_rows
+        top_scores = model.global_mean + model.user_bias[u_idx] + partial
+        source = "FunkSVD (personalized, ANN)"
+    elif cluster_rows is not None:
+        # Approximate: the user's cluster list, scored with the user's own bias
+        top_indices, partial = cluster_rows
+        top_scores = model.global_mean + model.user_bias[u_idx] + partial
+        source = f"FunkSVD (approximate, user cluster {cluster})"
+    elif (engine == "exact" and materialized_items is not None and k <= materialized_items.shape[1]
+          and (rows := materialized_top(u_idx, min_keep, exclude_movie_ids, allowed_mask)) is not None):
+        # Precomputed ranking with live exclusions, no scoring at request time
+        top_indices, top_scores = rows[0][:k], rows[1][:k]
+        source = "FunkSVD (personalized, materialized)"
+    else:
+        # Get predictions for all movies (FAST - vectorized)
+        scores = model.predict_all(u_idx)
+        
+        # Get top k indices (excluding already rated / filtered out)
+        apply_exclusions(scores, exclude_movie_ids, allowed_mask)
+        top_indices = top_k_indices(scores, k)
+        top_scores = scores[top_indices]
+        source = "FunkSVD (personalized)"
+    
+    finite = np.isfinite(top_scores)  # -inf = only excluded / filtered-out movies remain
+    return top_indices[finite], top_scores[finite], source
+
+# Cold start threshold: user needs at least 5 stored ratings for personalization
+COLD_START_THRESHOLD = 5
+
+def personalization_eligible(user_id: int, stored_count: int) -> bool:
+    """Whether /recommend personalizes for this user: enough stored ratings and a training row or fold-in"""
+    return stored_count >= COLD_START_THRESHOLD and (user_id in user_map or user_clusters is not None)
+
+def fold_in_user(user_id: int) -> Optional[tuple]:
+    """
+    (cluster, user_bias) for a user outside the training data, folded in from their stored ratings
+    
+    None when no cluster lists are loaded or none of the stored ratings is for a model movie.
+    Shared between workers through the shared cache (invalidated by the user's epoch) when enabled.
+    """
+    if user_clusters is None:
+        return None
+    key = ("fold_in", user_id, model_version, user_epoch(user_id))
+    data = shared_cache.get(key) if shared_cache is not None else None
+    if data is not None:
+        meta = unpack(data)[1]
+        return (meta["cluster"], meta["user_bias"]) if meta else None
+    
+    folded = None
+    stored = rating_store.get_user_ratings(user_id)
+    item_idx = movie_map.to_index(np.fromiter(stored.keys(), dtype=np.int64, count=len(stored)))
+    known = item_idx >= 0
+    if known.any():
+        values = np.fromiter(stored.values(), dtype=np.float64, count=len(stored))[known]
+        vector, user_bias = fold_in(model.item_factors, model.item_bias, model.global_mean, item_idx[known], values)
+        folded = int(user_clusters.nearest(vector)), float(user_bias)
+    if shared_cache is not None:
+        shared_cache.put(key, pack({}, {"cluster": folded[0], "user_bias": folded[1]} if folded else {}))
+    return folded
+
+def user_candidates(
+    user_id: int,
+    folded: Optional[tuple],
+    k: int,
+    exclude_movie_ids,
+    engine: str,
+    n_probe: Optional[int],
+    allowed_mask: Optional[np.ndarray],
+    min_keep: int
+) -> tuple:
+    """generate_candidates for a training user; the nearest cluster's list for a folded-in one"""
+    if folded is None:
+        return generate_candidates(user_map[user_id], k, exclude_movie_ids, engine, n_probe, allowed_mask, min_keep)
+    cluster, user_bias = folded
+    top_indices, partial = user_clusters.search(cluster, k, movie_indices(exclude_movie_ids), allowed_mask)
+    return top_indices, model.global_mean + user_bias + partial, f"FunkSVD (folded in, user cluster {cluster})"
+
 def get_personalized_recommendations(
     user_id: int, 
     n: int, 
-    exclude_movie_ids: set = None
+    exclude_movie_ids=None,
+    engine: str = RECOMMEND_ENGINE,
+    n_probe: Optional[int] = None,
+    allowed_mask: np.ndarray = None,
+    rerankers: Optional[List[str]] = None,
+    report: Optional[dict] = None
 ) -> tuple[List[dict], str]:
     """
     Get personalized recommendations using FunkSVD
     
+    Args:
+        engine: "exact" scores every movie (or reads the materialized table when
+            present), "ann" only scores the probed IVF lists
+        n_probe: IVF lists to probe (ann only, defaults to the index setting)
+        allowed_mask: Optional facet mask over model item indices
+        rerankers: Re-rankers to run over the top PIPELINE_CANDIDATES (e.g. ["mmr"]);
+            empty or None returns the plain top-n by predicted rating
+        report: Optional dict filled with the pipeline's per-stage timings
+    
     Returns:
         (recommendations, source_description)
     """
-    # Check if user in training data
+    # Users outside the training data are folded in and served their nearest cluster's list
+    folded = None
     if user_id not in user_map:
-        return get_popularity_recommendations(n, exclude_movie_ids), "popularity (user not in training data)"
+        folded = fold_in_user(user_id)
+        if folded is None:
+            return get_popularity_recommendations(n, exclude_movie_ids, allowed_mask), "popularity (user not in training data)"
     
     try:
-        u_idx = user_map[user_id]
-        
-        # Get predictions for all movies (FAST - vectorized)
-        scores = model.predict_all(u_idx)
-        
-        # CRITICAL FIX: Use proper reverse mapping
-        # Get top N indices (excluding already rated)
-        if exclude_movie_ids:
-            # Zero out scores for already rated movies
-            for movie_id in exclude_movie_ids:
-                if movie_id in movie_map:
-                    m_idx = movie_map[movie_id]
-                    scores[m_idx] = -np.inf
+        source = "FunkSVD (personalized)"
         
-        # Get top N movie indices
-        top_indices = np.argsort(-scores)[:n * 2]  # Get extra in case some don't have metadata
+        def generate(k: int) -> tuple:
+            nonlocal source
+            top_indices, top_scores, source = user_candidates(
+                user_id, folded, k, exclude_movie_ids, engine, n_probe, allowed_mask, min_keep=n
+            )
+            return top_indices, top_scores
         
-        # Convert indices to movie IDs using reverse mapping
-        top_movie_ids = []
-        predicted_ratings = []
+        if rerankers:
+            top_indices, top_scores, stage_report = pipeline.run(generate, n, rerankers)
+            source += f" + {', '.join(rerankers)}"
+            if report is not None:
+                report.update(stage_report)
+        else:
+            top_indices, top_scores = generate(n * 2)  # Get extra in case some don't have metadata
         
-        for idx in top_indices:
-            if idx in idx_to_movie_id:
-                movie_id = idx_to_movie_id[idx]
-                top_movie_ids.append(movie_id)
-                predicted_ratings.append(scores[idx])
-                
-                if len(top_movie_ids) >= n:
-                    break
+        # Convert indices to movie IDs in one lookup on the dense inverse mapping
+        top_ids = movie_map.to_id(top_indices)
+        known = top_ids >= 0
+        top_movie_ids = top_ids[known][:n].tolist()
+        predicted_ratings = top_scores[known][:n].tolist()
         
         # Fetch movie details
-        recs = movies[movies['movie_id'].isin(top_movie_ids)][
-            ['movie_id', 'title', 'genres']
-        ].to_dict('records')
+        recs = get_movie_details(top_movie_ids)
         
         # Add predicted ratings
         rating_map = dict(zip(top_movie_ids, predicted_ratings))
         for rec in recs:
             rec['predicted_rating'] = round(rating_map.get(rec['movie_id'], 0), 2)
         
-        # Sort by predicted rating (in case order was lost during merge)
-        recs = sorted(recs, key=lambda x: x.get('predicted_rating', 0), reverse=True)[:n]
+        # Restore ranked order (lost during the metadata merge; re-rankers may not follow predicted rating)
+        position = {movie_id: i for i, movie_id in enumerate(top_movie_ids)}
+        recs = sorted(recs, key=lambda x: position[x['movie_id']])[:n]
         
-        return recs, "FunkSVD (personalized)"
+        return recs, source
         
     except Exception as e:
         print(f"Error in personalized recommendations: {e}")
-        return get_popularity_recommendations(n, exclude_movie_ids), f"popularity (error: {str(e)})"
+        return get_popularity_recommendations(n, exclude_movie_ids, allowed_mask), f"popularity (error: {str(e)})"
+
+# ────────────────────────────────────────────────
+# Paginated Rankings (ranked once, pages sliced from the cache)
+# ────────────────────────────────────────────────
+ranked_cache = OrderedDict()  # cache key -> (movie_ids int32, predicted ratings float32 or None, source)
+ranked_cache_lock = threading.Lock()
+
+# Shared by every worker on the host (a file in /dev/shm unless SHARED_CACHE_PATH is set)
+from shared_cache import SharedCache, pack, unpack
+
+shared_cache = None
+if SHARED_CACHE_MB > 0:
+    shared_cache_path = SHARED_CACHE_PATH or os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else db_dir,
+        f"movie-recommender-{zlib.crc32(ROOT_DIR.encode()):08x}.cache"
+    )
+    shared_cache = SharedCache(
+        shared_cache_path, SHARED_CACHE_MB * 2**20, SHARED_CACHE_SLOT_KB * 1024, ttl=SHARED_CACHE_TTL_S
+    )
+    shared_cache.set_model(model_version)
+    print(f"✓ Shared result cache: {shared_cache.n_sets * shared_cache.ways:,} slots at {shared_cache.path}")
+
+def user_epoch(user_id: int) -> int:
+    """Shared per-user version, bumped by whichever worker handles the user's /rate"""
+    return shared_cache.epoch(user_id) if shared_cache is not None else 0
+
+def invalidate_users(user_ids):
+    if shared_cache is not None:
+        shared_cache.bump_users(user_ids)
+
+def rating_version(rated_movie_ids, stored_count: int) -> str:
+    """Changes whenever the user's rated set or stored rating count changes (read from the shared store)"""
+    ids = np.sort(as_movie_id_array(rated_movie_ids))
+    return f"{stored_count}-{len(ids)}-{zlib.crc32(ids.tobytes()):08x}"
+
+def encode_cursor(user_id: int, offset: int) -> str:
+    raw = json.dumps({"u": user_id, "o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor (raises ValueError on malformed cursors)"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {"u": int(data["u"]), "o": int(data["o"])}
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def build_ranked_list(
+    user_id: int,
+    rated_movies: np.ndarray,
+    stored_count: int,
+    depth: int,
+    engine: str,
+    n_probe: Optional[int],
+    allowed_mask: Optional[np.ndarray],
+    rerankers: List[str],
+    segment_hints: Optional[dict]
+) -> tuple:
+    """
+    Rank `depth` movies with the same strategy as a single /recommend page
+    
+    Args:
+        rated_movies: Movies to exclude (training history + stored ratings)
+        stored_count: Stored ratings, which decide cold start (as in /user/{user_id}/stats)
+    
+    Returns:
+        (movie_ids int32, predicted ratings float32 or None, source_description)
+    """
+    eligible = personalization_eligible(user_id, stored_count)
+    folded = fold_in_user(user_id) if eligible and user_id not in user_map else None
+    if not eligible or (user_id not in user_map and folded is None):
+        recs = get_popularity_recommendations(depth, rated_movies, allowed_mask)
+        source = f"popularity (cold start: {stored_count} ratings)"
+        if segment_hints:
+            segment_recs, segment = get_segment_recommendations(depth, rated_movies, allowed_mask, **segment_hints)
+            if segment_recs:
+                # Segment list first, then the global popularity list behind it
+                seen = {r['movie_id'] for r in segment_recs}
+                recs = segment_recs + [r for r in recs if r['movie_id'] not in seen]
+                source = f"popularity (cold start: {stored_count} ratings, segment {segment})"
+        return np.array([r['movie_id'] for r in recs[:depth]], dtype=np.int32), None, source
+    
+    source = "FunkSVD (personalized)"
+    
+    def generate(k: int) -> tuple:
+        nonlocal source
+        top_indices, top_scores, source = user_candidates(
+            user_id, folded, k, rated_movies, engine, n_probe, allowed_mask, min_keep=depth
+        )
+        return top_indices, top_scores
+    
+    if rerankers:
+        top_indices, top_scores, _ = pipeline.run(generate, depth, rerankers)
+        source += f" + {', '.join(rerankers)}"
+    else:
+        top_indices, top_scores = generate(depth)
+    
+    top_ids = movie_map.to_id(top_indices)
+    known = top_ids >= 0
+    movie_ids = top_ids[known].astype(np.int32)
+    return movie_ids, top_scores[known].astype(np.float32), source
+
+def get_ranked_list(cache_key: tuple, build) -> tuple:
+    """
+    Ranked-list lookup (shared cache when enabled, else the local LRU), calling `build()` on a miss
+    
+    Returns:
+        (movie_ids, predicted_ratings, source, cache_hit)
+    """
+    if shared_cache is not None:
+        data = shared_cache.get(("ranked", cache_key))
+        if data is not None:
+            arrays, meta = unpack(data)
+            return arrays["movie_ids"], arrays["predicted"], meta["source"], True
+    
+    with ranked_cache_lock:
+        if cache_key in ranked_cache:
+            ranked_cache.move_to_end(cache_key)
+            return (*ranked_cache[cache_key], True)
+    
+    entry = build()
+    if shared_cache is not None:
+        stored = shared_cache.put(
+            ("ranked", cache_key), pack({"movie_ids": entry[0], "predicted": entry[1]}, {"source": entry[2]})
+        )
+        if stored:
+            return (*entry, False)
+    
+    # Local LRU (also holds lists too large for a shared-cache slot)
+    with ranked_cache_lock:
+        ranked_cache[cache_key] = entry
+        while len(ranked_cache) > RANKED_CACHE_SIZE:
+            ranked_cache.popitem(last=False)
+    return (*entry, False)
+
+def page_recommendations(movie_ids: np.ndarray, predicted: Optional[np.ndarray], offset: int, n: int) -> List[dict]:
+    """Slice one page out of a ranked list and attach metadata"""
+    recs = []
+    for i in range(offset, min(offset + n, len(movie_ids))):
+        info = movie_info.get(int(movie_ids[i]))
+        if info is None:
+            continue
+        rec = {"movie_id": int(movie_ids[i]), "title": info['title'], "genres": info['genres']}
+        if predicted is not None:
+            rec['predicted_rating'] = round(float(predicted[i]), 2)
+        recs.append(rec)
+    return recs
+
+# ────────────────────────────────────────────────
+# Load Shedding (user-cluster lists while overloaded)
+# ────────────────────────────────────────────────
+# Counted on the event loop from arrival, so requests still queued for a threadpool worker count too
+inflight_requests = 0
+
+if OVERLOAD_INFLIGHT > 0 and user_clusters is not None:
+    @app.middleware("http")
+    async def count_inflight(request: Request, call_next):
+        global inflight_requests
+        if request.url.path != "/recommend":
+            return await call_next(request)
+        inflight_requests += 1
+        try:
+            return await call_next(request)
+        finally:
+            inflight_requests -= 1
+
+def overloaded() -> bool:
+    """True while more than OVERLOAD_INFLIGHT /recommend calls are queued or running and cluster lists exist"""
+    return OVERLOAD_INFLIGHT > 0 and user_clusters is not None and inflight_requests > OVERLOAD_INFLIGHT
 
 # ────────────────────────────────────────────────
 # API Endpoints
@@ -313,18 +1038,19 @@ def root():
         "service": "Movie Recommender API",
         "version": "1.0.0",
         "model": "FunkSVD",
-        "endpoints": ["/rate", "/recommend"]
+        "endpoints": ["/rate", "/ratings/bulk", "/export/ratings", "/export/recommendations", "/recommend", "/movies/search", "/movies/{movie_id}/similar"]
     }
 
 @app.post("/rate", response_model=dict)
-def submit_ratings(request: RateRequest, db: Session = Depends(get_db)):
+def submit_ratings(request: RateRequest):
     """
     Submit user ratings for movies
     
     - **user_id**: User identifier (integer)
     - **ratings**: List of {movie_id, rating} pairs
     
-    Ratings are stored in SQLite database and can be updated.
+    Ratings are stored in SQLite (directly or through the write-behind buffer,
+    see RATING_STORE) and can be updated.
     """
     try:
         # Validate that movies exist in the system
@@ -340,27 +1066,16 @@ def submit_ratings(request: RateRequest, db: Session = Depends(get_db)):
                 detail=f"Invalid movie IDs: {invalid_movies}. These movies don't exist in the system."
             )
         
-        # Upsert ratings
-        for r in request.ratings:
-            existing = db.query(UserRating).filter_by(
-                user_id=request.user_id,
-                movie_id=r.movie_id
-            ).first()
-            
-            if existing:
-                existing.rating = r.rating
-            else:
-                new_rating = UserRating(
-                    user_id=request.user_id,
-                    movie_id=r.movie_id,
-                    rating=r.rating
-                )
-                db.add(new_rating)
+        # Upsert ratings (one statement for the whole request)
+        rating_store.upsert(request.user_id, [(r.movie_id, r.rating) for r in request.ratings])
         
-        db.commit()
+        if rating_events is not None:
+            rating_events.append(request.user_id, [(r.movie_id, r.rating) for r in request.ratings])
+        
+        invalidate_users([request.user_id])
         
         # Get updated count
-        total_ratings = db.query(UserRating).filter_by(user_id=request.user_id).count()
+        total_ratings = rating_store.count(request.user_id)
         
         return {
             "status": "success",
@@ -372,20 +1087,190 @@ def submit_ratings(request: RateRequest, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def write_bulk_batch(user_ids: np.ndarray, movie_ids: np.ndarray, ratings: np.ndarray):
+    """Persist one validated bulk-ingest batch, mirror it into the event log and invalidate cached lists"""
+    rating_store.upsert_bulk([
+        {"user_id": u, "movie_id": m, "rating": r}
+        for u, m, r in zip(user_ids.tolist(), movie_ids.tolist(), ratings.tolist())
+    ])
+    
+    if rating_events is not None:
+        records = np.empty(len(user_ids), dtype=EVENT_DTYPE)
+        records["ts_ms"] = int(time.time() * 1000)
+        records["user_id"], records["movie_id"], records["rating"] = user_ids, movie_ids, ratings
+        rating_events.append_records(records)
+    
+    invalidate_users(user_ids)
+
+@app.post("/ratings/bulk", response_model=dict)
+async def bulk_ratings(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = BULK_BATCH_ROWS,
+    max_rejects: int = BULK_MAX_REJECTS
+):
+    """
+    Bulk-load ratings from a streamed NDJSON or CSV upload
+    
+    - **format**: "ndjson" or "csv" (default: from Content-Type, else ndjson)
+    - **batch_size**: Accepted rows per upsert transaction
+    - **max_rejects**: Rejected rows listed (with line number and reason) in the response
+    
+    The body is parsed chunk by chunk as it arrives, validated with vectorized
+    checks (same rules as /rate) and upserted in batches; invalid rows are
+    skipped and reported rather than failing the upload.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
+    
+    try:
+        ingest = BulkIngest(format, catalogue_movie_ids, write_bulk_batch, batch_size, max(max_rejects, 0),
+                            BULK_MAX_LINE_BYTES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Parsing and upserts block: run them off the event loop
+        async for chunk in request.stream():
+            await run_in_threadpool(ingest.feed, chunk)
+        summary = await run_in_threadpool(ingest.finish)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e} ({ingest.rows_accepted:,} rows already committed)")
+    except Exception as e:
+        # Includes IngestWriteError: a failed upsert is a server error even if it raised ValueError
+        raise HTTPException(status_code=500, detail=f"Bulk ingestion failed after {ingest.rows_accepted:,} rows: {str(e)}")
+    
+    return {"status": "success", "format": format, **summary}
+
+def export_response(pages, format: str, name: str, columns: dict) -> StreamingResponse:
+    return StreamingResponse(
+        encode_pages(pages, format, columns),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
+
+@app.get("/export/ratings")
+def export_ratings(
+    format: str = "ndjson",
+    after_user: Optional[int] = None,
+    after_movie: Optional[int] = None,
+    limit: Optional[int] = None
+):
+    """
+    Stream every stored rating in (user_id, movie_id) order
+    
+    - **format**: "ndjson", "csv" or "arrow" (Arrow IPC stream, needs pyarrow)
+    - **after_user** / **after_movie**: Resume after this key (both required together)
+    - **limit**: Maximum rows to export
+    
+    Rows are read in keyset pages of EXPORT_PAGE_ROWS, each its own short
+    query, so memory stays constant and /rate is never blocked for longer
+    than one page.
+    """
+    try:
+        check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (after_user is None) != (after_movie is None):
+        raise HTTPException(status_code=400, detail="after_user and after_movie must be given together")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    
+    # Write-behind: include everything acknowledged before the export started
+    rating_store.flush()
+    after = (after_user, after_movie) if after_user is not None else None
+    pages = iter_rating_pages(rating_store.engines, UserRating.__table__, EXPORT_PAGE_ROWS, after, limit)
+    return export_response(pages, format, "ratings", RATING_COLUMNS)
+
+@app.get("/export/recommendations")
+def export_recommendations(
+    n: int = 10,
+    users: str = "training",
+    user_ids: Optional[str] = None,
+    after_user: Optional[int] = None,
+    format: str = "ndjson"
+):
+    """
+    Stream top-n recommendations for a batch of users, ordered by user_id
+    
+    - **n**: Recommendations per user (1-100)
+    - **users**: "training" (every user in the model) or "rated" (users with stored ratings)
+    - **user_ids**: Comma-separated user ids (overrides `users`)
+    - **after_user**: Resume after this user id
+    - **format**: "ndjson", "csv" or "arrow"
+    
+    Each user is ranked like a /recommend call without filters or re-rankers
+    (rated movies excluded, popularity for cold-start users), one row per
+    (user_id, rank).
+    """
+    try:
+        check_format(format)
+        requested = sorted({int(u) for u in user_ids.split(",") if u.strip()}) if user_ids else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if n < 1 or n > 100:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 100")
+    if requested is None and users not in ("training", "rated"):
+        raise HTTPException(status_code=400, detail="users must be 'training' or 'rated'")
+    
+    if requested is not None:
+        batch = [u for u in requested if after_user is None or u > after_user]
+    elif users == "training":
+        training = user_map.ids  # already sorted
+        start = np.searchsorted(training, after_user, side="right") if after_user is not None else 0
+        batch = (int(u) for u in training[start:])
+    else:
+        rating_store.flush()
+        batch = iter_stored_user_ids(rating_store.engines, UserRating.__table__, EXPORT_PAGE_ROWS, after_user)
+    
+    def rank(user_id: int) -> tuple:
+        return build_ranked_list(
+            user_id, *get_user_rated_movies(user_id), n, RECOMMEND_ENGINE, None, None, [], None
+        )
+    
+    pages = iter_recommendation_pages(batch, rank, EXPORT_USERS_PER_PAGE)
+    return export_response(pages, format, "recommendations", RECOMMENDATION_COLUMNS)
+
 @app.get("/recommend", response_model=RecommendResponse)
 def get_recommendations(
+    request: Request,
     user_id: int,
     n: int = 10,
-    db: Session = Depends(get_db)
+    engine: str = RECOMMEND_ENGINE,
+    n_probe: Optional[int] = None,
+    genres: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+    gender: Optional[str] = None,
+    age: Optional[int] = None,
+    occupation: Optional[int] = None,
+    rerank: Optional[str] = RERANKERS,
+    offset: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
     """
     Get personalized movie recommendations
     
     - **user_id**: User identifier
     - **n**: Number of recommendations (default: 10, max: 50)
+    - **engine**: "exact" (default), "ann" (approximate, needs ann_index.npz) or "cluster"
+      (approximate per-cluster lists, needs user_clusters.npz; used automatically when more than
+      OVERLOAD_INFLIGHT requests are queued or running)
+    - **n_probe**: IVF lists to probe when engine=ann (more = better recall, slower)
+    - **genres**: Comma-separated genres, any of which must match (e.g. "Comedy,Romance")
+    - **year_min** / **year_max**: Inclusive release-year range
+    - **gender** / **age** / **occupation**: Optional demographic hints (MovieLens coding)
+      used to pick a segment-specific list for cold-start users
+    - **rerank**: Comma-separated re-rankers over the top candidates: "mmr" (diversity on
+      item factors) and/or "genre_cap" (limit any one genre); per-stage timings are returned
+    - **offset** / **cursor**: Page through up to RANK_DEPTH results. The list is ranked once per
+      (user, model, rating version) and cached, so later pages are slices with no extra scoring;
+      pass the returned `next_cursor` (with the same filters) to fetch the next page
     
     Returns personalized recommendations using FunkSVD if user has enough ratings,
     otherwise returns popular movies (cold start).
@@ -393,34 +1278,138 @@ def get_recommendations(
     # Validate parameters
     if n < 1 or n > 50:
         raise HTTPException(status_code=400, detail="n must be between 1 and 50")
+    if engine not in ("exact", "ann", "cluster"):
+        raise HTTPException(status_code=400, detail="engine must be 'exact', 'ann' or 'cluster'")
+    if n_probe is not None and n_probe < 1:
+        raise HTTPException(status_code=400, detail="n_probe must be at least 1")
+    
+    genre_list = [g.strip() for g in genres.split(",") if g.strip()] if genres else None
+    unknown_genres = [g for g in (genre_list or []) if g not in facet_index.genre_bits]
+    if unknown_genres:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown genres: {unknown_genres}. Valid genres: {facet_index.genres}"
+        )
+    if year_min is not None and year_max is not None and year_min > year_max:
+        raise HTTPException(status_code=400, detail="year_min must not exceed year_max")
+    allowed_mask = facet_index.mask(genre_list, year_min, year_max)
+    
+    if gender is not None and gender not in ("M", "F"):
+        raise HTTPException(status_code=400, detail="gender must be 'M' or 'F'")
+    if age is not None and not 1 <= age <= 120:
+        raise HTTPException(status_code=400, detail="age must be between 1 and 120")
+    if occupation is not None and not 0 <= occupation <= 20:
+        raise HTTPException(status_code=400, detail="occupation must be between 0 and 20")
+    has_demographics = gender is not None or age is not None or occupation is not None
+    
+    rerank_list = [r.strip() for r in rerank.split(",") if r.strip()] if rerank else []
+    unknown_rerankers = [r for r in rerank_list if r not in ("mmr", "genre_cap")]
+    if unknown_rerankers:
+        raise HTTPException(status_code=400, detail=f"Unknown re-rankers: {unknown_rerankers}. Valid: mmr, genre_cap")
+    pipeline_report = {}
+    
+    if cursor is not None:
+        try:
+            decoded = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if decoded["u"] != user_id:
+            raise HTTPException(status_code=400, detail="cursor belongs to a different user")
+        offset = decoded["o"]
+    if offset is not None and not 0 <= offset < RANK_DEPTH:
+        raise HTTPException(status_code=400, detail=f"offset must be between 0 and {RANK_DEPTH - 1}")
     
     try:
-        # Get user's rated movies
-        rated_movies = get_user_rated_movies(db, user_id)
-        user_rating_count = len(rated_movies)
+        # Degrade to the precomputed cluster lists rather than time out under load
+        if engine == "exact" and overloaded():
+            engine = "cluster"
         
-        # Decide recommendation strategy
-        # Cold start threshold: user needs at least 5 ratings for personalization
-        COLD_START_THRESHOLD = 5
+        # Movies to exclude (training history + stored ratings); stored ratings decide cold start
+        rated_movies, user_rating_count = get_user_rated_movies(user_id)
         
-        if user_rating_count < COLD_START_THRESHOLD:
-            # Cold start: use popularity
-            recs = get_popularity_recommendations(n, rated_movies)
-            source = f"popularity (cold start: {user_rating_count} ratings)"
+        if offset is not None:
+            # Paginated: rank once to RANK_DEPTH, serve every page by slicing the cached list
+            segment_hints = (
+                {"gender": gender, "age": age, "occupation": occupation} if has_demographics else None
+            )
+            cache_key = (
+                user_id, model_version, rating_version(rated_movies, user_rating_count), user_epoch(user_id),
+                engine, n_probe, tuple(sorted(genre_list or ())), year_min, year_max, gender, age, occupation, tuple(rerank_list)
+            )
+            movie_ids, predicted, source, cache_hit = get_ranked_list(
+                cache_key,
+                lambda: build_ranked_list(
+                    user_id, rated_movies, user_rating_count, RANK_DEPTH, engine, n_probe, allowed_mask,
+                    rerank_list, segment_hints
+                )
+            )
+            recs = page_recommendations(movie_ids, predicted, offset, n)
+            next_offset = offset + n
+            
+            request.state.source = source
+            request.state.cache_hit = cache_hit
+            
+            return RecommendResponse(
+                user_id=user_id,
+                recommendations=recs,
+                source=source,
+                count=len(recs),
+                offset=offset,
+                next_cursor=encode_cursor(user_id, next_offset) if next_offset < len(movie_ids) else None
+            )
+        
+        # Default page: the whole response is shared between workers until the user's epoch moves
+        page_key = (
+            "recommend", user_id, model_version, rating_version(rated_movies, user_rating_count), user_epoch(user_id),
+            engine, n_probe, tuple(sorted(genre_list or ())), year_min, year_max, gender, age, occupation,
+            tuple(rerank_list), n
+        )
+        data = shared_cache.get(page_key) if shared_cache is not None else None
+        if data is not None:
+            meta = unpack(data)[1]
+            request.state.source = meta["source"]
+            request.state.cache_hit = True
+            return RecommendResponse(
+                user_id=user_id, recommendations=meta["recs"], source=meta["source"], count=len(meta["recs"])
+            )
+        
+        # Decide recommendation strategy
+        if not personalization_eligible(user_id, user_rating_count):
+            recs, segment = [], None
+            if has_demographics:
+                # Cold start with demographic hints: precomputed segment list (O(1) lookup)
+                recs, segment = get_segment_recommendations(
+                    n, rated_movies, allowed_mask, gender, age, occupation
+                )
+            
+            if len(recs) >= n:
+                source = f"popularity (cold start: {user_rating_count} ratings, segment {segment})"
+            else:
+                # Cold start: use popularity
+                recs = get_popularity_recommendations(n, rated_movies, allowed_mask)
+                source = f"popularity (cold start: {user_rating_count} ratings)"
         else:
             # Personalized recommendations
-            recs, source = get_personalized_recommendations(user_id, n, rated_movies)
+            recs, source = get_personalized_recommendations(
+                user_id, n, rated_movies, engine, n_probe, allowed_mask, rerank_list, pipeline_report
+            )
         
         # Handle edge case: no recommendations found
         if not recs:
-            recs = get_popularity_recommendations(n, rated_movies)
+            recs = get_popularity_recommendations(n, rated_movies, allowed_mask)
             source = "popularity (fallback)"
         
+        request.state.source = source
+        request.state.cache_hit = False
+        if shared_cache is not None and not source.startswith("popularity (error"):
+            shared_cache.put(page_key, pack({}, {"recs": recs[:n], "source": source}))
+        
         return RecommendResponse(
             user_id=user_id,
             recommendations=recs[:n],  # Ensure we return exactly n
             source=source,
-            count=len(recs[:n])
+            count=len(recs[:n]),
+            pipeline=pipeline_report or None
         )
         
     except Exception as e:
@@ -429,12 +1418,69 @@ def get_recommendations(
             detail=f"Error generating recommendations: {str(e)}"
         )
 
+@app.get("/movies/search", response_model=SearchResponse)
+def search_movies(q: str, n: int = 10):
+    """
+    Search movies by title
+    
+    - **q**: Title query (typos are tolerated, e.g. "shawshank redemtion")
+    - **n**: Number of results (default: 10, max: 50)
+    
+    Results are ranked by title match quality blended with popularity.
+    """
+    if n < 1 or n > 50:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 50")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    
+    results = title_index.search(q, n)
+    return SearchResponse(query=q, results=results, count=len(results))
+
+@app.get("/movies/{movie_id}/similar", response_model=SimilarResponse)
+def get_similar_movies(movie_id: int, n: int = 10):
+    """
+    Get movies similar to a given movie ("more like this")
+    
+    - **movie_id**: Movie identifier
+    - **n**: Number of similar movies (default: 10, max: NEIGHBORS_K)
+    
+    Served from the precomputed neighbour table (cosine on item factors),
+    so no scoring happens at request time.
+    """
+    max_n = neighbor_idx.shape[1]
+    if n < 1 or n > max_n:
+        raise HTTPException(status_code=400, detail=f"n must be between 1 and {max_n}")
+    if movie_id not in movie_map or movie_id not in movie_info:
+        raise HTTPException(status_code=404, detail=f"Movie {movie_id} not found in the model")
+    
+    m_idx = movie_map[movie_id]
+    similar = []
+    for similar_id, sim in zip(movie_map.to_id(neighbor_idx[m_idx]).tolist(), neighbor_sim[m_idx].tolist()):
+        info = movie_info.get(similar_id)
+        if info is None:
+            continue
+        similar.append({
+            "movie_id": similar_id,
+            "title": info['title'],
+            "genres": info['genres'],
+            "similarity": round(sim, 3)
+        })
+        if len(similar) >= n:
+            break
+    
+    return SimilarResponse(
+        movie_id=movie_id,
+        title=movie_info[movie_id]['title'],
+        similar=similar,
+        count=len(similar)
+    )
+
 @app.get("/user/{user_id}/stats")
-def get_user_stats(user_id: int, db: Session = Depends(get_db)):
-    """Get statistics for a specific user"""
-    user_ratings = db.query(UserRating).filter_by(user_id=user_id).all()
+def get_user_stats(user_id: int):
+    """Get statistics for a specific user (one lookup in the maintained aggregates)"""
+    stats = rating_store.get_user_stats(user_id)
     
-    if not user_ratings:
+    if not stats:
         return {
             "user_id": user_id,
             "total_ratings": 0,
@@ -442,14 +1488,15 @@ def get_user_stats(user_id: int, db: Session = Depends(get_db)):
             "recommendation_type": "cold_start"
         }
     
-    ratings_list = [r.rating for r in user_ratings]
-    
     return {
         "user_id": user_id,
-        "total_ratings": len(user_ratings),
-        "average_rating": round(np.mean(ratings_list), 2),
+        "total_ratings": stats["count"],
+        "average_rating": round(stats["sum"] / stats["count"], 2),
+        "min_rating": stats["min"],
+        "max_rating": stats["max"],
+        "last_rated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stats["last_update"])) if stats["last_update"] else None,
         "in_training_data": user_id in user_map,
-        "recommendation_type": "personalized" if len(user_ratings) >= 5 and user_id in user_map else "cold_start"
+        "recommendation_type": "personalized" if personalization_eligible(user_id, stats["count"]) else "cold_start"
     }
 
 # ────────────────────────────────────────────────
@@ -468,6 +1515,15 @@ def startup_event():
     print("\n📝 API Documentation: http://localhost:8000/docs")
     print("🔄 Health check: http://localhost:8000/\n")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    rating_store.close()
+    if rating_events is not None:
+        rating_events.close()
+    if request_logger is not None:
+        request_logger.close()
+        print(f"📝 Request log: {request_logger.written:,} written, {request_logger.dropped:,} dropped")
+
 # ────────────────────────────────────────────────
 # Run with: uvicorn app:app --reload
 # Or: python -m uvicorn app:app --reload --port 8000
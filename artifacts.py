@@ -0,0 +1,30 @@
+"""
+Helpers shared by the offline jobs that derive artifacts from the model
+"""
+
+import hashlib
+import os
+from typing import Dict
+
+import numpy as np
+
+ROOT_DIR = os.getenv("MODEL_PATH", os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_model(root_dir: str = ROOT_DIR) -> Dict[str, np.ndarray]:
+    """Load funksvd_model.npz into a plain dict of arrays"""
+    with np.load(os.path.join(root_dir, "funksvd_model.npz")) as loaded:
+        return {k: loaded[k] for k in loaded.files}
+
+
+def model_fingerprint(*arrays: np.ndarray) -> str:
+    """
+    Short hash of model arrays, stored in derived artifacts to detect staleness
+
+    Item-only artifacts hash (item_factors, item_bias); per-user artifacts
+    also include the user arrays.
+    """
+    h = hashlib.sha1()
+    for array in arrays:
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()[:16]
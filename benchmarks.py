@@ -0,0 +1,173 @@
+"""
+Micro-benchmarks for the Movie Recommender API hot paths
+
+Runs offline (no server) against the artifacts app.py loads, so MODEL_PATH
+works as usual. Each benchmark is warmed up, then timed over several
+repetitions of a fixed number of calls.
+
+    python benchmarks.py                              # run + compare to benchmark_baseline.json
+    python benchmarks.py --output bench.json          # save results
+    python benchmarks.py --save-baseline              # overwrite the committed baseline
+    python benchmarks.py --threshold 0.25 --only predict_all,top_k
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+import app
+from perf_stats import compare_to_baseline
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def bench(fn: Callable, warmup: int = 3, repeat: int = 7, number: int = 20) -> Dict:
+    """
+    Time `fn` and return per-call statistics in microseconds
+
+    Args:
+        fn: Zero-argument callable
+        warmup: Untimed calls before measuring
+        repeat: Number of timed repetitions
+        number: Calls per repetition
+    """
+    for _ in range(warmup):
+        fn()
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number * 1e6)
+
+    return {
+        "median_us": round(statistics.median(per_call), 2),
+        "mean_us": round(statistics.mean(per_call), 2),
+        "stdev_us": round(statistics.stdev(per_call), 2) if len(per_call) > 1 else 0.0,
+        "min_us": round(min(per_call), 2),
+        "max_us": round(max(per_call), 2),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def build_benchmarks(tmp_dir: str, cleanup: contextlib.ExitStack) -> Dict[str, Callable]:
+    """Create the benchmark closures over the loaded app state (resources are closed by `cleanup`)"""
+    from sqlalchemy import create_engine
+
+    from rating_store import SQLiteRatingStore, WriteBehindRatingStore
+
+    rng = np.random.default_rng(42)
+    n = 10
+    user_id = int(app.user_map.inverse[0])
+    u_idx = app.user_map[user_id]
+    scores = app.model.predict_all(u_idx)
+    all_movie_ids = app.movie_map.inverse  # model index order
+    exclude = set(rng.choice(all_movie_ids, size=50, replace=False).tolist())
+    top_ids = app.movie_map.to_id(app.top_k_indices(scores.copy(), n)).tolist()
+
+    recs, source = app.get_personalized_recommendations(user_id, n, exclude)
+    payload = {"user_id": user_id, "recommendations": recs, "source": source, "count": len(recs)}
+
+    # /rate upsert against throwaway SQLite databases with the app's schema
+    stores = {}
+    for name in ("sqlite", "write_behind"):
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, f'bench_{name}.db')}", echo=False)
+        app.Base.metadata.create_all(engine)
+        table, stats_table = app.UserRating.__table__, app.UserRatingStats.__table__
+        stores[name] = (SQLiteRatingStore(engine, table, stats_table) if name == "sqlite"
+                        else WriteBehindRatingStore(engine, table, tmp_dir, stats_table))
+        cleanup.callback(stores[name].close)
+    rate_counter = iter(range(1, 10**9))
+
+    def rate_upsert(store):
+        request = app.RateRequest(
+            user_id=next(rate_counter) % 500 + 1,
+            ratings=[{"movie_id": int(m), "rating": 4.0} for m in rng.choice(all_movie_ids, 5)],
+        )
+        store.upsert(request.user_id, [(r.movie_id, r.rating) for r in request.ratings])
+
+    return {
+        "predict_all": lambda: app.model.predict_all(u_idx),
+        "top_k": lambda: app.top_k_indices(scores, n * 2),
+        "apply_exclusions": lambda: app.apply_exclusions(scores.copy(), exclude),
+        "popularity_recommendations": lambda: app.get_popularity_recommendations(n, exclude),
+        "metadata_join": lambda: app.get_movie_details(top_ids),
+        "personalized_recommendations": lambda: app.get_personalized_recommendations(user_id, n, exclude),
+        "response_serialization": lambda: app.RecommendResponse(**payload).model_dump_json(),
+        "rate_upsert": lambda: rate_upsert(stores["sqlite"]),
+        "rate_upsert_write_behind": lambda: rate_upsert(stores["write_behind"]),
+        "title_search": lambda: app.title_index.search("jurasic park", n),
+        "user_stats": lambda: app.rating_store.get_user_stats(user_id),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run serving hot-path micro-benchmarks")
+    parser.add_argument("--only", help="Comma-separated benchmark names to run")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed warmup calls")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed repetitions")
+    parser.add_argument("--number", type=int, default=20, help="Calls per repetition")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed median slowdown (0.20 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.ExitStack() as cleanup:
+        benchmarks = build_benchmarks(tmp_dir, cleanup)
+        if args.only:
+            names = args.only.split(",")
+            benchmarks = {k: v for k, v in benchmarks.items() if k in names}
+
+        results = {}
+        for name, fn in benchmarks.items():
+            results[name] = bench(fn, args.warmup, args.repeat, args.number)
+            print(f"{name:<30} median {results[name]['median_us']:>12,.1f} µs  "
+                  f"(±{results[name]['stdev_us']:,.1f})")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "n_users": len(app.user_map),
+            "n_items": len(app.movie_map),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Baseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline["results"], "median_us", args.threshold)
+        if regressions:
+            print("\n❌ Regressions vs baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs baseline (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Streaming bulk rating ingestion (POST /ratings/bulk)
+
+The request body is consumed chunk by chunk; only complete lines are parsed
+and the trailing partial line is carried over, so memory is bounded by the
+batch size rather than the upload size. A line longer than max_line_bytes is
+dropped up to its newline and rejected. Accepted formats:
+
+    NDJSON  {"user_id": 1, "movie_id": 1193, "rating": 5.0} per line
+    CSV     header line naming user_id, movie_id, rating (any order), then rows
+
+Parsed rows are validated with array operations (positive integer user ids
+up to MAX_USER_ID, movie ids present in the catalogue, ratings in [0.5, 5.0] on 0.5 steps) and
+accepted rows are handed to a `write` callback in batches, which upserts
+each batch in one transaction. Rejected rows are reported with their line
+number and reason, up to `max_rejects` of them. A failing `write` raises
+IngestWriteError, so callers can tell it from a malformed upload (ValueError).
+"""
+
+import io
+import json
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from event_log import MAX_USER_ID
+
+COLUMNS = ("user_id", "movie_id", "rating")
+
+
+class IngestWriteError(Exception):
+    """The write callback failed; earlier batches are already committed"""
+
+
+def validate(users: np.ndarray, movies: np.ndarray, ratings: np.ndarray, catalogue: np.ndarray) -> np.ndarray:
+    """
+    Per-row rejection reason (empty string = valid) using vectorized checks
+
+    Args:
+        users / movies / ratings: float64 arrays (NaN = missing or not a number)
+        catalogue: Sorted array of valid movie ids
+    """
+    reasons = np.full(len(users), "", dtype=object)
+
+    def reject(mask, reason):
+        reasons[(reasons == "") & mask] = reason
+
+    reject(np.isnan(users) | np.isnan(movies) | np.isnan(ratings), "malformed row or non-numeric field")
+    with np.errstate(invalid="ignore"):
+        reject((users < 1) | (users != np.floor(users)), "user_id must be a positive integer")
+        reject(users > MAX_USER_ID, f"user_id must be at most {MAX_USER_ID}")
+        reject(movies != np.floor(movies), "movie_id must be an integer")
+        pos = np.clip(np.searchsorted(catalogue, np.nan_to_num(movies)), 0, len(catalogue) - 1)
+        reject(catalogue[pos] != movies, "unknown movie_id")
+        reject((ratings < 0.5) | (ratings > 5.0), "rating must be between 0.5 and 5.0")
+        reject((ratings * 2) % 1 != 0, "rating must be in 0.5 increments")
+    return reasons
+
+
+class BulkIngest:
+    """Incremental parser + validator + batcher for one upload"""
+
+    def __init__(self, fmt: str, catalogue: np.ndarray, write: Callable, batch_size: int = 50000,
+                 max_rejects: int = 1000, max_line_bytes: int = 4096):
+        if fmt not in ("ndjson", "csv"):
+            raise ValueError("format must be 'ndjson' or 'csv'")
+        self.fmt = fmt
+        self.catalogue = catalogue
+        self.write = write
+        self.batch_size = batch_size
+        self.max_rejects = max_rejects
+        self.max_line_bytes = max_line_bytes
+
+        self.carry = b""
+        self.overlong = False  # inside a line that is being dropped
+        self.line_no = 0
+        self.header: Optional[List[str]] = None
+        self.pending: List[np.ndarray] = []
+        self.pending_rows = 0
+
+        self.start = time.perf_counter()
+        self.rows_received = 0
+        self.rows_accepted = 0
+        self.rows_rejected = 0
+        self.batches = 0
+        self.rejects: List[dict] = []
+
+    def feed(self, chunk: bytes):
+        """Parse the complete lines in carry + chunk; flush full batches"""
+        data = self.carry + chunk
+        if self.overlong:
+            end = data.find(b"\n")
+            if end < 0:
+                self.carry = b""
+                return
+            data, self.overlong = data[end + 1:], False
+
+        cut = data.rfind(b"\n")
+        self.carry = data[cut + 1:]
+        if cut >= 0:
+            self._parse(data[:cut + 1])
+
+        if len(self.carry) > self.max_line_bytes:
+            # Drop the rest of this line as it arrives instead of buffering it
+            self.carry, self.overlong = b"", True
+            self.line_no += 1
+            if self.fmt == "csv" and self.header is None:
+                raise ValueError(f"CSV header is longer than {self.max_line_bytes} bytes")
+            self.rows_received += 1
+            self._reject(np.array([self.line_no]), np.array([f"line longer than {self.max_line_bytes} bytes"]))
+
+    def finish(self) -> dict:
+        if self.carry.strip():
+            self._parse(self.carry + b"\n")
+        self.carry = b""
+        self._flush()
+        return self.summary()
+
+    def _parse(self, block: bytes):
+        lines = block.split(b"\n")[:-1]
+        first = self.line_no + 1
+        self.line_no += len(lines)
+
+        if self.fmt == "csv" and self.header is None:
+            header = [c.strip().lower() for c in lines[0].decode("utf-8", "replace").split(",")]
+            if sorted(header) != sorted(COLUMNS):
+                raise ValueError(f"CSV header must name {', '.join(COLUMNS)} (got {header})")
+            self.header = header
+            lines, first = lines[1:], first + 1
+
+        line_numbers = np.arange(first, first + len(lines))
+        blank = np.array([not line.strip() for line in lines], dtype=bool)
+        lines = [line for line, b in zip(lines, blank) if not b]
+        line_numbers = line_numbers[~blank]
+        if not lines:
+            return
+
+        # Over-long lines are not parsed (all NaN) and get their own rejection reason
+        too_long = np.array([len(line) > self.max_line_bytes for line in lines], dtype=bool)
+        values = np.full((len(lines), 3), np.nan)
+        parsed = [line for line, t in zip(lines, too_long) if not t]
+        if parsed:
+            values[~too_long] = self._parse_csv(parsed) if self.fmt == "csv" else self._parse_ndjson(parsed)
+        self._accept(values, line_numbers, too_long)
+
+    def _parse_ndjson(self, lines: List[bytes]) -> np.ndarray:
+        values = np.full((len(lines), 3), np.nan)
+        for i, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+                values[i] = [float(record[c]) for c in COLUMNS]
+            except (ValueError, TypeError, KeyError):
+                pass  # stays NaN → rejected as missing / non-numeric
+        return values
+
+    def _parse_csv(self, lines: List[bytes]) -> np.ndarray:
+        try:
+            frame = pd.read_csv(io.BytesIO(b"\n".join(lines)), header=None, names=self.header,
+                                dtype=str, skip_blank_lines=False)
+        except pd.errors.ParserError:
+            # A row with extra fields: fall back to splitting each line
+            rows = [line.decode("utf-8", "replace").split(",") for line in lines]
+            rows = [r if len(r) == len(self.header) else [None] * len(self.header) for r in rows]
+            frame = pd.DataFrame(rows, columns=self.header)
+        return np.column_stack([pd.to_numeric(frame[c], errors="coerce").to_numpy(np.float64) for c in COLUMNS])
+
+    def _accept(self, values: np.ndarray, line_numbers: np.ndarray, too_long: np.ndarray):
+        self.rows_received += len(values)
+        reasons = validate(values[:, 0], values[:, 1], values[:, 2], self.catalogue)
+        reasons[too_long] = f"line longer than {self.max_line_bytes} bytes"
+        bad = reasons != ""
+        if bad.any():
+            self._reject(line_numbers[bad], reasons[bad])
+
+        good = values[~bad]
+        if len(good):
+            self.pending.append(good)
+            self.pending_rows += len(good)
+        if self.pending_rows >= self.batch_size:
+            self._flush()
+
+    def _reject(self, line_numbers: np.ndarray, reasons: np.ndarray):
+        self.rows_rejected += len(line_numbers)
+        room = self.max_rejects - len(self.rejects)
+        for line, reason in zip(line_numbers[:room].tolist(), reasons[:room].tolist()):
+            self.rejects.append({"line": line, "reason": reason})
+
+    def _flush(self):
+        if not self.pending:
+            return
+        batch = np.concatenate(self.pending)
+        self.pending, self.pending_rows = [], 0
+        for start in range(0, len(batch), self.batch_size):
+            part = batch[start:start + self.batch_size]
+            try:
+                self.write(part[:, 0].astype(np.int64), part[:, 1].astype(np.int64), part[:, 2])
+            except Exception as e:
+                raise IngestWriteError(str(e)) from e
+            self.rows_accepted += len(part)
+            self.batches += 1
+
+    def summary(self) -> dict:
+        seconds = time.perf_counter() - self.start
+        return {
+            "rows_received": self.rows_received,
+            "rows_accepted": self.rows_accepted,
+            "rows_rejected": self.rows_rejected,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(self.rows_received / seconds, 1) if seconds > 0 else None,
+            "rejects": self.rejects,
+            "rejects_truncated": self.rows_rejected > len(self.rejects),
+        }
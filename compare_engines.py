@@ -0,0 +1,145 @@
+"""
+Latency vs quality comparison across recommendation engines
+
+Evaluates every engine from engines.build_engines on one shared split and
+writes a table in the style of ranking_metrics.csv (one row per engine):
+
+    python compare_engines.py                       # → engine_comparison.csv
+    MODEL_PATH=synthetic_1m python compare_engines.py --users 2000
+
+Split: the FunkSVD model was trained on the 80% side of a stratified
+train_test_split (02_modeling.ipynb), so the same split is reproduced here
+(needs scikit-learn; compacted /rate events are merged in the same way, so
+compact only before retraining) and only its 20% test side is scored. For each
+evaluated user (>= 20 ratings, same rule as notebook 03) their training
+ratings are excluded from recommendations, and test ratings >= 4 are the
+relevant items. Popularity statistics come from the training side too.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from data_io import load_table
+from engines import build_engines
+from event_log import with_rating_events
+from id_maps import load_id_maps
+
+ROOT_DIR = os.getenv("MODEL_PATH", os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_split(root_dir: str, n_users: int, holdout: float, seed: int):
+    """Load artifacts and reproduce the model's train / test split in model index space"""
+    model = dict(np.load(os.path.join(root_dir, "funksvd_model.npz")))
+    user_map, movie_map = load_id_maps(root_dir)
+    ratings = with_rating_events(load_table(root_dir, "ratings_processed", ["user_id", "movie_id", "rating"]), root_dir)
+
+    # Same call, row order and seed as 02_modeling.ipynb, so test ratings were never trained on
+    train, test = train_test_split(ratings, test_size=holdout, random_state=seed, stratify=ratings["rating"])
+
+    def to_model_index(df):
+        df = df.assign(user_idx=user_map.to_index(df["user_id"].to_numpy()).astype(np.int64),
+                       item_idx=movie_map.to_index(df["movie_id"].to_numpy()).astype(np.int64))
+        return df[(df["user_idx"] >= 0) & (df["item_idx"] >= 0)]
+
+    train, test = to_model_index(train), to_model_index(test)
+
+    n_items = len(model["item_bias"])
+    item_counts = np.bincount(train["item_idx"], minlength=n_items)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        item_means = np.bincount(train["item_idx"], weights=train["rating"], minlength=n_items) / item_counts
+
+    user_counts = pd.concat([train["user_idx"], test["user_idx"]]).value_counts()
+    eval_users = user_counts[user_counts >= 20].index[:n_users].to_numpy()
+
+    seen = train[train["user_idx"].isin(eval_users)].groupby("user_idx")["item_idx"].apply(np.array)
+    liked = test[test["user_idx"].isin(eval_users) & (test["rating"] >= 4)]
+    relevant = liked.groupby("user_idx")["item_idx"].apply(set)
+
+    users = np.array([u for u in eval_users if u in relevant.index and u in seen.index])
+    excludes = [seen[u] for u in users]
+    return model, item_counts, item_means, users, excludes, [relevant[u] for u in users], n_items
+
+
+def ranking_quality(recs, relevant, n_items, k):
+    """Mean NDCG@k, recall@k, precision@k and catalogue coverage"""
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ndcg, recall, precision = [], [], []
+    recommended = set()
+
+    for items, rel in zip(recs, relevant):
+        hits = np.array([i in rel for i in items[:k]], dtype=np.float64)
+        idcg = discounts[: min(len(rel), k)].sum()
+        ndcg.append((hits * discounts[: len(hits)]).sum() / idcg)
+        recall.append(hits.sum() / len(rel))
+        precision.append(hits.sum() / k)
+        recommended.update(items[:k].tolist())
+
+    return {
+        "ndcg_k": float(np.mean(ndcg)),
+        "recall_k": float(np.mean(recall)),
+        "precision_k": float(np.mean(precision)),
+        "coverage": len(recommended) / n_items,
+    }
+
+
+def serving_cost(engine, users, excludes, k, batch_size, max_timed_users=500):
+    """Microseconds per single request and users/sec through the batch path"""
+    timed = users[:max_timed_users]
+    engine.recommend(timed[0], k, excludes[0])  # warmup
+
+    start = time.perf_counter()
+    for u, ex in zip(timed, excludes):
+        engine.recommend(u, k, ex)
+    us_per_request = (time.perf_counter() - start) / len(timed) * 1e6
+
+    start = time.perf_counter()
+    for b in range(0, len(timed), batch_size):
+        engine.recommend_batch(timed[b:b + batch_size], k, excludes[b:b + batch_size])
+    batch_throughput = len(timed) / (time.perf_counter() - start)
+
+    return {
+        "us_per_request": us_per_request,
+        "batch_users_per_sec": batch_throughput,
+        "memory_mb": engine.memory_bytes() / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recommendation engines on latency and quality")
+    parser.add_argument("--root", default=ROOT_DIR, help="Artifact directory (defaults to MODEL_PATH)")
+    parser.add_argument("--users", type=int, default=1000, help="Number of evaluation users")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for ranking metrics")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="Test fraction of the training split (must match 02_modeling.ipynb)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Users per batch for throughput")
+    parser.add_argument("--seed", type=int, default=42, help="Split seed (must match 02_modeling.ipynb)")
+    parser.add_argument("--output", default="engine_comparison.csv", help="Output CSV path")
+    args = parser.parse_args()
+
+    model, item_counts, item_means, users, excludes, relevant, n_items = load_split(
+        args.root, args.users, args.holdout, args.seed
+    )
+    print(f"Evaluating {len(users):,} users × {n_items:,} items (k={args.k})")
+
+    rows = []
+    for engine in build_engines(model, item_counts, item_means, args.root):
+        recs = engine.recommend_batch(users, args.k, excludes)
+        row = {"engine": engine.name}
+        row.update(ranking_quality(recs, relevant, n_items, args.k))
+        row.update(serving_cost(engine, users, excludes, args.k, args.batch_size))
+        rows.append(row)
+        print(f"✓ {engine.name:<20} NDCG@{args.k}={row['ndcg_k']:.4f}  recall={row['recall_k']:.4f}  "
+              f"{row['us_per_request']:,.0f} µs/req  {row['memory_mb']:.1f} MB")
+
+    table = pd.DataFrame(rows)
+    table.to_csv(args.output, index=False)
+    print(f"\n{table.to_string(index=False)}\n\n✓ Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Content features aligned to model item indices: multi-hot genres + release years
+
+Preprocessing stage that turns the movies_metadata table into arrays indexed
+by model item index, so nothing at request time has to split `genres`
+strings or parse `genres_list`:
+
+    genres   uint8 [n_items, ceil(n_genres / 8)]   bit-packed multi-hot rows (18 genres → 3 bytes/item)
+    years    int16 [n_items]                       release year parsed from the title (0 = unknown)
+
+genre_matrix() unpacks the dense bool (items × genres) matrix for matrix ops
+(genre caps, content profiles) and facet_index() turns both arrays into the
+per-genre / per-year bitsets that /recommend filters with. Items outside the
+metadata are all-zero.
+
+    python content_features.py          # writes content_features.npz next to the model
+
+The API rebuilds the file at startup when it is missing or was built from
+other metadata or another item index mapping (fingerprint mismatch).
+"""
+
+import argparse
+import os
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ROOT_DIR, model_fingerprint
+from data_io import load_table, parse_genre_list
+from facets import FacetIndex, parse_year
+from id_maps import IdMap, load_id_maps
+
+CONTENT_FEATURES_FILE = "content_features.npz"
+
+
+def content_fingerprint(movies: pd.DataFrame, movie_map: IdMap, n_items: int) -> str:
+    """Hash of the item index → movie_id alignment and the metadata columns the features come from"""
+    item_movie_ids = movie_map.to_id(np.arange(n_items))
+    metadata = pd.util.hash_pandas_object(movies[["movie_id", "title", "genres"]].astype(str), index=False)
+    return model_fingerprint(item_movie_ids, metadata.to_numpy())
+
+
+class ContentFeatures:
+    """Bit-packed multi-hot genre rows and release years over model item indices"""
+
+    def __init__(self, genre_names: List[str], genres: np.ndarray, years: np.ndarray, fingerprint: str = ""):
+        self.genre_names = [str(g) for g in genre_names]
+        self.genres = genres
+        self.years = years
+        self.fingerprint = str(fingerprint)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.years)
+
+    @classmethod
+    def build(cls, movies: pd.DataFrame, movie_map: IdMap, n_items: int):
+        idx = movie_map.to_index(movies["movie_id"].to_numpy())
+        known = idx >= 0
+        rows = movies[known]
+        item_idx = idx[known].astype(np.int64)
+
+        # One (item, genre) pair per row, then a single scatter into the matrix
+        # genres_list, falling back to the pipe-separated genres string
+        genre_lists = [parse_genre_list(gl) or str(g).split("|") for gl, g in zip(rows["genres_list"], rows["genres"])]
+        pairs = pd.Series(genre_lists, index=item_idx, dtype=object).explode()
+        pairs = pairs[pairs.notna() & (pairs != "")]
+        genre_names = sorted(pairs.unique())
+        matrix = np.zeros((n_items, len(genre_names)), dtype=bool)
+        matrix[pairs.index.to_numpy(np.int64), pd.Categorical(pairs, categories=genre_names).codes] = True
+
+        years = np.zeros(n_items, dtype=np.int16)
+        years[item_idx] = rows["title"].map(parse_year).to_numpy()
+        return cls(genre_names, np.packbits(matrix, axis=1), years,
+                   content_fingerprint(movies, movie_map, n_items))
+
+    def save(self, path: str):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, genre_names=np.array(self.genre_names), genres=self.genres, years=self.years,
+                     fingerprint=self.fingerprint)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            return cls(f["genre_names"].tolist(), f["genres"], f["years"], str(f["fingerprint"]))
+
+    def genre_matrix(self) -> np.ndarray:
+        """Dense (n_items × n_genres) bool multi-hot matrix, columns in genre_names order"""
+        return np.unpackbits(self.genres, axis=1, count=len(self.genre_names)).astype(bool)
+
+    def facet_index(self) -> FacetIndex:
+        return FacetIndex.from_arrays(self.n_items, self.genre_names, self.genre_matrix(), self.years)
+
+
+def load_or_build_content_features(root_dir: str, movies: pd.DataFrame, movie_map: IdMap,
+                                   n_items: int) -> ContentFeatures:
+    """Load content_features.npz, rebuilding it if it is missing or stale"""
+    path = os.path.join(root_dir, CONTENT_FEATURES_FILE)
+    if os.path.exists(path):
+        features = ContentFeatures.load(path)
+        if features.n_items == n_items and features.fingerprint == content_fingerprint(movies, movie_map, n_items):
+            return features
+
+    features = ContentFeatures.build(movies, movie_map, n_items)
+    try:
+        features.save(path)
+    except OSError as e:
+        print(f"⚠ Could not persist content features: {e}")
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the genre / release-year content feature arrays")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing movies_metadata and the id maps")
+    args = parser.parse_args()
+
+    _, movie_map = load_id_maps(args.root)
+    with np.load(os.path.join(args.root, "funksvd_model.npz")) as model:
+        n_items = len(model["item_bias"])
+    movies = load_table(args.root, "movies_metadata")
+
+    start = time.time()
+    features = ContentFeatures.build(movies, movie_map, n_items)
+    path = os.path.join(args.root, CONTENT_FEATURES_FILE)
+    features.save(path)
+    print(f"✓ Built {n_items:,} × {len(features.genre_names)} genre matrix ({features.genres.nbytes / 1e3:.1f} KB "
+          f"packed) and {np.count_nonzero(features.years):,} release years in {time.time() - start:.2f}s → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Typed Parquet data layer for the processed tables
+
+The pipeline's tables used to be CSVs that pandas re-infers on every load
+(int64 ids, object strings, genres_list as a stringified Python list). Each
+table now has an explicit Arrow schema and is stored as Parquet next to the
+CSV:
+
+    ratings_processed   user_id int32, movie_id int32, rating float32, timestamp int64
+    movies_processed    movie_id int32, title string, genres dictionary (categorical), genres_list list<string>
+    movies_metadata     movie_id int32, title string, genres dictionary (categorical), genres_list list<string>
+    users_processed     user_id int32, gender dictionary, age int8, occupation int8, zip string
+
+load_table() reads the Parquet file when present and otherwise falls back to
+the CSV, coerced to the same dtypes, so older artifact directories still
+load. Convert a directory (streaming, so large rating files are fine) and
+compare load time / memory before and after:
+
+    python data_io.py                 # CSV → Parquet for every table present
+    python data_io.py --compare       # also print CSV vs Parquet load time and memory
+"""
+
+import argparse
+import ast
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ROOT_DIR
+
+CSV_DTYPES = {
+    "ratings_processed": {"user_id": "int32", "movie_id": "int32", "rating": "float32", "timestamp": "int64"},
+    "movies_processed": {"movie_id": "int32", "title": "string", "genres": "category", "genres_list": "list"},
+    "movies_metadata": {"movie_id": "int32", "title": "string", "genres": "category", "genres_list": "list"},
+    "users_processed": {"user_id": "int32", "gender": "category", "age": "int8", "occupation": "int8",
+                        "zip": "string"},
+}
+TABLES = tuple(CSV_DTYPES)
+
+
+def arrow_schema(name: str):
+    import pyarrow as pa
+
+    types = {
+        "int8": pa.int8(), "int32": pa.int32(), "int64": pa.int64(), "float32": pa.float32(),
+        "string": pa.string(), "category": pa.dictionary(pa.int32(), pa.string()), "list": pa.list_(pa.string()),
+    }
+    return pa.schema([(column, types[dtype]) for column, dtype in CSV_DTYPES[name].items()])
+
+
+def parse_genre_list(value) -> List[str]:
+    """genres_list cell, typed or from a CSV: "['Comedy', 'Drama']" → ['Comedy', 'Drama'] ([] if absent)"""
+    if isinstance(value, (list, np.ndarray)):
+        return [str(g) for g in value]
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            return list(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            pass
+    return []
+
+
+def typed_frame(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce a frame (e.g. straight from read_csv) to the table's dtypes"""
+    df = df.copy()
+    for column, dtype in CSV_DTYPES[name].items():
+        if column not in df:
+            if column == "genres_list" and "genres" in df:
+                df[column] = df["genres"].astype(str).str.split("|")
+            continue
+        if dtype == "list":
+            if len(df) and isinstance(df[column].iloc[0], str):
+                df[column] = df[column].map(parse_genre_list)
+        elif dtype == "string":
+            df[column] = df[column].astype(str)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def table_paths(root: str, name: str) -> tuple:
+    return os.path.join(root, f"{name}.parquet"), os.path.join(root, f"{name}.csv")
+
+
+def load_table(root: str, name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a processed table with compact dtypes
+
+    Args:
+        columns: Subset of columns to read (Parquet reads only those)
+    """
+    parquet_path, csv_path = table_paths(root, name)
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path, columns=columns)
+        except ImportError:
+            if not os.path.exists(csv_path):
+                raise
+    df = typed_frame(name, pd.read_csv(csv_path, usecols=columns))
+    return df[columns] if columns else df
+
+
+def write_table(df: pd.DataFrame, root: str, name: str) -> str:
+    """Write a frame as the table's Parquet file (dtypes coerced to the schema)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = table_paths(root, name)[0]
+    table = pa.Table.from_pandas(typed_frame(name, df), schema=arrow_schema(name), preserve_index=False)
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def convert(root: str, name: str, chunk_rows: int = 1_000_000) -> Optional[str]:
+    """Stream <name>.csv into <name>.parquet in row groups of chunk_rows (None if there is no CSV)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_path, csv_path = table_paths(root, name)
+    if not os.path.exists(csv_path):
+        return None
+    schema = arrow_schema(name)
+    with pq.ParquetWriter(parquet_path + ".tmp", schema) as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            writer.write_table(pa.Table.from_pandas(typed_frame(name, chunk), schema=schema, preserve_index=False))
+    os.replace(parquet_path + ".tmp", parquet_path)
+    return parquet_path
+
+
+def measure(root: str, name: str) -> dict:
+    """Load time and in-memory size of the raw CSV read vs the typed Parquet read"""
+    parquet_path, csv_path = table_paths(root, name)
+    result = {"table": name}
+    for label, load in (("csv", lambda: pd.read_csv(csv_path)), ("parquet", lambda: pd.read_parquet(parquet_path))):
+        start = time.perf_counter()
+        df = load()
+        result[f"{label}_s"] = time.perf_counter() - start
+        result[f"{label}_mb"] = df.memory_usage(deep=True).sum() / 2**20
+    result["csv_file_mb"] = os.path.getsize(csv_path) / 2**20
+    result["parquet_file_mb"] = os.path.getsize(parquet_path) / 2**20
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the processed CSVs to typed Parquet")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing the processed CSVs")
+    parser.add_argument("--compare", action="store_true", help="Print CSV vs Parquet load time and memory")
+    args = parser.parse_args()
+
+    for name in TABLES:
+        start = time.time()
+        path = convert(args.root, name)
+        if path is None:
+            print(f"- {name}.csv not found, skipped")
+            continue
+        print(f"✓ {name}.csv → {os.path.basename(path)} in {time.time() - start:.1f}s")
+        if args.compare:
+            m = measure(args.root, name)
+            print(f"  load {m['csv_s'] * 1000:,.0f} ms → {m['parquet_s'] * 1000:,.0f} ms, "
+                  f"memory {m['csv_mb']:.1f} MB → {m['parquet_mb']:.1f} MB, "
+                  f"file {m['csv_file_mb']:.1f} MB → {m['parquet_file_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Recommendation engines behind a common interface, used for offline comparison
+
+Every engine works in model index space (rows of item_factors) and returns
+the top-k item indices for a user index, skipping excluded items. New
+variants (ANN, quantized, materialized...) register themselves in
+`build_engines` so compare_engines.py picks them up automatically.
+"""
+
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from ann_index import ANN_INDEX_FILE, IVFIndex
+from artifacts import model_fingerprint
+from user_clusters import USER_CLUSTERS_FILE, UserClusterLists
+
+
+class RecommenderEngine:
+    """Base class: top-k item indices for one user or a batch of users"""
+
+    name = "base"
+
+    def recommend(self, user_idx: int, k: int, exclude: np.ndarray = None) -> np.ndarray:
+        raise NotImplementedError
+
+    def recommend_batch(self, user_idxs: np.ndarray, k: int, excludes: List[np.ndarray] = None) -> List[np.ndarray]:
+        """Default batch path: one recommend() call per user"""
+        excludes = excludes if excludes is not None else [None] * len(user_idxs)
+        return [self.recommend(u, k, ex) for u, ex in zip(user_idxs, excludes)]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the arrays needed to serve requests"""
+        return 0
+
+
+def top_k_from_scores(scores: np.ndarray, k: int, exclude: np.ndarray = None) -> np.ndarray:
+    """Top-k indices (best first) after masking excluded items; argpartition avoids a full sort"""
+    if exclude is not None and len(exclude):
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class PopularityEngine(RecommenderEngine):
+    """Same weighted-popularity ranking the API uses for cold start"""
+
+    name = "popularity"
+
+    def __init__(self, item_counts: np.ndarray, item_means: np.ndarray, min_count: int = 50):
+        score = item_means * np.log1p(item_counts)
+        score[item_counts < min_count] = -np.inf
+        self.ranked = np.argsort(-score, kind="stable")[: int((item_counts >= min_count).sum())]
+
+    def recommend(self, user_idx, k, exclude=None):
+        if exclude is None or not len(exclude):
+            return self.ranked[:k]
+        keep = ~np.isin(self.ranked[: k + len(exclude)], exclude)
+        return self.ranked[: k + len(exclude)][keep][:k]
+
+    def memory_bytes(self):
+        return self.ranked.nbytes
+
+
+class FunkSVDEngine(RecommenderEngine):
+    """Exact scoring of every item: global_mean + biases + user·item"""
+
+    name = "funksvd_exact"
+
+    def __init__(self, user_factors, item_factors, user_bias, item_bias, global_mean):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_bias = user_bias
+        self.item_bias = item_bias
+        self.global_mean = global_mean
+
+    def scores(self, user_idx: int) -> np.ndarray:
+        return (self.global_mean + self.user_bias[user_idx] + self.item_bias
+                + self.item_factors @ self.user_factors[user_idx])
+
+    def recommend(self, user_idx, k, exclude=None):
+        return top_k_from_scores(self.scores(user_idx), k, exclude)
+
+    def recommend_batch(self, user_idxs, k, excludes=None):
+        scores = (self.global_mean + self.user_bias[user_idxs][:, None] + self.item_bias[None, :]
+                  + self.user_factors[user_idxs] @ self.item_factors.T)
+        excludes = excludes if excludes is not None else [None] * len(user_idxs)
+        return [top_k_from_scores(row, k, ex) for row, ex in zip(scores, excludes)]
+
+    def memory_bytes(self):
+        return sum(a.nbytes for a in (self.user_factors, self.item_factors, self.user_bias, self.item_bias))
+
+
+class ANNEngine(RecommenderEngine):
+    """IVF approximate MIPS over item factors (ann_index.py)"""
+
+    def __init__(self, index: IVFIndex, user_factors: np.ndarray, n_probe: int = None):
+        self.index = index
+        self.user_factors = user_factors
+        self.n_probe = n_probe or index.n_probe
+        self.name = f"funksvd_ann_p{self.n_probe}"
+
+    def recommend(self, user_idx, k, exclude=None):
+        items, _ = self.index.search(self.user_factors[user_idx], k, self.n_probe, exclude)
+        return items
+
+    def memory_bytes(self):
+        return self.index.memory_bytes() + self.user_factors.nbytes
+
+
+class UserClusterEngine(RecommenderEngine):
+    """Per-cluster precomputed lists over k-means user clusters (user_clusters.py)"""
+
+    def __init__(self, clusters: UserClusterLists):
+        self.clusters = clusters
+        self.name = f"user_cluster_c{clusters.n_clusters}"
+
+    def recommend(self, user_idx, k, exclude=None):
+        items, _ = self.clusters.search(int(self.clusters.assignments[user_idx]), k, exclude)
+        return items
+
+    def memory_bytes(self):
+        return self.clusters.memory_bytes()
+
+
+def build_engines(model: Dict[str, np.ndarray], item_counts: np.ndarray, item_means: np.ndarray,
+                  artifact_dir: str = None) -> List[RecommenderEngine]:
+    """
+    Construct every engine whose artifacts are available
+
+    Args:
+        model: Arrays from funksvd_model.npz
+        item_counts: Ratings per item index
+        item_means: Mean rating per item index
+        artifact_dir: Directory holding optional precomputed artifacts
+    """
+    engines = [
+        PopularityEngine(item_counts, item_means),
+        FunkSVDEngine(model["user_factors"], model["item_factors"], model["user_bias"],
+                      model["item_bias"], float(model["global_mean"])),
+    ]
+
+    ann_path = os.path.join(artifact_dir, ANN_INDEX_FILE) if artifact_dir else None
+    if ann_path and os.path.exists(ann_path):
+        index = IVFIndex.load(ann_path)
+        if index.fingerprint == model_fingerprint(model["item_factors"], model["item_bias"]):
+            # Default probe count plus a cheaper and a more accurate setting
+            for n_probe in sorted({max(1, index.n_probe // 2), index.n_probe, min(index.n_lists, index.n_probe * 2)}):
+                engines.append(ANNEngine(index, model["user_factors"], n_probe))
+
+    clusters_path = os.path.join(artifact_dir, USER_CLUSTERS_FILE) if artifact_dir else None
+    if clusters_path and os.path.exists(clusters_path):
+        clusters = UserClusterLists.load(clusters_path)
+        if clusters.fingerprint == model_fingerprint(model["user_factors"], model["user_bias"],
+                                                     model["item_factors"], model["item_bias"]):
+            engines.append(UserClusterEngine(clusters))
+
+    return engines
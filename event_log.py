@@ -0,0 +1,308 @@
+"""
+Append-only rating event log with compaction into columnar snapshots
+
+Every /rate event is appended as a fixed 20-byte record
+(ts_ms int64, user_id int32, movie_id int32, rating float32) to numbered
+segment files (events-000001.bin, ...). Unlike user_ratings, which only
+keeps the latest value, the log keeps full history with timestamps.
+
+Each writer (one per API worker) appends to its own segment and holds an
+exclusive flock on it while it is open; it rolls to a new segment once the
+current one reaches --segment-mb or has been open for --segment-s seconds,
+and on shutdown. Segment numbers are allocated under data/rating_events/
+segments.lock, so workers never share a file.
+
+Compaction folds every unlocked segment not yet compacted into one delta
+snapshot directory of column files (user_id.npy, movie_id.npy, rating.npy,
+ts_ms.npy - or ratings.parquet with --format parquet). It can run while the
+API is up, and with_rating_events() merges the snapshots into the ratings
+the training notebook (02_modeling.ipynb) and compare_engines.py load:
+
+    python event_log.py                     # compact new closed segments
+    python event_log.py --latest-only       # keep only the last event per (user, movie)
+    python event_log.py --delete            # remove segments once compacted
+"""
+
+import argparse
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ROOT_DIR
+
+EVENT_DTYPE = np.dtype([("ts_ms", "<i8"), ("user_id", "<i4"), ("movie_id", "<i4"), ("rating", "<f4")])
+MAX_USER_ID = int(np.iinfo(EVENT_DTYPE["user_id"]).max)  # larger ids would wrap in a record
+EVENTS_DIR = os.path.join("data", "rating_events")
+SNAPSHOTS_DIR = os.path.join("data", "rating_snapshots")
+MANIFEST_FILE = "compacted.json"
+LOCK_FILE = "segments.lock"
+
+
+def segment_paths(log_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(log_dir, "events-*.bin")))
+
+
+def segment_number(path: str) -> int:
+    return int(os.path.basename(path)[len("events-"):-len(".bin")])
+
+
+def read_manifest(log_dir: str) -> Dict:
+    path = os.path.join(log_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"last_segment": 0, "compacted": [], "snapshots": []}
+    with open(path) as f:
+        manifest = json.load(f)
+    # Older manifests compacted segments in order and only kept the high-water mark
+    manifest.setdefault("compacted", list(range(1, manifest["last_segment"] + 1)))
+    return manifest
+
+
+def read_segment(path: str) -> np.ndarray:
+    """Structured array of a segment's events (a torn trailing record is ignored)"""
+    n = os.path.getsize(path) // EVENT_DTYPE.itemsize
+    return np.fromfile(path, dtype=EVENT_DTYPE, count=n)
+
+
+class DirectoryLock:
+    """Exclusive flock on <log_dir>/segments.lock (segment allocation and compaction)"""
+
+    def __init__(self, log_dir: str):
+        self.path = os.path.join(log_dir, LOCK_FILE)
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+
+
+class RatingEventLog:
+    """Thread-safe appender over this process's own rolling segment files"""
+
+    def __init__(self, log_dir: str, segment_bytes: int = 64 * 2**20, segment_seconds: float = 300,
+                 fsync: bool = False):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._open()
+
+        # Roll idle segments too, so compaction sees recent events without waiting for traffic
+        self._stop = threading.Event()
+        self._thread = None
+        if segment_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name="event-log-roller", daemon=True)
+            self._thread.start()
+
+    def _open(self):
+        """Create the next segment and lock it before any other process can see it unlocked"""
+        with DirectoryLock(self.log_dir):
+            # Never reuse a number that compaction has already consumed (segments may be deleted)
+            existing = segment_paths(self.log_dir)
+            self.segment = max(segment_number(existing[-1]) if existing else 0,
+                               read_manifest(self.log_dir)["last_segment"]) + 1
+            self.path = os.path.join(self.log_dir, f"events-{self.segment:06d}.bin")
+            self.file = open(self.path, "xb")
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        self.opened_at = time.monotonic()
+
+    def _close_segment(self):
+        empty = self.file.tell() == 0
+        self.file.close()  # releases the flock
+        if empty:
+            os.remove(self.path)
+
+    def _roll(self):
+        self._close_segment()
+        self._open()
+
+    def _run(self):
+        while not self._stop.wait(self.segment_seconds / 4):
+            with self._lock:
+                if self.file.closed or not self.file.tell():
+                    continue
+                if time.monotonic() - self.opened_at >= self.segment_seconds:
+                    self._roll()
+
+    def append(self, user_id: int, ratings: Iterable[Tuple[int, float]], ts_ms: int = None):
+        """Append one event per (movie_id, rating) with a shared timestamp"""
+        ratings = list(ratings)
+        records = np.empty(len(ratings), dtype=EVENT_DTYPE)
+        records["ts_ms"] = ts_ms if ts_ms is not None else int(time.time() * 1000)
+        records["user_id"] = user_id
+        records["movie_id"] = [m for m, _ in ratings]
+        records["rating"] = [r for _, r in ratings]
+        self.append_records(records)
+
+    def append_records(self, records: np.ndarray):
+        with self._lock:
+            self.file.write(records.tobytes())
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            if self.file.tell() >= self.segment_bytes:
+                self._roll()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if not self.file.closed:
+                self._close_segment()
+
+
+def compact(log_dir: str, snapshot_dir: str, latest_only: bool = False, fmt: str = "npy",
+            delete: bool = False) -> Dict:
+    """
+    Fold closed, not-yet-compacted segments into one delta snapshot
+
+    Segments still locked by a running writer are skipped; a crashed
+    writer's segment is unlocked and gets compacted (minus any torn record).
+
+    Returns:
+        Summary dict (snapshot path, segments, events) or {} if there was nothing to do
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    with DirectoryLock(log_dir):
+        manifest = read_manifest(log_dir)
+        compacted = set(manifest["compacted"])
+
+        paths, files = [], []
+        for path in segment_paths(log_dir):
+            if segment_number(path) in compacted:
+                continue
+            f = open(path, "rb")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()  # a live writer's active segment
+                continue
+            paths.append(path)
+            files.append(f)
+
+        try:
+            if not paths:
+                return {}
+            summary = _write_snapshot(paths, snapshot_dir, latest_only, fmt)
+        finally:
+            for f in files:
+                f.close()
+
+        numbers = [segment_number(p) for p in paths]
+        manifest["last_segment"] = max(manifest["last_segment"], numbers[-1])
+        manifest["compacted"] = sorted(compacted.union(numbers))
+        manifest["snapshots"].append(summary)
+        manifest_path = os.path.join(log_dir, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        if delete:
+            for p in paths:
+                os.remove(p)
+    return summary
+
+
+def _write_snapshot(paths: List[str], snapshot_dir: str, latest_only: bool, fmt: str) -> Dict:
+    events = np.concatenate([read_segment(p) for p in paths])
+    events = events[np.argsort(events["ts_ms"], kind="stable")]
+    if latest_only:
+        # Last event per (user, movie): reverse so np.unique's first hit is the latest
+        keys = events["user_id"].astype(np.int64) << 32 | events["movie_id"].astype(np.int64)
+        _, last = np.unique(keys[::-1], return_index=True)
+        events = events[::-1][np.sort(last)][::-1]
+
+    numbers = [segment_number(p) for p in paths]
+    out = os.path.join(snapshot_dir, f"snapshot-{numbers[0]:06d}-{numbers[-1]:06d}")
+    if not len(events):
+        out = None  # empty segments: advance the manifest without writing a snapshot
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(out, exist_ok=True)
+        table = pa.table({name: events[name] for name in EVENT_DTYPE.names})
+        pq.write_table(table, os.path.join(out, "ratings.parquet"))
+    else:
+        os.makedirs(out, exist_ok=True)
+        for name in EVENT_DTYPE.names:
+            np.save(os.path.join(out, f"{name}.npy"), np.ascontiguousarray(events[name]))
+
+    return {"path": out, "segments": numbers, "events": int(len(events)),
+            "latest_only": latest_only, "format": fmt}
+
+
+def load_snapshots(snapshot_dir: str) -> Dict[str, np.ndarray]:
+    """Concatenate every snapshot (oldest first) into {column: array} for training"""
+    columns = {name: [] for name in EVENT_DTYPE.names}
+    for path in sorted(glob.glob(os.path.join(snapshot_dir, "snapshot-*"))):
+        parquet = os.path.join(path, "ratings.parquet")
+        if os.path.exists(parquet):
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(parquet)
+            for name in columns:
+                columns[name].append(table[name].to_numpy())
+        else:
+            for name in columns:
+                columns[name].append(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+    return {name: (np.concatenate(parts) if parts else np.array([], dtype=EVENT_DTYPE[name]))
+            for name, parts in columns.items()}
+
+
+def with_rating_events(ratings: pd.DataFrame, root_dir: str = ROOT_DIR) -> pd.DataFrame:
+    """
+    ratings_processed rows plus the compacted /rate events, latest rating per (user, movie)
+
+    Events keep ratings' columns and dtypes (timestamp in seconds) and come after
+    the original rows, so without snapshots the frame is returned unchanged.
+    """
+    events = load_snapshots(os.path.join(root_dir, SNAPSHOTS_DIR))
+    if not len(events["ts_ms"]):
+        return ratings
+    order = np.argsort(events["ts_ms"], kind="stable")
+    new = pd.DataFrame({
+        "user_id": events["user_id"][order],
+        "movie_id": events["movie_id"][order],
+        "rating": events["rating"][order],
+        "timestamp": events["ts_ms"][order] // 1000,
+    })
+    new = new[list(ratings.columns)].astype(ratings.dtypes.to_dict())
+    merged = pd.concat([ratings, new], ignore_index=True)
+    return merged.drop_duplicates(["user_id", "movie_id"], keep="last").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the rating event log into columnar snapshots")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing data/rating_events")
+    parser.add_argument("--output", default=None, help="Snapshot directory (default data/rating_snapshots)")
+    parser.add_argument("--latest-only", action="store_true", help="Keep only the last event per (user, movie)")
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy", help="Column file format")
+    parser.add_argument("--delete", action="store_true", help="Delete segments after compaction")
+    args = parser.parse_args()
+
+    log_dir = os.path.join(args.root, EVENTS_DIR)
+    snapshot_dir = args.output or os.path.join(args.root, SNAPSHOTS_DIR)
+    start = time.time()
+    summary = compact(log_dir, snapshot_dir, args.latest_only, args.format, args.delete)
+    if not summary:
+        print("✓ Nothing to compact")
+        return
+    print(f"✓ Compacted {len(summary['segments'])} segments "
+          f"({summary['events']:,} events) in {time.time() - start:.1f}s → {summary['path'] or 'no snapshot'}")
+
+
+if __name__ == "__main__":
+    main()
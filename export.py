@@ -0,0 +1,185 @@
+"""
+Streaming exports (GET /export/ratings, GET /export/recommendations)
+
+Rows are produced page by page by generators and encoded as they go, so an
+export of any size holds one page in memory. Ratings are read with keyset
+pagination on the (user_id, movie_id) primary key - each page is its own
+short query (WHERE (user_id, movie_id) > last key ORDER BY ... LIMIT n), so
+no read transaction stays open across the export and /rate writers only
+wait for a single page. A client can resume an interrupted export from the
+last key it received (after_user / after_movie). With a sharded rating store
+the per-shard keyset streams are merged, so the output order is the same.
+
+Formats: NDJSON, CSV (header once) and Arrow IPC stream (requires pyarrow).
+An empty export is still a valid file: a CSV header, or an Arrow stream with
+the schema and no record batches.
+"""
+
+import heapq
+import io
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table, select, tuple_
+from sqlalchemy.engine import Engine
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Column dtypes of each export (also the schema of an empty export)
+RATING_COLUMNS = {"user_id": "int64", "movie_id": "int64", "rating": "float64"}
+RECOMMENDATION_COLUMNS = {"user_id": "int64", "rank": "int32", "movie_id": "int64", "predicted_rating": "float64",
+                          "source": "str"}
+
+
+def check_format(fmt: str):
+    """Raise ValueError for an unknown format or Arrow without pyarrow installed"""
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_MEDIA_TYPES)}")
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Arrow export requires pyarrow (pip install pyarrow)")
+
+
+def _iter_key_pages(engine: Engine, table: Table, page_rows: int, after: Optional[tuple],
+                    limit: Optional[int]) -> Iterator[list]:
+    """Row pages of one database in primary-key order, one short query per page"""
+    t = table.c
+    key = tuple_(t.user_id, t.movie_id)
+    sent = 0
+    while limit is None or sent < limit:
+        n = page_rows if limit is None else min(page_rows, limit - sent)
+        query = select(t.user_id, t.movie_id, t.rating).order_by(t.user_id, t.movie_id).limit(n)
+        if after is not None:
+            query = query.where(key > tuple_(*after))
+        with engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        if not rows:
+            return
+        yield rows
+        sent += len(rows)
+        after = tuple(rows[-1][:2])
+        if len(rows) < n:
+            return
+
+
+def iter_rating_pages(engines: List[Engine], table: Table, page_rows: int = 10000,
+                      after: Optional[tuple] = None, limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Pages of user_ratings in primary-key order across one or more shard databases
+
+    Args:
+        after: Resume after this (user_id, movie_id) key
+        limit: Stop after this many rows (None = all)
+    """
+    columns = list(RATING_COLUMNS)
+    if len(engines) == 1:
+        for rows in _iter_key_pages(engines[0], table, page_rows, after, limit):
+            yield pd.DataFrame(rows, columns=columns)
+        return
+
+    # Shards hold disjoint users: k-way merge of their keyset streams keeps the global order
+    streams = [chain.from_iterable(_iter_key_pages(e, table, page_rows, after, limit)) for e in engines]
+    merged = islice(heapq.merge(*streams, key=lambda row: (row[0], row[1])), limit)
+    while page := list(islice(merged, page_rows)):
+        yield pd.DataFrame(page, columns=columns)
+
+
+def iter_stored_user_ids(engines: List[Engine], table: Table, page_rows: int = 10000,
+                         after_user: Optional[int] = None) -> Iterator[int]:
+    """Distinct user ids in user_ratings across shard databases, ascending, paged by keyset"""
+    yield from heapq.merge(*(_iter_user_ids(e, table, page_rows, after_user) for e in engines))
+
+
+def _iter_user_ids(engine: Engine, table: Table, page_rows: int, after_user: Optional[int]) -> Iterator[int]:
+    t = table.c
+    while True:
+        query = select(t.user_id).distinct().order_by(t.user_id).limit(page_rows)
+        if after_user is not None:
+            query = query.where(t.user_id > after_user)
+        with engine.connect() as conn:
+            users = conn.execute(query).scalars().all()
+        yield from users
+        if len(users) < page_rows:
+            return
+        after_user = users[-1]
+
+
+def iter_recommendation_pages(user_ids: Iterable[int], rank: Callable, users_per_page: int = 256
+                              ) -> Iterator[pd.DataFrame]:
+    """
+    Pages of (user_id, rank, movie_id, predicted_rating, source) rows
+
+    Args:
+        rank: user_id -> (movie_ids, predicted ratings or None, source)
+    """
+    columns = {"user_id": [], "rank": [], "movie_id": [], "predicted_rating": [], "source": []}
+    n_users = 0
+    for user_id in user_ids:
+        movie_ids, predicted, source = rank(user_id)
+        k = len(movie_ids)
+        columns["user_id"].append(np.full(k, user_id, dtype=np.int64))
+        columns["rank"].append(np.arange(1, k + 1, dtype=np.int32))
+        columns["movie_id"].append(np.asarray(movie_ids, dtype=np.int64))
+        columns["predicted_rating"].append(
+            np.round(np.asarray(predicted, dtype=np.float64), 2) if predicted is not None else np.full(k, np.nan)
+        )
+        columns["source"].append(np.full(k, source, dtype=object))
+        n_users += 1
+        if n_users == users_per_page:
+            yield pd.DataFrame({c: np.concatenate(parts) for c, parts in columns.items()})
+            columns = {c: [] for c in columns}
+            n_users = 0
+    if n_users:
+        yield pd.DataFrame({c: np.concatenate(parts) for c, parts in columns.items()})
+
+
+def encode_pages(pages: Iterable[pd.DataFrame], fmt: str, columns: Dict[str, str]) -> Iterator[bytes]:
+    """
+    Encode DataFrame pages as one continuous NDJSON / CSV / Arrow IPC stream
+
+    Args:
+        columns: Column name -> dtype, used for the header / schema when there are no pages
+    """
+    if fmt == "arrow":
+        yield from _encode_arrow(pages, columns)
+        return
+    first = True
+    for page in pages:
+        if fmt == "csv":
+            yield page.to_csv(index=False, header=first).encode()
+        elif len(page):
+            yield page.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+        first = False
+    if first and fmt == "csv":
+        yield (",".join(columns) + "\n").encode()
+
+
+def _encode_arrow(pages: Iterable[pd.DataFrame], columns: Dict[str, str]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    for page in pages:
+        batch = pa.RecordBatch.from_pandas(page, preserve_index=False)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is None:
+        # Nothing to export: schema message only
+        writer = pa.ipc.new_stream(sink, pa.schema([
+            (name, pa.string() if dtype == "str" else pa.from_numpy_dtype(np.dtype(dtype)))
+            for name, dtype in columns.items()
+        ]))
+    writer.close()
+    yield sink.getvalue()
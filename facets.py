@@ -0,0 +1,91 @@
+"""
+Genre and release-year facet bitsets aligned to model item indices
+
+Built once at startup from the content feature arrays (content_features.py):
+one packed bitset per genre, per decade and per year. A filter such as "Comedy or Romance, 1990-1999"
+becomes a handful of byte-wise OR/AND operations over n_items/8 bytes, and
+the resulting mask is applied to the scores together with the exclusions
+before top-k, so filtered requests cost about the same as unfiltered ones.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+YEAR_PATTERN = re.compile(r"\((\d{4})\)\s*$")
+
+
+def parse_year(title: str) -> int:
+    """Release year from a MovieLens title like 'Toy Story (1995)' (0 if absent)"""
+    match = YEAR_PATTERN.search(str(title))
+    return int(match.group(1)) if match else 0
+
+
+class FacetIndex:
+    """Packed per-genre / per-decade / per-year bitsets over item indices"""
+
+    def __init__(self, n_items: int, genre_bits: Dict[str, np.ndarray],
+                 decade_bits: Dict[int, np.ndarray], year_bits: Dict[int, np.ndarray]):
+        self.n_items = n_items
+        self.genre_bits = genre_bits
+        self.decade_bits = decade_bits
+        self.year_bits = year_bits
+        self.all_bits = np.packbits(np.ones(n_items, dtype=bool))
+
+    @property
+    def genres(self) -> List[str]:
+        return sorted(self.genre_bits)
+
+    @classmethod
+    def from_arrays(cls, n_items: int, genre_names: List[str], genre_matrix: np.ndarray, years: np.ndarray):
+        """
+        Build from a dense (n_items × n_genres) multi-hot matrix and a per-item year array
+        """
+        genre_bits = {g: np.packbits(genre_matrix[:, j].astype(bool)) for j, g in enumerate(genre_names)}
+        year_bits = {int(y): np.packbits(years == y) for y in np.unique(years) if y > 0}
+        decade_bits = {}
+        for y, bits in year_bits.items():
+            d = y // 10 * 10
+            decade_bits[d] = bits if d not in decade_bits else decade_bits[d] | bits
+        return cls(n_items, genre_bits, decade_bits, year_bits)
+
+    def genre_matrix(self) -> np.ndarray:
+        """Dense (n_items × n_genres) bool matrix, columns in `genres` order"""
+        return np.stack(
+            [np.unpackbits(self.genre_bits[g], count=self.n_items).astype(bool) for g in self.genres], axis=1
+        )
+
+    def _year_range_bits(self, year_min: Optional[int], year_max: Optional[int]) -> np.ndarray:
+        lo = year_min if year_min is not None else min(self.year_bits, default=0)
+        hi = year_max if year_max is not None else max(self.year_bits, default=0)
+        bits = np.zeros_like(self.all_bits)
+        for d, d_bits in self.decade_bits.items():
+            if lo <= d and d + 9 <= hi:
+                bits |= d_bits          # whole decade inside the range
+            elif d + 9 >= lo and d <= hi:
+                for y in range(max(lo, d), min(hi, d + 9) + 1):
+                    if y in self.year_bits:
+                        bits |= self.year_bits[y]
+        return bits
+
+    def mask(self, genres: Optional[List[str]] = None, year_min: Optional[int] = None,
+             year_max: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Boolean mask (n_items) of items passing the filters, or None if no filter is set
+
+        Genres are OR-ed ("any of"); the year range is inclusive.
+        """
+        if not genres and year_min is None and year_max is None:
+            return None
+
+        bits = self.all_bits.copy()
+        if genres:
+            genre_bits = np.zeros_like(bits)
+            for g in genres:
+                genre_bits |= self.genre_bits[g]
+            bits &= genre_bits
+        if year_min is not None or year_max is not None:
+            bits &= self._year_range_bits(year_min, year_max)
+
+        return np.unpackbits(bits, count=self.n_items).astype(bool)
@@ -0,0 +1,154 @@
+"""
+Original user / movie id ↔ dense model index mappings as sorted arrays
+
+id_mappings.pkl holds four Python dicts that every worker unpickles (one
+boxed int pair per entry) and that translate one id at a time. id_maps.npz
+stores each mapping as two int arrays instead:
+
+    <name>_ids     sorted original ids            (lookup: one searchsorted call for any batch)
+    <name>_index   model index of each sorted id
+
+and the dense inverse (model index → original id, -1 for gaps) is rebuilt at
+load time with one scatter. Convert an existing artifact directory:
+
+    python id_maps.py                   # id_mappings.pkl → id_maps.npz
+
+load_id_maps() reads id_maps.npz and otherwise converts id_mappings.pkl (and
+writes id_maps.npz for the next start). The npz records a fingerprint of the
+pickle it was built from; when id_mappings.pkl is present and no longer
+matches (a retrained model), the npz is rebuilt from it.
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Iterable
+
+import joblib
+import numpy as np
+
+from artifacts import ROOT_DIR, model_fingerprint
+
+ID_MAPS_FILE = "id_maps.npz"
+ID_MAPPINGS_PKL = "id_mappings.pkl"
+
+
+class IdMap:
+    """Sorted-array id → index lookup with a dense index → id inverse"""
+
+    def __init__(self, ids: np.ndarray, index: np.ndarray):
+        order = np.argsort(ids, kind="stable")
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.index = np.asarray(index, dtype=np.int32)[order]
+        self.inverse = np.full(int(self.index.max()) + 1 if len(self.index) else 0, -1, dtype=np.int64)
+        self.inverse[self.index] = self.ids
+
+    @classmethod
+    def from_ids(cls, ids_by_index: Iterable[int]):
+        """Mapping where the i-th id gets model index i"""
+        ids = np.fromiter(ids_by_index, dtype=np.int64)
+        return cls(ids, np.arange(len(ids), dtype=np.int32))
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[int, int]):
+        ids = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+        index = np.fromiter(mapping.values(), dtype=np.int32, count=len(mapping))
+        return cls(ids, index)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, original_id) -> bool:
+        pos = np.searchsorted(self.ids, original_id)
+        return bool(pos < len(self.ids) and self.ids[pos] == original_id)
+
+    def __getitem__(self, original_id) -> int:
+        pos = np.searchsorted(self.ids, original_id)
+        if pos == len(self.ids) or self.ids[pos] != original_id:
+            raise KeyError(original_id)
+        return int(self.index[pos])
+
+    def to_index(self, original_ids) -> np.ndarray:
+        """Model indices of a batch of original ids (-1 where the id is not mapped)"""
+        original_ids = np.asarray(original_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(original_ids.shape, -1, dtype=np.int32)
+        pos = np.minimum(np.searchsorted(self.ids, original_ids), len(self.ids) - 1)
+        return np.where(self.ids[pos] == original_ids, self.index[pos], -1).astype(np.int32)
+
+    def to_id(self, indices) -> np.ndarray:
+        """Original ids of a batch of model indices (-1 where the index is not mapped)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        ids = np.full(indices.shape, -1, dtype=np.int64)
+        valid = (indices >= 0) & (indices < len(self.inverse))
+        ids[valid] = self.inverse[indices[valid]]
+        return ids
+
+    def memory_bytes(self) -> int:
+        return self.ids.nbytes + self.index.nbytes + self.inverse.nbytes
+
+
+def pickle_fingerprint(pkl_path: str) -> str:
+    """Fingerprint of id_mappings.pkl, stored in id_maps.npz to detect a stale conversion"""
+    with open(pkl_path, "rb") as f:
+        return model_fingerprint(np.frombuffer(f.read(), dtype=np.uint8))
+
+
+def save_id_maps(path: str, user_map: IdMap, movie_map: IdMap, fingerprint: str = ""):
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, user_ids=user_map.ids, user_index=user_map.index,
+                 movie_ids=movie_map.ids, movie_index=movie_map.index, fingerprint=fingerprint)
+    os.replace(path + ".tmp", path)
+
+
+def load_id_maps(root_dir: str = ROOT_DIR) -> tuple:
+    """
+    (user_map, movie_map) IdMaps from id_maps.npz, converting id_mappings.pkl if needed
+
+    The npz is used as-is when there is no pickle (e.g. synthetic artifacts)
+    or when its stored fingerprint matches the pickle's.
+    """
+    path = os.path.join(root_dir, ID_MAPS_FILE)
+    pkl_path = os.path.join(root_dir, ID_MAPPINGS_PKL)
+    fingerprint = pickle_fingerprint(pkl_path) if os.path.exists(pkl_path) else None
+    if os.path.exists(path):
+        with np.load(path) as f:
+            stored = str(f["fingerprint"]) if "fingerprint" in f.files else ""
+            if fingerprint is None or stored == fingerprint:
+                return IdMap(f["user_ids"], f["user_index"]), IdMap(f["movie_ids"], f["movie_index"])
+        print(f"⚠ {ID_MAPS_FILE} was not built from the current {ID_MAPPINGS_PKL}: rebuilding it")
+
+    mappings = joblib.load(pkl_path)
+    user_map, movie_map = IdMap.from_dict(mappings["user_map"]), IdMap.from_dict(mappings["movie_map"])
+    try:
+        save_id_maps(path, user_map, movie_map, fingerprint)
+    except OSError as e:
+        print(f"⚠ Could not persist {ID_MAPS_FILE}: {e}")
+    return user_map, movie_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert id_mappings.pkl to sorted-array id_maps.npz")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing id_mappings.pkl")
+    args = parser.parse_args()
+
+    pkl_path = os.path.join(args.root, ID_MAPPINGS_PKL)
+    start = time.perf_counter()
+    mappings = joblib.load(pkl_path)
+    pkl_s = time.perf_counter() - start
+
+    user_map, movie_map = IdMap.from_dict(mappings["user_map"]), IdMap.from_dict(mappings["movie_map"])
+    path = os.path.join(args.root, ID_MAPS_FILE)
+    save_id_maps(path, user_map, movie_map, pickle_fingerprint(pkl_path))
+
+    start = time.perf_counter()
+    load_id_maps(args.root)
+    npz_s = time.perf_counter() - start
+    print(f"✓ Wrote {len(user_map):,} user and {len(movie_map):,} movie ids → {path}")
+    print(f"  load {pkl_s * 1000:,.1f} ms → {npz_s * 1000:,.1f} ms, "
+          f"file {os.path.getsize(pkl_path) / 1e6:.2f} MB → {os.path.getsize(path) / 1e6:.2f} MB, "
+          f"arrays {(user_map.memory_bytes() + movie_map.memory_bytes()) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
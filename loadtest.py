@@ -0,0 +1,143 @@
+"""
+Concurrent load generator for the Movie Recommender API
+
+Simulates users walking through the Streamlit journey:
+    1. cold-start GET /recommend (onboarding carousel)
+    2. POST /rate for 5 movies, one call per movie
+    3. personalized GET /recommend
+    4. GET /user/{id}/stats
+
+Users arrive as a Poisson process at each configured rate. Start the API first:
+    uvicorn app:app --port 8000
+    python loadtest.py --rates 5,20,50 --duration 30 --output loadtest.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from perf_stats import latency_summary
+
+ONBOARDING_RATINGS = 5
+TRAINING_USER_IDS = (1, 6040)
+
+
+class JourneyStats:
+    """Collects per-endpoint latencies and error counts"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[endpoint] += 1
+        return response if ok else None
+
+    def report(self, wall_seconds: float) -> Dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            summary = latency_summary(values, wall_seconds)
+            summary["error_rate"] = round(self.errors[endpoint] / len(values), 4)
+            endpoints[endpoint] = summary
+        return endpoints
+
+
+async def user_journey(client: httpx.AsyncClient, stats: JourneyStats, user_id: int, n: int):
+    """Run one simulated user through onboarding and recommendations"""
+    response = await stats.call(client, "GET /recommend (cold start)", "GET", "/recommend",
+                                params={"user_id": user_id, "n": 20})
+    if response is None:
+        return
+
+    candidates = [m["movie_id"] for m in response.json().get("recommendations", [])]
+    for movie_id in random.sample(candidates, min(ONBOARDING_RATINGS, len(candidates))):
+        await stats.call(client, "POST /rate", "POST", "/rate", json={
+            "user_id": user_id,
+            "ratings": [{"movie_id": movie_id, "rating": random.choice([3.0, 3.5, 4.0, 4.5, 5.0])}],
+        })
+
+    await stats.call(client, "GET /recommend (personalized)", "GET", "/recommend",
+                     params={"user_id": user_id, "n": n})
+    await stats.call(client, "GET /user/{user_id}/stats", "GET", f"/user/{user_id}/stats")
+
+
+async def run_stage(base_url: str, rate: float, duration: float, n: int,
+                    known_user_fraction: float, max_connections: int) -> Dict:
+    """Start user journeys at `rate` users/sec for `duration` seconds"""
+    stats = JourneyStats()
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        tasks = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            if random.random() < known_user_fraction:
+                user_id = random.randint(*TRAINING_USER_IDS)
+            else:
+                user_id = random.randint(100000, 999999)  # Same range the UI generates
+            tasks.append(asyncio.create_task(user_journey(client, stats, user_id, n)))
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+
+    total = sum(len(v) for v in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    return {
+        "arrival_rate": rate,
+        "users": len(tasks),
+        "wall_seconds": round(wall, 3),
+        "total_requests": total,
+        "throughput_rps": round(total / wall, 2) if wall > 0 else None,
+        "error_rate": round(errors / total, 4) if total else None,
+        "endpoints": stats.report(wall),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API with simulated user journeys")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--rates", default="5", help="Comma-separated user arrival rates (users/sec), one stage each")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per stage")
+    parser.add_argument("--n", type=int, default=20, help="Recommendations requested per page")
+    parser.add_argument("--known-user-fraction", type=float, default=0.0,
+                        help="Fraction of journeys using training user IDs (personalized path)")
+    parser.add_argument("--max-connections", type=int, default=200, help="HTTP connection pool size")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rates = [float(r) for r in args.rates.split(",")]
+
+    stages: List[Dict] = []
+    for rate in rates:
+        print(f"▶ Stage: {rate} users/sec for {args.duration}s")
+        stages.append(asyncio.run(run_stage(
+            args.url.rstrip("/"), rate, args.duration, args.n,
+            args.known_user_fraction, args.max_connections,
+        )))
+
+    report = {"base_url": args.url, "stages": stages}
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
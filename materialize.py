@@ -0,0 +1,127 @@
+"""
+Materialized top-N recommendations for every user in the model
+
+Batch job: scores all users in blocks (block @ item_factors.T) spread over
+worker processes and keeps each user's top-N as int32 item indices plus
+float16 predicted ratings. The table is written as two .npy files (memory
+mapped by the API) and a small JSON sidecar with the model fingerprint.
+
+    python materialize.py --top-n 200 --workers 4
+    python materialize.py --if-stale          # refresh only when the model changed
+
+The API serves training users from the table and only applies live
+exclusions; it falls back to online scoring when too many of the stored
+items are excluded.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from artifacts import ROOT_DIR, load_model, model_fingerprint
+
+MATERIALIZED_ITEMS_FILE = "materialized_items.npy"
+MATERIALIZED_SCORES_FILE = "materialized_scores.npy"
+MATERIALIZED_META_FILE = "materialized_topn.json"
+
+_model = None
+
+
+def _init_worker(root_dir: str):
+    global _model
+    _model = load_model(root_dir)
+
+
+def _score_block(args: tuple) -> tuple:
+    start, stop, top_n = args
+    m = _model
+    scores = (float(m["global_mean"]) + m["user_bias"][start:stop, None] + m["item_bias"][None, :]
+              + m["user_factors"][start:stop] @ m["item_factors"].T)
+    top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return (start, np.take_along_axis(top, order, axis=1).astype(np.int32),
+            np.take_along_axis(top_scores, order, axis=1).astype(np.float16))
+
+
+def current_fingerprint(model: dict) -> str:
+    return model_fingerprint(model["user_factors"], model["user_bias"], model["item_factors"], model["item_bias"])
+
+
+def materialize(root_dir: str, top_n: int = 200, block: int = 512, workers: int = None) -> dict:
+    """Score every user and write the top-N table next to the model"""
+    model = load_model(root_dir)
+    n_users, n_items = len(model["user_bias"]), len(model["item_bias"])
+    top_n = min(top_n, n_items)
+
+    items_path = os.path.join(root_dir, MATERIALIZED_ITEMS_FILE)
+    scores_path = os.path.join(root_dir, MATERIALIZED_SCORES_FILE)
+    tmp_items = np.lib.format.open_memmap(items_path + ".tmp", mode="w+", dtype=np.int32, shape=(n_users, top_n))
+    tmp_scores = np.lib.format.open_memmap(scores_path + ".tmp", mode="w+", dtype=np.float16, shape=(n_users, top_n))
+
+    tasks = [(s, min(s + block, n_users), top_n) for s in range(0, n_users, block)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(root_dir,)) as pool:
+        for start, items, scores in pool.map(_score_block, tasks):
+            tmp_items[start:start + len(items)] = items
+            tmp_scores[start:start + len(items)] = scores
+
+    tmp_items.flush()
+    tmp_scores.flush()
+    del tmp_items, tmp_scores
+
+    # Swap files in place so a running API never reads a half-written table
+    os.replace(items_path + ".tmp", items_path)
+    os.replace(scores_path + ".tmp", scores_path)
+    meta = {"fingerprint": current_fingerprint(model), "n_users": n_users, "top_n": top_n,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    meta_path = os.path.join(root_dir, MATERIALIZED_META_FILE)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+def load_materialized(root_dir: str, fingerprint: str) -> tuple:
+    """
+    Memory-map the table if it exists and matches `fingerprint`
+
+    Returns:
+        (items, scores) or (None, None)
+    """
+    meta_path = os.path.join(root_dir, MATERIALIZED_META_FILE)
+    if not os.path.exists(meta_path):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("fingerprint") != fingerprint:
+        return None, None
+    return (np.load(os.path.join(root_dir, MATERIALIZED_ITEMS_FILE), mmap_mode="r"),
+            np.load(os.path.join(root_dir, MATERIALIZED_SCORES_FILE), mmap_mode="r"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize top-N recommendations for all users")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing funksvd_model.npz")
+    parser.add_argument("--top-n", type=int, default=200, help="Items stored per user")
+    parser.add_argument("--block", type=int, default=512, help="Users scored per block")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--if-stale", action="store_true", help="Skip if the table matches the current model")
+    args = parser.parse_args()
+
+    if args.if_stale:
+        items, _ = load_materialized(args.root, current_fingerprint(load_model(args.root)))
+        if items is not None:
+            print("✓ Materialized table is up to date")
+            return
+
+    start = time.time()
+    meta = materialize(args.root, args.top_n, args.block, args.workers)
+    print(f"✓ Materialized top-{meta['top_n']} for {meta['n_users']:,} users in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
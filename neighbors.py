@@ -0,0 +1,104 @@
+"""
+Precomputed item-item neighbour table ("more like this")
+
+Cosine similarity on item_factors, computed in row blocks so memory stays at
+block × n_items. Each movie keeps its top-K neighbours as int32 indices and
+float16 similarities, so a lookup is a row slice with no scoring.
+
+    python neighbors.py --k 50          # writes item_neighbors.npz next to the model
+
+The API rebuilds the table at startup when it is missing or was built from a
+different model (fingerprint mismatch).
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from artifacts import ROOT_DIR, load_model, model_fingerprint
+
+NEIGHBORS_FILE = "item_neighbors.npz"
+
+
+def build_neighbor_table(item_factors: np.ndarray, k: int = 50, block: int = 1024) -> tuple:
+    """
+    Top-k cosine neighbours for every item
+
+    Returns:
+        (indices int32 [n_items, k], similarities float16 [n_items, k]), best first
+    """
+    norms = np.linalg.norm(item_factors, axis=1, keepdims=True)
+    unit = (item_factors / np.maximum(norms, 1e-12)).astype(np.float32)
+    n_items = len(unit)
+    k = min(k, n_items - 1)
+
+    indices = np.empty((n_items, k), dtype=np.int32)
+    sims = np.empty((n_items, k), dtype=np.float16)
+    for start in range(0, n_items, block):
+        stop = min(start + block, n_items)
+        block_sims = unit[start:stop] @ unit.T
+        block_sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # never your own neighbour
+
+        top = np.argpartition(-block_sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(block_sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        sims[start:stop] = np.take_along_axis(top_sims, order, axis=1)
+
+    return indices, sims
+
+
+def save_neighbors(path: str, indices, sims, fingerprint: str):
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, indices=indices, similarities=sims, fingerprint=fingerprint)
+    os.replace(path + ".tmp", path)
+
+
+def load_or_build_neighbors(root_dir: str, item_factors: np.ndarray, item_bias: np.ndarray,
+                            k: int = 50, rebuild: bool = True) -> tuple:
+    """
+    Load item_neighbors.npz, rebuilding it if it is missing or stale
+
+    Returns:
+        (indices, similarities) or (None, None) if unavailable and rebuild=False
+    """
+    path = os.path.join(root_dir, NEIGHBORS_FILE)
+    fingerprint = model_fingerprint(item_factors, item_bias)
+
+    if os.path.exists(path):
+        with np.load(path) as f:
+            if str(f["fingerprint"]) == fingerprint and f["indices"].shape[1] >= min(k, len(item_factors) - 1):
+                return f["indices"], f["similarities"]
+
+    if not rebuild:
+        return None, None
+
+    indices, sims = build_neighbor_table(item_factors, k)
+    try:
+        save_neighbors(path, indices, sims, fingerprint)
+    except OSError as e:
+        print(f"⚠ Could not persist neighbour table: {e}")
+    return indices, sims
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the item-item neighbour table")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing funksvd_model.npz")
+    parser.add_argument("--k", type=int, default=50, help="Neighbours kept per movie")
+    parser.add_argument("--block", type=int, default=1024, help="Rows per similarity block")
+    args = parser.parse_args()
+
+    model = load_model(args.root)
+    start = time.time()
+    indices, sims = build_neighbor_table(model["item_factors"], args.k, args.block)
+    path = os.path.join(args.root, NEIGHBORS_FILE)
+    save_neighbors(path, indices, sims, model_fingerprint(model["item_factors"], model["item_bias"]))
+    size_mb = (indices.nbytes + sims.nbytes) / 1e6
+    print(f"✓ Built {indices.shape[0]:,} × {indices.shape[1]} neighbour table ({size_mb:.1f} MB) "
+          f"in {time.time() - start:.1f}s → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Latency statistics shared by the replay, load-test and benchmark tools
+"""
+
+from typing import Dict, List
+import numpy as np
+
+
+def latency_summary(latencies_ms: List[float], wall_seconds: float = None) -> Dict:
+    """
+    Summarize a list of latencies (milliseconds)
+
+    Args:
+        latencies_ms: Observed latencies
+        wall_seconds: Wall-clock duration of the run, used for throughput
+
+    Returns:
+        Dictionary with count, mean, p50/p95/p99, max and (optionally) throughput
+    """
+    if not latencies_ms:
+        return {"count": 0}
+
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+
+    summary = {
+        "count": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+    if wall_seconds:
+        summary["throughput_rps"] = round(arr.size / wall_seconds, 2)
+    return summary
+
+
+def compare_to_baseline(current: Dict, baseline: Dict, metric: str, threshold: float) -> List[str]:
+    """
+    Compare per-key summaries against a baseline
+
+    Args:
+        current: {name: summary_dict}
+        baseline: {name: summary_dict}
+        metric: Summary field to compare (e.g. "p95_ms")
+        threshold: Allowed relative slowdown (0.10 = 10%)
+
+    Returns:
+        List of human-readable regression messages (empty if none)
+    """
+    regressions = []
+    for name, summary in current.items():
+        base = baseline.get(name)
+        if not base or metric not in base or metric not in summary:
+            continue
+        if base[metric] > 0 and summary[metric] > base[metric] * (1 + threshold):
+            change = (summary[metric] / base[metric] - 1) * 100
+            regressions.append(
+                f"{name}: {metric} {base[metric]:.3f} → {summary[metric]:.3f} (+{change:.1f}%)"
+            )
+    return regressions
@@ -0,0 +1,167 @@
+"""
+Two-stage recommendation pipeline: candidate generation, then re-ranking
+
+Stage 1 is any callable returning (item_indices, scores) best first - exact
+scoring, the IVF index or the materialized table - asked for a few hundred
+candidates. Stage 2 is a chain of re-rankers that only ever touch that
+small candidate set, so they can afford pairwise work:
+
+    MMRReranker        maximal marginal relevance on item_factors cosine similarity
+    GenreCapReranker   at most a fraction of the list from any one genre
+
+Every stage is timed and re-rankers get the request's deadline. A re-ranker
+that reaches it stops early and keeps the order it has built so far (picks
+first, the rest in candidate order); once the budget is spent the remaining
+re-rankers are skipped. Either way the list is still valid, just less
+diverse, and the cut-short and skipped stage names are reported alongside
+the timings.
+"""
+
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+Candidates = Tuple[np.ndarray, np.ndarray]
+# Re-rankers return (item_indices, scores, completed); completed is False if they stopped at the deadline
+Reranked = Tuple[np.ndarray, np.ndarray, bool]
+
+# Re-rankers check the deadline every this many picks / scanned items
+DEADLINE_CHECK_EVERY = 8
+
+
+class MMRReranker:
+    """
+    Greedy maximal marginal relevance
+
+    Picks, one at a time, the candidate maximizing
+        lambda * relevance - (1 - lambda) * max cosine similarity to the picked items
+    with relevance min-max scaled to [0, 1] over the candidates.
+    """
+
+    name = "mmr"
+
+    def __init__(self, item_factors: np.ndarray, lambda_: float = 0.7):
+        norms = np.linalg.norm(item_factors, axis=1, keepdims=True)
+        self.unit_factors = (item_factors / np.maximum(norms, 1e-12)).astype(np.float32)
+        self.lambda_ = lambda_
+
+    def __call__(self, items: np.ndarray, scores: np.ndarray, n: int,
+                 deadline: Optional[float] = None) -> Reranked:
+        if len(items) <= 1:
+            return items, scores, True
+        # One similarity row per pick (not the full k × k matrix) so the loop can stop at the deadline
+        vectors = self.unit_factors[items]
+
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+        picked = []
+        max_sim = np.full(len(items), -np.inf)
+        available = np.ones(len(items), dtype=bool)
+        completed = True
+        for step in range(min(n, len(items))):
+            if deadline is not None and step % DEADLINE_CHECK_EVERY == 0 and time.perf_counter() >= deadline:
+                completed = False
+                break
+            penalty = np.where(np.isfinite(max_sim), max_sim, 0.0)
+            mmr = np.where(available, self.lambda_ * relevance - (1 - self.lambda_) * penalty, -np.inf)
+            best = int(np.argmax(mmr))
+            picked.append(best)
+            available[best] = False
+            max_sim = np.maximum(max_sim, vectors @ vectors[best])
+
+        # Unpicked candidates stay behind the picks for any later stage
+        order = np.concatenate([np.array(picked, dtype=np.int64), np.flatnonzero(available)])
+        return items[order], scores[order], completed
+
+
+class GenreCapReranker:
+    """
+    Keep at most ceil(max_fraction * n) items per genre, preserving order
+
+    Items whose genres are all under their cap are taken first; the rest
+    backfill the list if too few items pass, so the result is never shorter.
+    """
+
+    name = "genre_cap"
+
+    def __init__(self, genre_matrix: np.ndarray, max_fraction: float = 0.4):
+        self.genre_matrix = genre_matrix
+        self.max_fraction = max_fraction
+
+    def __call__(self, items: np.ndarray, scores: np.ndarray, n: int,
+                 deadline: Optional[float] = None) -> Reranked:
+        cap = max(1, math.ceil(self.max_fraction * n))
+        genres = self.genre_matrix[items]
+        counts = np.zeros(genres.shape[1], dtype=np.int32)
+
+        keep = np.zeros(len(items), dtype=bool)
+        taken = 0
+        scanned = len(items)
+        completed = True
+        for i in range(len(items)):
+            if deadline is not None and i % DEADLINE_CHECK_EVERY == 0 and time.perf_counter() >= deadline:
+                completed = False
+                scanned = i
+                break
+            row = genres[i]
+            if (counts[row] < cap).all():
+                keep[i] = True
+                counts[row] += 1
+                taken += 1
+                if taken >= n:
+                    break
+
+        # Past the deadline, unscanned items keep their place after the kept ones instead of backfilling
+        if not completed:
+            order = np.concatenate([np.flatnonzero(keep), np.arange(scanned, len(items)),
+                                    np.flatnonzero(~keep[:scanned])])
+        else:
+            order = np.concatenate([np.flatnonzero(keep), np.flatnonzero(~keep)])
+        return items[order], scores[order], completed
+
+
+class RecommendationPipeline:
+    """Candidate generator followed by re-rankers, timed per stage against a budget"""
+
+    def __init__(self, rerankers: List[Callable], n_candidates: int = 200, budget_ms: float = 50.0):
+        self.rerankers = rerankers
+        self.n_candidates = n_candidates
+        self.budget_ms = budget_ms
+
+    def run(self, generate: Callable[[int], Candidates], n: int,
+            rerankers: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, Dict]:
+        """
+        Args:
+            generate: Called with the candidate count, returns (item_indices, scores) best first
+            n: Final list length
+            rerankers: Names of the re-rankers to apply (default: all configured)
+
+        Returns:
+            (item_indices, scores, report) where report holds per-stage timings_ms, the stages
+            cut short at the deadline and the skipped stages
+        """
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        timings = {}
+
+        items, scores = generate(max(self.n_candidates, n * 2))
+        timings["candidates"] = round((time.perf_counter() - start) * 1000, 3)
+
+        cut_short, skipped = [], []
+        for reranker in self.rerankers:
+            if rerankers is not None and reranker.name not in rerankers:
+                continue
+            if time.perf_counter() >= deadline:
+                skipped.append(reranker.name)
+                continue
+            stage_start = time.perf_counter()
+            items, scores, completed = reranker(items, scores, n, deadline)
+            timings[reranker.name] = round((time.perf_counter() - stage_start) * 1000, 3)
+            if not completed:
+                cut_short.append(reranker.name)
+
+        timings["total"] = round((time.perf_counter() - start) * 1000, 3)
+        return items[:n], scores[:n], {"timings_ms": timings, "cut_short": cut_short, "skipped": skipped}
@@ -0,0 +1,466 @@
+"""
+Pluggable storage for user ratings
+
+    SQLiteRatingStore       one upsert transaction per /rate call (the default)
+    WriteBehindRatingStore  acknowledges a write once it is fsync'ed to an append
+                            log, keeps it in an in-memory buffer that reads see
+                            immediately, and group-commits the buffer to SQLite
+                            from a background thread every few milliseconds or
+                            every N rows
+
+Both keep per-user aggregates (count, sum, min, max, last update) in an
+optional stats table, refreshed in the same transaction as the upserts, so
+stats reads are one primary-key lookup however long the user's history is.
+
+ShardedRatingStore routes each user to one of N such stores (one SQLite file
+and connection pool per shard) by a hash of user_id, so writers for
+different shards never wait on the same database lock. The shard count is
+recorded in rating_shards/shards.json; change it with reshard.py.
+
+Write-behind recovery: every process appends to its own log,
+`rating_wal.log.<pid>`, and holds an exclusive lock on `<log>.lock` while it
+runs. The log is rotated to `<log>.flushing` whenever a batch is handed to
+the flusher and deleted once the batch is committed, so every log file still
+on disk holds writes that may be missing from SQLite. At startup a store
+replays (upserts are idempotent) the logs whose lock it can take - those of
+processes that are gone - and never touches a live process's log.
+"""
+
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sqlalchemy import Table, func, literal, select, true
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+
+RATING_LOG_FILE = "rating_wal.log"
+RATING_DB_FILE = "user_ratings.db"
+SHARDS_DIR = "rating_shards"
+SHARDS_MANIFEST = "shards.json"
+
+
+def shard_for(user_ids, n_shards: int) -> np.ndarray:
+    """Shard of each user id (Fibonacci hashing, so consecutive ids spread evenly)"""
+    ids = np.atleast_1d(np.asarray(user_ids)).astype(np.uint64)
+    return (((ids * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)) % np.uint64(n_shards)).astype(np.int64)
+
+
+def shard_dir(db_dir: str, shard: int) -> str:
+    return os.path.join(db_dir, SHARDS_DIR, f"shard-{shard:02d}")
+
+
+def shard_db_paths(db_dir: str, n_shards: int) -> List[str]:
+    """Database file per shard; a single shard is the plain data/user_ratings.db"""
+    if n_shards == 1:
+        return [os.path.join(db_dir, RATING_DB_FILE)]
+    return [os.path.join(shard_dir(db_dir, i), RATING_DB_FILE) for i in range(n_shards)]
+
+
+def read_shard_count(db_dir: str) -> int:
+    """Shard count of the layout on disk (1 when there is no shard manifest)"""
+    path = os.path.join(db_dir, SHARDS_DIR, SHARDS_MANIFEST)
+    if not os.path.exists(path):
+        return 1
+    with open(path) as f:
+        return int(json.load(f)["n_shards"])
+
+
+def write_shard_count(db_dir: str, n_shards: int):
+    path = os.path.join(db_dir, SHARDS_DIR, SHARDS_MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"n_shards": n_shards, "hash": "fibonacci64"}, f)
+    os.replace(path + ".tmp", path)
+
+
+class RatingStore:
+    """Interface used by the API: upsert a user's ratings and read them back"""
+
+    def upsert(self, user_id: int, ratings: List[Tuple[int, float]]):
+        raise NotImplementedError
+
+    def upsert_bulk(self, rows: List[dict]):
+        """Upsert {user_id, movie_id, rating} rows from many users"""
+        by_user: Dict[int, List[Tuple[int, float]]] = {}
+        for r in rows:
+            by_user.setdefault(r["user_id"], []).append((r["movie_id"], r["rating"]))
+        for user_id, ratings in by_user.items():
+            self.upsert(user_id, ratings)
+
+    def get_user_ratings(self, user_id: int) -> Dict[int, float]:
+        """{movie_id: rating} including every acknowledged write"""
+        raise NotImplementedError
+
+    def get_user_stats(self, user_id: int) -> Optional[dict]:
+        """{count, sum, min, max, last_update} or None if the user has no ratings"""
+        values = list(self.get_user_ratings(user_id).values())
+        if not values:
+            return None
+        return {"count": len(values), "sum": float(sum(values)), "min": min(values), "max": max(values),
+                "last_update": None}
+
+    def count(self, user_id: int) -> int:
+        stats = self.get_user_stats(user_id)
+        return stats["count"] if stats else 0
+
+    def flush(self):
+        """Make every acknowledged write visible in the database"""
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteRatingStore(RatingStore):
+    """Direct upserts into the user_ratings table"""
+
+    def __init__(self, engine: Engine, table: Table, stats_table: Table = None):
+        self.engine = engine
+        self.table = table
+        self.stats_table = stats_table
+        if stats_table is not None:
+            self._backfill_stats()
+
+    @property
+    def engines(self) -> List[Engine]:
+        """Databases holding the ratings, for bulk reads (export, startup)"""
+        return [self.engine]
+
+    def _backfill_stats(self):
+        """Build the stats table from user_ratings if it is empty (e.g. a database from before it existed)"""
+        with self.engine.begin() as conn:
+            if conn.execute(select(func.count()).select_from(self.stats_table)).scalar():
+                return
+            self._refresh_stats(conn, None)
+
+    def _refresh_stats(self, conn, user_ids: Optional[List[int]]):
+        """Recompute aggregates for `user_ids` (all users if None) inside the caller's transaction"""
+        t, stats = self.table, self.stats_table
+        agg = select(t.c.user_id, func.count(), func.sum(t.c.rating), func.min(t.c.rating),
+                     func.max(t.c.rating), literal(time.time()))
+        stmt = insert(stats).from_select(
+            ["user_id", "count", "rating_sum", "rating_min", "rating_max", "last_update"],
+            agg.where(t.c.user_id.in_(user_ids) if user_ids is not None else true()).group_by(t.c.user_id)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={c: stmt.excluded[c] for c in ("count", "rating_sum", "rating_min", "rating_max", "last_update")}
+        )
+        conn.execute(stmt)
+
+    def upsert_rows(self, rows: List[dict]):
+        """Upsert {user_id, movie_id, rating} rows (and their users' aggregates) in a single transaction"""
+        if not rows:
+            return
+        stmt = insert(self.table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "movie_id"], set_={"rating": stmt.excluded.rating}
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+            if self.stats_table is not None:
+                users = sorted({r["user_id"] for r in rows})
+                for start in range(0, len(users), 500):
+                    self._refresh_stats(conn, users[start:start + 500])
+
+    def upsert(self, user_id, ratings):
+        self.upsert_rows([{"user_id": user_id, "movie_id": m, "rating": r} for m, r in ratings])
+
+    def upsert_bulk(self, rows: List[dict]):
+        """Bulk-ingest batch (POST /ratings/bulk): one transaction, no per-call buffering"""
+        self.upsert_rows(rows)
+
+    def get_user_ratings(self, user_id):
+        query = select(self.table.c.movie_id, self.table.c.rating).where(self.table.c.user_id == user_id)
+        with self.engine.connect() as conn:
+            return {movie_id: rating for movie_id, rating in conn.execute(query)}
+
+    def get_user_stats(self, user_id):
+        if self.stats_table is None:
+            return super().get_user_stats(user_id)
+        s = self.stats_table.c
+        query = select(s.count, s.rating_sum, s.rating_min, s.rating_max, s.last_update).where(s.user_id == user_id)
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+        if row is None:
+            return None
+        return {"count": row.count, "sum": row.rating_sum, "min": row.rating_min, "max": row.rating_max,
+                "last_update": row.last_update}
+
+
+class WriteBehindRatingStore(SQLiteRatingStore):
+    """Append-log durability + in-memory buffer + background group commit"""
+
+    def __init__(self, engine: Engine, table: Table, log_dir: str, stats_table: Table = None,
+                 flush_interval_ms: float = 5.0, flush_rows: int = 1000, fsync: bool = True):
+        super().__init__(engine, table, stats_table)
+        self.log_dir = log_dir
+        self.log_path = os.path.join(log_dir, f"{RATING_LOG_FILE}.{os.getpid()}")
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+
+        # Held for the life of the store: tells other processes this log is live
+        self._lock_fd = self._lock_log()
+        self.replayed = self.recover()
+        self.log = open(self.log_path, "ab")
+
+        self.pending: Dict[int, Dict[int, float]] = {}   # acknowledged, not yet handed to the flusher
+        self.flushing: Dict[int, Dict[int, float]] = {}  # being committed right now
+        self.pending_rows = 0
+        self.committed_rows = 0
+        self.batches = 0
+        self.last_write: Dict[int, float] = {}  # user_id -> time of the user's latest buffered write
+
+        # Group commit: log appends are numbered; one fsync covers every append made before it
+        self._written = 0
+        self._synced = 0
+        self._sync_lock = threading.Lock()
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="rating-flusher", daemon=True)
+        self._thread.start()
+
+    def _lock_log(self) -> int:
+        """Create and lock <log>.lock (retried if a recovering process removed it under us)"""
+        path = self.log_path + ".lock"
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def recover(self) -> int:
+        """Replay the logs of processes that are gone into SQLite; returns the number of rows replayed"""
+        pattern = os.path.join(glob.escape(self.log_dir), RATING_LOG_FILE + "*")
+        bases = set()
+        for path in glob.glob(pattern):
+            for suffix in (".flushing", ".lock"):
+                if path.endswith(suffix):
+                    path = path[:-len(suffix)]
+                    break
+            bases.add(path)
+
+        replayed = 0
+        for base in sorted(bases):
+            lock_fd = None
+            if base != self.log_path and os.path.exists(base + ".lock"):
+                try:
+                    lock_fd = os.open(base + ".lock", os.O_RDWR)
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    if os.fstat(lock_fd).st_ino != os.stat(base + ".lock").st_ino:
+                        raise FileNotFoundError(base + ".lock")  # replaced since we opened it
+                except OSError:
+                    if lock_fd is not None:
+                        os.close(lock_fd)
+                    continue  # owner is alive (or another process is recovering it)
+            try:
+                replayed += self._replay(base)
+                if base != self.log_path and os.path.exists(base + ".lock"):
+                    os.remove(base + ".lock")
+            finally:
+                if lock_fd is not None:
+                    os.close(lock_fd)
+        return replayed
+
+    def _replay(self, base: str) -> int:
+        """Upsert the records of <base>.flushing then <base> and delete both"""
+        rows = []
+        for path in (base + ".flushing", base):
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final write: it was never acknowledged
+                    rows.extend({"user_id": record["u"], "movie_id": m, "rating": r} for m, r in record["r"])
+        self.upsert_rows(rows)
+        for path in (base + ".flushing", base):
+            if os.path.exists(path):
+                os.remove(path)
+        return len(rows)
+
+    def upsert(self, user_id, ratings):
+        line = json.dumps({"u": user_id, "r": [[m, r] for m, r in ratings]}, separators=(",", ":")) + "\n"
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("rating store is closed")
+            self.log.write(line.encode())
+            self.log.flush()
+            self._written += 1
+            seq = self._written
+            # Buffered together with the append so a log rotation always moves both into one batch
+            self.pending.setdefault(user_id, {}).update(ratings)
+            self.pending_rows += len(ratings)
+            self.last_write[user_id] = time.time()
+            if self.pending_rows >= self.flush_rows:
+                self._cond.notify()
+        if self.fsync:
+            self._sync(seq)
+
+    def _sync(self, seq: int):
+        """Return once log append `seq` is on disk; the first waiter fsyncs for everyone behind it"""
+        with self._sync_lock:
+            if self._synced >= seq:
+                return  # covered by the fsync of the writer ahead of us
+            with self._cond:
+                target = self._written
+                fd = os.dup(self.log.fileno())
+            try:
+                os.fsync(fd)  # outside _cond: readers and other appends proceed meanwhile
+            finally:
+                os.close(fd)
+            self._synced = target
+
+    def get_user_ratings(self, user_id):
+        # Snapshot the buffers before reading the database: a batch committed in between is
+        # then in the database read instead of missing from both
+        with self._cond:
+            buffered = {**self.flushing.get(user_id, {}), **self.pending.get(user_id, {})}
+        stored = super().get_user_ratings(user_id)
+        stored.update(buffered)
+        return stored
+
+    def get_user_stats(self, user_id):
+        with self._cond:
+            last_write = self.last_write.get(user_id)
+        if last_write is not None:
+            # Unflushed writes are not in the stats table yet: aggregate the merged ratings
+            stats = RatingStore.get_user_stats(self, user_id)
+            stats["last_update"] = last_write
+            return stats
+        return super().get_user_stats(user_id)
+
+    def upsert_bulk(self, rows):
+        # Bulk batches skip the log and buffer; commit buffered (older) writes first so they
+        # cannot land on top of the batch later
+        self.flush()
+        self.upsert_rows(rows)
+
+    def flush(self):
+        """Commit everything acknowledged so far (called by the flusher thread and on close)"""
+        with self._flush_lock:
+            if self.flushing:
+                self._commit(self.flushing)  # retry a batch whose commit failed
+
+            # _sync_lock first: no group fsync may be running on the file being rotated
+            with self._sync_lock, self._cond:
+                if not self.pending:
+                    return
+                batch, self.pending, self.pending_rows = self.pending, {}, 0
+                self.flushing = batch
+                if self.fsync and self._synced < self._written:
+                    # Appends still waiting for their fsync would lose it with the old file
+                    os.fsync(self.log.fileno())
+                    self._synced = self._written
+                # Everything in the current log is now in `batch`; new writes go to a fresh file
+                self.log.close()
+                os.replace(self.log_path, self.log_path + ".flushing")
+                self.log = open(self.log_path, "ab")
+
+            self._commit(batch)
+
+    def _commit(self, batch: Dict[int, Dict[int, float]]):
+        rows = [{"user_id": u, "movie_id": m, "rating": r} for u, items in batch.items() for m, r in items.items()]
+        self.upsert_rows(rows)
+        os.remove(self.log_path + ".flushing")
+        with self._cond:
+            self.flushing = {}
+            for user_id in batch:
+                if user_id not in self.pending:
+                    self.last_write.pop(user_id, None)
+            self.committed_rows += len(rows)
+            self.batches += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and self.pending_rows < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                # Batch stays in <log>.flushing: retried on the next flush, replayed on restart
+                print(f"⚠ Rating flush failed: {e}")
+                time.sleep(self.flush_interval)
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.log.close()
+        if not self.pending and not self.flushing:
+            # Everything is committed: nothing for a later start to replay
+            for path in (self.log_path, self.log_path + ".lock"):
+                if os.path.exists(path):
+                    os.remove(path)
+        os.close(self._lock_fd)
+
+
+class ShardedRatingStore(RatingStore):
+    """Routes users to per-shard stores by user_id hash; bulk writes fan out in parallel"""
+
+    def __init__(self, shards: List[SQLiteRatingStore]):
+        self.shards = shards
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="rating-shard")
+
+    @property
+    def engines(self) -> List[Engine]:
+        return [shard.engine for shard in self.shards]
+
+    @property
+    def replayed(self) -> int:
+        return sum(getattr(shard, "replayed", 0) for shard in self.shards)
+
+    def shard(self, user_id: int) -> SQLiteRatingStore:
+        return self.shards[int(shard_for(user_id, len(self.shards))[0])]
+
+    def upsert(self, user_id, ratings):
+        self.shard(user_id).upsert(user_id, ratings)
+
+    def upsert_bulk(self, rows):
+        if not rows:
+            return
+        owners = shard_for([r["user_id"] for r in rows], len(self.shards))
+        parts = {}
+        for row, shard in zip(rows, owners.tolist()):
+            parts.setdefault(shard, []).append(row)
+        # One transaction per shard, committed concurrently
+        futures = [self._pool.submit(self.shards[shard].upsert_bulk, part) for shard, part in parts.items()]
+        for future in futures:
+            future.result()
+
+    def get_user_ratings(self, user_id):
+        return self.shard(user_id).get_user_ratings(user_id)
+
+    def get_user_stats(self, user_id):
+        return self.shard(user_id).get_user_stats(user_id)
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self._pool.shutdown()
@@ -0,0 +1,165 @@
+"""
+Replay a captured request log against a running Movie Recommender API
+
+Capture a log by starting the API with REQUEST_LOG_SAMPLE_RATE set, e.g.
+    REQUEST_LOG_SAMPLE_RATE=1.0 uvicorn app:app
+
+Then replay it (original timing, 10x faster, or as fast as possible):
+    python replay.py requests.jsonl --speed 1
+    python replay.py requests.jsonl --speed 10 --output replay_new.json
+    python replay.py requests.jsonl --speed 0 --baseline replay_old.json --threshold 0.15
+
+Requests are issued in log order on the original (scaled) schedule, so two
+runs against different model or code versions see the same traffic shape.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from perf_stats import compare_to_baseline, latency_summary
+
+
+def load_log(path: str) -> List[dict]:
+    """Load request records sorted by capture time"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            # Skip lines that are not request-log records
+            if "endpoint" in record and "ts" in record:
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def issue(session: requests.Session, base_url: str, record: dict, timeout: float) -> tuple:
+    """Send one recorded request, returning (endpoint, latency_ms, ok)"""
+    url = base_url + record.get("path", record["endpoint"])
+    start = time.perf_counter()
+    try:
+        if record["method"] == "POST":
+            response = session.post(url, params=record.get("params"), json=record.get("body"), timeout=timeout)
+        else:
+            response = session.get(url, params=record.get("params"), timeout=timeout)
+        # A replay is "ok" when it reproduces the originally observed status
+        ok = response.status_code == record.get("status", response.status_code)
+    except requests.RequestException:
+        ok = False
+    return record["endpoint"], (time.perf_counter() - start) * 1000, ok
+
+
+def replay(records: List[dict], base_url: str, speed: float = 1.0,
+           workers: int = 16, timeout: float = 10.0) -> Dict:
+    """
+    Re-issue records on their original schedule divided by `speed`
+
+    Args:
+        records: Request-log records (sorted by ts)
+        base_url: API base URL
+        speed: Time acceleration factor (0 = no delays, as fast as possible)
+        workers: Maximum in-flight requests
+        timeout: Per-request timeout (seconds)
+
+    Returns:
+        Report with per-endpoint latency summaries and error rates
+    """
+    if not records:
+        return {"endpoints": {}, "total_requests": 0}
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    t0 = records[0]["ts"]
+    futures = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            if speed > 0:
+                delay = (record["ts"] - t0) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(issue, session, base_url, record, timeout))
+
+    wall = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for future in futures:
+        endpoint, latency_ms, ok = future.result()
+        latencies[endpoint].append(latency_ms)
+        if not ok:
+            errors[endpoint] += 1
+
+    endpoints = {}
+    for endpoint, values in sorted(latencies.items()):
+        summary = latency_summary(values, wall)
+        summary["error_rate"] = round(errors[endpoint] / len(values), 4)
+        endpoints[endpoint] = summary
+
+    return {
+        "base_url": base_url,
+        "speed": speed,
+        "total_requests": len(records),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(records) / wall, 2) if wall > 0 else None,
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured API request log")
+    parser.add_argument("log", help="Path to a request log (requests.jsonl)")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time acceleration (0 = as fast as possible)")
+    parser.add_argument("--workers", type=int, default=16, help="Maximum concurrent requests")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N records")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p95 slowdown vs baseline")
+    args = parser.parse_args()
+
+    records = load_log(args.log)[:args.limit]
+    print(f"Replaying {len(records):,} requests against {args.url} (speed={args.speed})")
+
+    report = replay(records, args.url.rstrip("/"), args.speed, args.workers)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report["endpoints"], baseline["endpoints"], "p95_ms", args.threshold)
+        if regressions:
+            print("\n❌ Regressions detected:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ No p95 regressions vs baseline")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except requests.exceptions.ConnectionError:
+        print("\n❌ ERROR: Could not connect to API")
+        print("Make sure the server is running with:")
+        print("  uvicorn app:app --reload")
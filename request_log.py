@@ -0,0 +1,85 @@
+"""
+Sampled request logging for the Movie Recommender API
+
+Records are handed to a background writer thread through a bounded queue,
+so request handlers never touch the disk. When the queue is full the record
+is dropped (and counted) rather than blocking the request.
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from typing import Optional
+
+
+class RequestLogger:
+    """Append sampled request records as JSON lines from a background thread"""
+
+    def __init__(self, path: str, sample_rate: float = 1.0, max_queue: int = 10000, flush_interval: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+        self._thread.start()
+
+    def should_sample(self) -> bool:
+        """Decide whether the current request is logged"""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def log(self, record: dict):
+        """Queue a record for writing (never blocks)"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while not self._stop.is_set() or not self._queue.empty():
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                # Drain whatever else is waiting so one write covers a burst
+                batch = [record]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch))
+                f.flush()
+                self.written += len(batch)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stop the writer after the queue has been drained"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+def make_record(method: str, endpoint: str, path: str, params: dict, status: int,
+                latency_ms: float, source: Optional[str] = None,
+                cache_hit: Optional[bool] = None, body: Optional[dict] = None) -> dict:
+    """Build a request-log record in the format expected by replay.py"""
+    record = {
+        "ts": round(time.time(), 6),
+        "method": method,
+        "endpoint": endpoint,
+        "path": path,
+        "params": params,
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+        "source": source,
+        "cache_hit": cache_hit,
+    }
+    if body is not None:
+        record["body"] = body
+    return record
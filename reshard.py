@@ -0,0 +1,124 @@
+"""
+Re-split stored user ratings over a different number of SQLite shards
+
+Reads every rating from the current layout (data/user_ratings.db, or the
+shards listed in data/rating_shards/shards.json) in primary-key pages, routes
+each user with the same hash as the API, and writes the new layout next to
+the old one before swapping it in. Per-user stats are rebuilt in each new
+shard. The old files are kept as *.old-<timestamp> unless --delete-old.
+
+Stop the API first (and start/stop it once after a crash so write-behind
+logs are replayed), then start it with RATING_SHARDS set to the new count:
+
+    python reshard.py --shards 4        # data/user_ratings.db → 4 shards
+    python reshard.py --shards 1        # back to a single file
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import time
+
+from sqlalchemy import MetaData, create_engine, func, select
+
+from artifacts import ROOT_DIR
+from export import iter_rating_pages
+from rating_store import (RATING_LOG_FILE, SHARDS_DIR, SQLiteRatingStore, read_shard_count, shard_db_paths,
+                          shard_for, write_shard_count)
+
+TABLES = ("user_ratings", "user_rating_stats")
+
+
+def reshard(db_dir: str, n_shards: int, page_rows: int = 50000, delete_old: bool = False) -> dict:
+    """Copy every rating into an n_shards layout and swap it in; returns a summary"""
+    source_shards = read_shard_count(db_dir)
+    source_paths = shard_db_paths(db_dir, source_shards)
+    pending_logs = [p for path in source_paths for p in glob.glob(os.path.join(os.path.dirname(path),
+                                                                               RATING_LOG_FILE + "*"))]
+    if pending_logs:
+        raise RuntimeError(f"Unreplayed write-behind logs: {pending_logs} - start and stop the API once first")
+
+    source_engines = [create_engine(f"sqlite:///{p}") for p in source_paths]
+    metadata = MetaData()
+    metadata.reflect(source_engines[0], only=lambda name, _: name in TABLES)
+    table = metadata.tables["user_ratings"]
+    stats_table = metadata.tables.get("user_rating_stats")
+
+    # Build the new layout under a staging name
+    stage_dir = os.path.join(db_dir, "reshard.staging")
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    target_paths = [os.path.join(stage_dir, os.path.relpath(p, db_dir)) for p in shard_db_paths(db_dir, n_shards)]
+    targets = []
+    for path in target_paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        target_engine = create_engine(f"sqlite:///{path}")
+        metadata.create_all(target_engine)
+        targets.append(SQLiteRatingStore(target_engine, table))
+
+    copied = 0
+    for page in iter_rating_pages(source_engines, table, page_rows):
+        owners = shard_for(page["user_id"].to_numpy(), n_shards)
+        for shard, part in page.groupby(owners):
+            targets[shard].upsert_rows(part.to_dict("records"))
+        copied += len(page)
+
+    counts = []
+    for target in targets:
+        with target.engine.connect() as conn:
+            counts.append(conn.execute(select(func.count()).select_from(table)).scalar())
+        if stats_table is not None:
+            SQLiteRatingStore(target.engine, table, stats_table)  # empty stats table → backfilled
+        target.engine.dispose()
+    for source_engine in source_engines:
+        source_engine.dispose()
+    if sum(counts) != copied:
+        raise RuntimeError(f"Copied {copied:,} rows but the new shards hold {sum(counts):,}; old layout kept")
+
+    # Swap: move the old layout aside, then the staged one into place
+    suffix = time.strftime(".old-%Y%m%d%H%M%S")
+    single_db = shard_db_paths(db_dir, 1)[0]
+    old_paths = [os.path.join(db_dir, SHARDS_DIR)] if source_shards > 1 else [single_db]
+    if n_shards == 1 and os.path.exists(single_db) and single_db not in old_paths:
+        old_paths.append(single_db)  # the (empty) file the API creates while sharded
+    old_paths = [p for p in old_paths if os.path.exists(p)]
+    for path in old_paths:
+        os.replace(path, path + suffix)
+    if n_shards > 1:
+        os.replace(os.path.join(stage_dir, SHARDS_DIR), os.path.join(db_dir, SHARDS_DIR))
+        write_shard_count(db_dir, n_shards)
+    else:
+        os.replace(target_paths[0], single_db)
+    shutil.rmtree(stage_dir, ignore_errors=True)
+
+    if delete_old:
+        for path in old_paths:
+            if os.path.isdir(path + suffix):
+                shutil.rmtree(path + suffix)
+            else:
+                os.remove(path + suffix)
+    return {"rows": copied, "from_shards": source_shards, "to_shards": n_shards, "rows_per_shard": counts,
+            "old": [] if delete_old else [p + suffix for p in old_paths]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-split stored ratings over N SQLite shards")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing data/user_ratings.db")
+    parser.add_argument("--shards", type=int, required=True, help="New shard count (1 = single database)")
+    parser.add_argument("--page-rows", type=int, default=50000, help="Rows read and written per transaction")
+    parser.add_argument("--delete-old", action="store_true", help="Remove the old layout after the swap")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+
+    start = time.time()
+    summary = reshard(os.path.join(args.root, "data"), args.shards, args.page_rows, args.delete_old)
+    print(f"✓ Resharded {summary['rows']:,} ratings from {summary['from_shards']} to {summary['to_shards']} "
+          f"shard(s) in {time.time() - start:.1f}s (rows per shard: {summary['rows_per_shard']})")
+    for path in summary["old"]:
+        print(f"  old layout kept at {path}")
+    print(f"  start the API with RATING_SHARDS={args.shards}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-user seen-items index: training history plus stored ratings
+
+Training history (ratings_processed.csv) is held as CSR - a sorted array of
+user ids, row offsets and each user's rated movie ids sorted as int32 - so a
+lookup is one searchsorted and a zero-copy slice. Ratings stored through
+/rate or /ratings/bulk are merged in from an overlay that caches the
+(history ∪ stored) array per user, so repeat reads never build sets.
+
+Stored ratings live in the shared rating store, and any worker may have
+written them, so each overlay entry is tagged with the user's version in the
+store (their stats row: count and last update). The caller passes the
+current version; an entry with another version is reloaded. The overlay is a
+bounded LRU and starts empty.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable
+
+import numpy as np
+
+EMPTY = np.array([], dtype=np.int32)
+
+
+class SeenItems:
+    """CSR training history + versioned LRU overlay of stored ratings, keyed by raw user id"""
+
+    def __init__(self, user_ids: np.ndarray, indptr: np.ndarray, movie_ids: np.ndarray,
+                 overlay_size: int = 100_000):
+        self.user_ids = user_ids
+        self.indptr = indptr
+        self.movie_ids = movie_ids
+        self.overlay_size = overlay_size
+        self.overlay: OrderedDict = OrderedDict()  # user_id -> (version, merged movie ids)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ratings(cls, user_ids: np.ndarray, movie_ids: np.ndarray, overlay_size: int = 100_000):
+        """Build the CSR from parallel (user_id, movie_id) arrays"""
+        order = np.lexsort((movie_ids, user_ids))
+        users = np.asarray(user_ids)[order]
+        items = np.asarray(movie_ids, dtype=np.int32)[order]
+
+        # Drop duplicate (user, movie) pairs so every row is strictly increasing
+        keep = np.ones(len(users), dtype=bool)
+        keep[1:] = (users[1:] != users[:-1]) | (items[1:] != items[:-1])
+        users, items = users[keep], items[keep]
+
+        unique_users, starts = np.unique(users, return_index=True)
+        indptr = np.append(starts, len(users)).astype(np.int64)
+        return cls(unique_users.astype(np.int64), indptr, items, overlay_size)
+
+    def history(self, user_id: int) -> np.ndarray:
+        """Sorted training-history movie ids (a view into the CSR)"""
+        row = np.searchsorted(self.user_ids, user_id)
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return self.movie_ids[self.indptr[row]:self.indptr[row + 1]]
+        return EMPTY
+
+    def get(self, user_id: int, version: Hashable = None,
+            load_stored: Callable[[], Iterable[int]] = None) -> np.ndarray:
+        """
+        Sorted int32 movie ids the user has seen (training history ∪ stored ratings)
+
+        Args:
+            version: The user's current version in the rating store (None = no stored ratings)
+            load_stored: Returns the user's stored movie ids; called when the cached entry is
+                missing or has another version
+        """
+        if version is None:
+            return self.history(user_id)
+        with self._lock:
+            entry = self.overlay.get(user_id)
+            if entry is not None and entry[0] == version:
+                self.overlay.move_to_end(user_id)
+                return entry[1]
+
+        stored = np.fromiter(load_stored(), dtype=np.int32)
+        merged = np.union1d(self.history(user_id), stored).astype(np.int32)
+        with self._lock:
+            self.overlay[user_id] = (version, merged)
+            self.overlay.move_to_end(user_id)
+            while len(self.overlay) > self.overlay_size:
+                self.overlay.popitem(last=False)
+        return merged
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            overlay_bytes = sum(merged.nbytes for _, merged in self.overlay.values())
+        return self.user_ids.nbytes + self.indptr.nbytes + self.movie_ids.nbytes + overlay_bytes
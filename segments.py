@@ -0,0 +1,152 @@
+"""
+Demographic-segment popularity lists for cold-start users
+
+Offline job: joins ratings_processed.csv with users_processed.csv and ranks
+movies per demographic segment with the same weighted-popularity score the
+API uses (mean rating × log(1 + count)), with each segment's mean shrunk
+towards the movie's global mean so sparse segments are not dominated by a
+handful of ratings.
+
+Segments back off from most to least specific:
+    gender|age|occupation → gender|age|* → *|age|* → gender|*|* → *|*|*
+Segments with fewer than --min-users users are not stored, so lookups fall
+through to the next level. At request time a lookup is one dict access.
+
+    python segments.py --top-n 200 --min-users 30     # writes segment_popularity.npz
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ROOT_DIR
+from data_io import load_table
+
+SEGMENTS_FILE = "segment_popularity.npz"
+
+# MovieLens 1M age buckets (lower bound of each range)
+AGE_BUCKETS = [1, 18, 25, 35, 45, 50, 56]
+
+# Backoff levels, most specific first
+SEGMENT_LEVELS = [
+    ("gender", "age", "occupation"),
+    ("gender", "age"),
+    ("age",),
+    ("gender",),
+    (),
+]
+
+
+def age_bucket(age: int) -> int:
+    """Map a raw age (or a bucket value) to its MovieLens age bucket"""
+    return max(b for b in AGE_BUCKETS if b <= max(age, 1))
+
+
+def segment_key(level: tuple, gender=None, age=None, occupation=None) -> str:
+    """Key like 'M|25|*' for the fields in `level`"""
+    values = {"gender": gender, "age": age, "occupation": occupation}
+    return "|".join(str(values[f]) if f in level else "*" for f in ("gender", "age", "occupation"))
+
+
+def build_segment_lists(ratings: pd.DataFrame, users: pd.DataFrame, top_n: int = 200,
+                        min_users: int = 30, shrinkage: float = 20.0, min_count: int = 5) -> Dict[str, tuple]:
+    """
+    Rank movies for every sufficiently large segment
+
+    Returns:
+        {segment_key: (movie_ids int32, scores float32)}
+    """
+    df = ratings[["user_id", "movie_id", "rating"]].merge(
+        users[["user_id", "gender", "age", "occupation"]], on="user_id", how="inner"
+    )
+    global_stats = df.groupby("movie_id")["rating"].mean().rename("global_mean")
+
+    lists = {}
+    for level in SEGMENT_LEVELS:
+        cols = list(level)
+        if cols:
+            seg_users = users.groupby(cols, observed=True)["user_id"].count()
+            big = seg_users[seg_users >= min_users].index
+            stats = df.groupby(cols + ["movie_id"], observed=True)["rating"].agg(["sum", "count"]).reset_index()
+            stats = stats.set_index(cols).loc[lambda s: s.index.isin(big)].reset_index()
+        else:
+            stats = df.groupby("movie_id")["rating"].agg(["sum", "count"]).reset_index()
+
+        stats = stats[stats["count"] >= min_count].join(global_stats, on="movie_id")
+        shrunk_mean = (stats["sum"] + shrinkage * stats["global_mean"]) / (stats["count"] + shrinkage)
+        stats["score"] = shrunk_mean * np.log1p(stats["count"])
+
+        stats = stats.sort_values("score", ascending=False)
+        groups = stats.groupby(cols, sort=False, observed=True) if cols else [((), stats)]
+        for values, group in groups:
+            values = values if isinstance(values, tuple) else (values,)
+            key = segment_key(level, **dict(zip(cols, values)))
+            head = group.head(top_n)
+            lists[key] = (head["movie_id"].to_numpy(np.int32), head["score"].to_numpy(np.float32))
+
+    return lists
+
+
+def save_segment_lists(path: str, lists: Dict[str, tuple]):
+    keys = sorted(lists)
+    width = max(len(lists[k][0]) for k in keys)
+    items = np.full((len(keys), width), -1, dtype=np.int32)
+    for row, key in enumerate(keys):
+        items[row, :len(lists[key][0])] = lists[key][0]
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, keys=np.array(keys), items=items)
+    os.replace(path + ".tmp", path)
+
+
+class SegmentLists:
+    """O(1) segment lookup with backoff, loaded from segment_popularity.npz"""
+
+    def __init__(self, keys: np.ndarray, items: np.ndarray):
+        self.rows = {str(k): i for i, k in enumerate(keys)}
+        self.items = items
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            return cls(f["keys"], f["items"])
+
+    def lookup(self, gender: Optional[str] = None, age: Optional[int] = None,
+               occupation: Optional[int] = None) -> tuple:
+        """Most specific stored segment for the given hints → (key, movie_ids)"""
+        if age is not None:
+            age = age_bucket(age)
+        given = {"gender": gender, "age": age, "occupation": occupation}
+        for level in SEGMENT_LEVELS:
+            if any(given[f] is None for f in level):
+                continue
+            key = segment_key(level, **given)
+            if key in self.rows:
+                movie_ids = self.items[self.rows[key]]
+                return key, movie_ids[movie_ids >= 0]
+        return None, np.array([], dtype=np.int32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute demographic-segment popularity lists")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory with the processed ratings / users tables")
+    parser.add_argument("--top-n", type=int, default=200, help="Movies kept per segment")
+    parser.add_argument("--min-users", type=int, default=30, help="Smaller segments back off to their parent")
+    parser.add_argument("--shrinkage", type=float, default=20.0, help="Pseudo-count pulling means to the global mean")
+    args = parser.parse_args()
+
+    start = time.time()
+    ratings = load_table(args.root, "ratings_processed", ["user_id", "movie_id", "rating"])
+    users = load_table(args.root, "users_processed")
+    lists = build_segment_lists(ratings, users, args.top_n, args.min_users, args.shrinkage)
+
+    path = os.path.join(args.root, SEGMENTS_FILE)
+    save_segment_lists(path, lists)
+    print(f"✓ Wrote {len(lists):,} segment lists in {time.time() - start:.1f}s → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Cross-worker result cache: a fixed-size hash table in one mmap'ed file
+
+Every uvicorn worker on the host maps the same file (under /dev/shm by
+default, so it lives in memory) and sees the others' entries - one copy of
+each ranked list instead of one per worker, and a list built by one worker
+is a hit for all of them. No external service is involved.
+
+Layout: a header, a table of per-user epoch counters, then `n_sets` sets of
+`ways` fixed-size slots. A key hashes to one set; a put replaces the same
+key, an empty or expired slot, or else the least recently used slot of the
+set, so the file never grows (size-bounded eviction). Entries expire after
+their TTL.
+
+The geometry (sets × ways × slot bytes × epochs) is part of the file name, so
+workers started with other settings map a file of their own: a file that
+another process may have mapped is never resized (that would SIGBUS it).
+
+Concurrency: writers take a per-set fcntl byte-range lock (processes) plus a
+local lock (threads); readers are lock-free and use a per-slot sequence
+number (odd while a write is in progress) to discard torn reads.
+
+Invalidation is by version, never by scanning:
+    bump_users(ids)    on /rate - the user's epoch is part of their keys
+    invalidate_all()   bumps the generation mixed into every key hash; done
+                       automatically when a worker starts with a different model
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"RECCACHE"
+HEADER = struct.Struct("<8sIIIIQ16s")    # magic, n_sets, ways, slot_bytes, n_epochs, generation, model
+HEADER_BYTES = 64
+SLOT = struct.Struct("<IIQdd")           # seq, length, key hash, expires_at, last_used
+GENERATION_OFFSET = struct.calcsize("<8sIIII")
+
+
+def _key_hash(*parts) -> int:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1  # 0 marks an empty slot
+
+
+def pack(arrays: Dict[str, Optional[np.ndarray]], meta: dict = None) -> bytes:
+    """Serialize named arrays (None allowed) plus a small JSON-able dict"""
+    header = {"meta": meta or {}, "arrays": []}
+    buffers = []
+    for name, a in arrays.items():
+        if a is None:
+            header["arrays"].append([name, None, None])
+            continue
+        a = np.ascontiguousarray(a)
+        header["arrays"].append([name, a.dtype.str, list(a.shape)])
+        buffers.append(a.tobytes())
+    raw = json.dumps(header, separators=(",", ":")).encode()
+    return struct.pack("<I", len(raw)) + raw + b"".join(buffers)
+
+
+def unpack(data: bytes) -> Tuple[Dict[str, Optional[np.ndarray]], dict]:
+    """Inverse of pack: ({name: array or None}, meta)"""
+    (n,) = struct.unpack_from("<I", data)
+    header = json.loads(data[4:4 + n])
+    arrays, offset = {}, 4 + n
+    for name, dtype, shape in header["arrays"]:
+        if dtype is None:
+            arrays[name] = None
+            continue
+        a = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        arrays[name] = a
+        offset += a.nbytes
+    return arrays, header["meta"]
+
+
+class SharedCache:
+    """mmap-backed, set-associative cache shared by every process that opens `path`"""
+
+    def __init__(self, path: str, size_bytes: int, slot_bytes: int = 8192, ways: int = 8,
+                 n_epochs: int = 65536, ttl: float = 300.0):
+        self.slot_bytes = slot_bytes
+        self.ways = ways
+        self.n_epochs = n_epochs
+        self.ttl = ttl
+        self.n_sets = max(1, (size_bytes - HEADER_BYTES - 4 * n_epochs) // (ways * slot_bytes))
+        self.path = f"{path}.{self.n_sets}x{ways}x{slot_bytes}x{n_epochs}"
+        self.slots_offset = HEADER_BYTES + 4 * n_epochs
+        self.size = self.slots_offset + self.n_sets * ways * slot_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            expected = (MAGIC, self.n_sets, ways, slot_bytes, n_epochs)
+            file_size = os.fstat(self.fd).st_size
+            if file_size == 0:
+                # New file: size it and write the header before anyone maps it
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, HEADER.pack(*expected, 1, b""), 0)
+            elif file_size != self.size or HEADER.unpack(os.pread(self.fd, HEADER.size, 0))[:5] != expected:
+                raise RuntimeError(f"{self.path} is not a cache file of this geometry; "
+                                   "remove it once no worker is using it")
+            self.mm = mmap.mmap(self.fd, self.size)
+        except BaseException:
+            os.close(self.fd)  # also drops the lock
+            raise
+        fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        self.epochs = np.frombuffer(self.mm, dtype=np.uint32, count=n_epochs, offset=HEADER_BYTES)
+
+    # ── versions ──────────────────────────────────
+    @property
+    def generation(self) -> int:
+        return struct.unpack_from("<Q", self.mm, GENERATION_OFFSET)[0]
+
+    def invalidate_all(self):
+        """Drop every entry at once (they stop matching; slots are reused as they are evicted)"""
+        with self._lock, self._locked(0, HEADER_BYTES):
+            struct.pack_into("<Q", self.mm, GENERATION_OFFSET, self.generation + 1)
+
+    def set_model(self, fingerprint: str):
+        """Invalidate everything if the cache was filled under another model"""
+        tag = fingerprint.encode()[:16].ljust(16, b"\0")
+        with self._lock, self._locked(0, HEADER_BYTES):
+            fields = list(HEADER.unpack_from(self.mm, 0))
+            if fields[6] != tag:
+                fields[5] += 1
+                fields[6] = tag
+                HEADER.pack_into(self.mm, 0, *fields)
+
+    def epoch(self, user_id: int) -> int:
+        """Per-user version (users sharing a counter slot just invalidate each other)"""
+        return int(self.epochs[user_id % self.n_epochs])
+
+    def bump_users(self, user_ids):
+        """Invalidate the cached entries of these users (call after their ratings change)"""
+        slots = np.unique(np.asarray(user_ids, dtype=np.int64) % self.n_epochs)
+        with self._lock, self._locked(HEADER_BYTES, 4 * self.n_epochs):
+            self.epochs[slots] += np.uint32(1)
+
+    # ── entries ───────────────────────────────────
+    def get(self, key: tuple) -> Optional[bytes]:
+        h = _key_hash(self.generation, key)
+        base = self._set_offset(h)
+        now = time.time()
+        for way in range(self.ways):
+            offset = base + way * self.slot_bytes
+            seq, length, slot_key, expires, _ = SLOT.unpack_from(self.mm, offset)
+            if slot_key != h or seq & 1:
+                continue
+            if expires < now:
+                break
+            data = self.mm[offset + SLOT.size:offset + SLOT.size + length]
+            if struct.unpack_from("<I", self.mm, offset)[0] != seq:
+                break  # overwritten while reading
+            struct.pack_into("<d", self.mm, offset + 24, now)  # best-effort LRU touch
+            self.hits += 1
+            return data
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, value: bytes, ttl: float = None) -> bool:
+        """Store value (False if it does not fit in a slot)"""
+        if len(value) > self.slot_bytes - SLOT.size:
+            return False
+        h = _key_hash(self.generation, key)
+        base = self._set_offset(h)
+        now = time.time()
+        with self._lock, self._locked(base, self.ways * self.slot_bytes):
+            slots = [SLOT.unpack_from(self.mm, base + way * self.slot_bytes) for way in range(self.ways)]
+
+            def victim_rank(way):
+                seq, _, slot_key, expires, used = slots[way]
+                if slot_key == h:
+                    return (0, 0)
+                if slot_key == 0 or expires < now:
+                    return (1, 0)
+                return (2, used)
+
+            way = min(range(self.ways), key=victim_rank)
+            offset = base + way * self.slot_bytes
+            writing = ((slots[way][0] + 1) | 1) & 0xFFFFFFFF  # odd: readers skip the slot
+            struct.pack_into("<I", self.mm, offset, writing)
+            self.mm[offset + SLOT.size:offset + SLOT.size + len(value)] = value
+            SLOT.pack_into(self.mm, offset, writing, len(value), h, now + (self.ttl if ttl is None else ttl), now)
+            struct.pack_into("<I", self.mm, offset, (writing + 1) & 0xFFFFFFFF)
+        return True
+
+    def stats(self) -> dict:
+        now = time.time()
+        live = 0
+        for i in range(self.n_sets * self.ways):
+            _, _, slot_key, expires, _ = SLOT.unpack_from(self.mm, self.slots_offset + i * self.slot_bytes)
+            live += slot_key != 0 and expires >= now
+        return {"path": self.path, "size_mb": round(self.size / 2**20, 1), "slots": self.n_sets * self.ways,
+                "live_entries": live, "generation": self.generation, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        del self.epochs
+        self.mm.close()
+        os.close(self.fd)
+
+    def _set_offset(self, h: int) -> int:
+        return self.slots_offset + (h % self.n_sets) * self.ways * self.slot_bytes
+
+    def _locked(self, start: int, length: int):
+        return _RangeLock(self.fd, start, length)
+
+
+class _RangeLock:
+    """fcntl byte-range lock as a context manager (serializes processes, not threads)"""
+
+    def __init__(self, fd: int, start: int, length: int):
+        self.fd, self.start, self.length = fd, start, length
+
+    def __enter__(self):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.start)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
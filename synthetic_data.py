@@ -0,0 +1,223 @@
+"""
+Synthetic scale-up dataset generator
+
+Learns simple marginals from the processed MovieLens files and emits a
+synthetic dataset of any size in the same layout the API loads, so the
+training, evaluation and serving benchmarks can run at 10×–100× scale:
+
+    python synthetic_data.py --users 1000000 --items 100000 --output synthetic_1m
+    MODEL_PATH=synthetic_1m uvicorn app:app
+    MODEL_PATH=synthetic_1m python benchmarks.py --baseline synthetic_1m/benchmark_baseline.json --save-baseline
+
+Learned from the source data:
+    - item popularity: power-law exponent fitted on the rank/count curve
+    - user activity: empirical ratings-per-user distribution (resampled)
+    - rating histogram: ratings are assigned by rank so the histogram matches
+    - genre mix and release years: resampled from movies_metadata.csv
+    - demographics: (gender, age, occupation, zip) rows resampled jointly
+
+Model artifacts (funksvd_model.npz, id_maps.npz) are drawn with the same
+factor/bias scales as the trained model, and synthetic ratings are generated
+from those factors so offline metrics stay meaningful.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_io import TABLES, convert, load_table
+from id_maps import ID_MAPS_FILE, IdMap, save_id_maps
+
+ROOT_DIR = os.getenv("MODEL_PATH", os.path.dirname(os.path.abspath(__file__)))
+
+
+# ────────────────────────────────────────────────
+# Learning marginals
+# ────────────────────────────────────────────────
+def fit_power_law(counts: np.ndarray) -> float:
+    """Fit count ∝ rank^-s on the popularity curve and return s"""
+    counts = np.sort(counts)[::-1].astype(np.float64)
+    counts = counts[counts > 0]
+    ranks = np.arange(1, len(counts) + 1)
+    slope, _ = np.polyfit(np.log(ranks), np.log(counts), 1)
+    return float(-slope)
+
+
+def learn_marginals(source_dir: str) -> dict:
+    """Load the processed tables (and model, if present) and summarize them"""
+    ratings = load_table(source_dir, "ratings_processed", ["user_id", "movie_id", "rating", "timestamp"])
+    users = load_table(source_dir, "users_processed")
+    movies = load_table(source_dir, "movies_metadata")
+
+    rating_values, rating_counts = np.unique(ratings["rating"].to_numpy(), return_counts=True)
+    years = movies["title"].str.extract(r"\((\d{4})\)\s*$")[0].dropna().astype(int).to_numpy()
+
+    marginals = {
+        "popularity_exponent": fit_power_law(ratings["movie_id"].value_counts().to_numpy()),
+        "user_activity": ratings["user_id"].value_counts().to_numpy(),
+        "rating_values": rating_values,
+        "rating_probs": rating_counts / rating_counts.sum(),
+        "genres": movies["genres"].to_numpy(),
+        "years": years,
+        "demographics": users[["gender", "age", "occupation", "zip"]],
+        "timestamp_range": (int(ratings["timestamp"].min()), int(ratings["timestamp"].max())),
+        "global_mean": float(ratings["rating"].mean()),
+    }
+
+    model_path = os.path.join(source_dir, "funksvd_model.npz")
+    if os.path.exists(model_path):
+        loaded = np.load(model_path)
+        marginals.update({
+            "n_factors": int(loaded["user_factors"].shape[1]),
+            "user_factor_std": float(loaded["user_factors"].std()),
+            "item_factor_std": float(loaded["item_factors"].std()),
+            "user_bias": loaded["user_bias"],
+            "item_bias": loaded["item_bias"],
+        })
+    else:
+        marginals.update({
+            "n_factors": 40,
+            "user_factor_std": 0.1,
+            "item_factor_std": 0.1,
+            "user_bias": np.zeros(1),
+            "item_bias": np.zeros(1),
+        })
+    return marginals
+
+
+# ────────────────────────────────────────────────
+# Generation
+# ────────────────────────────────────────────────
+def generate_movies(m: dict, n_items: int, rng: np.random.Generator) -> pd.DataFrame:
+    genres = rng.choice(m["genres"], n_items)
+    years = rng.choice(m["years"], n_items)
+    movie_ids = np.arange(1, n_items + 1, dtype=np.int64)
+    return pd.DataFrame({
+        "movie_id": movie_ids,
+        "title": [f"Synthetic Movie {i} ({y})" for i, y in zip(movie_ids, years)],
+        "genres": genres,
+        "genres_list": [str(g.split("|")) for g in genres],
+    })
+
+
+def generate_users(m: dict, n_users: int, rng: np.random.Generator) -> pd.DataFrame:
+    rows = m["demographics"].iloc[rng.integers(0, len(m["demographics"]), n_users)].reset_index(drop=True)
+    rows.insert(0, "user_id", np.arange(1, n_users + 1, dtype=np.int64))
+    return rows
+
+
+def generate_model(m: dict, n_users: int, n_items: int, rng: np.random.Generator) -> dict:
+    k = m["n_factors"]
+    return {
+        "user_factors": rng.normal(0, m["user_factor_std"], (n_users, k)).astype(np.float32),
+        "item_factors": rng.normal(0, m["item_factor_std"], (n_items, k)).astype(np.float32),
+        "user_bias": rng.choice(m["user_bias"], n_users).astype(np.float32),
+        "item_bias": rng.choice(m["item_bias"], n_items).astype(np.float32),
+        "global_mean": np.float64(m["global_mean"]),
+        "n_factors": np.int64(k),
+    }
+
+
+def assign_ratings(preds: np.ndarray, values: np.ndarray, probs: np.ndarray) -> np.ndarray:
+    """Map predictions to rating values by rank so the output matches the histogram"""
+    order = np.argsort(preds, kind="stable")
+    cum = np.cumsum(probs)
+    quantiles = (np.arange(len(preds)) + 0.5) / len(preds)
+    out = np.empty(len(preds), dtype=np.float32)
+    out[order] = values[np.minimum(np.searchsorted(cum, quantiles), len(values) - 1)]
+    return out
+
+
+def write_ratings(path: str, m: dict, model: dict, n_users: int, n_items: int,
+                  max_per_user: int, rng: np.random.Generator, chunk_users: int = 2000) -> int:
+    """Stream synthetic ratings to CSV in user chunks (bounded memory)"""
+    # Power-law popularity over a random permutation of item indices
+    popularity = np.arange(1, n_items + 1, dtype=np.float64) ** -m["popularity_exponent"]
+    popularity /= popularity.sum()
+    item_rank = rng.permutation(n_items)
+    t_min, t_max = m["timestamp_range"]
+
+    total = 0
+    with open(path, "w") as f:
+        f.write("user_id,movie_id,rating,timestamp\n")
+        for start in range(0, n_users, chunk_users):
+            stop = min(start + chunk_users, n_users)
+            activity = np.minimum(rng.choice(m["user_activity"], stop - start), min(max_per_user, n_items))
+
+            u_idx = np.repeat(np.arange(start, stop), activity)
+            i_idx = item_rank[rng.choice(n_items, size=len(u_idx), p=popularity)]
+
+            # Drop repeated (user, item) draws
+            keys = u_idx.astype(np.int64) * n_items + i_idx
+            _, first = np.unique(keys, return_index=True)
+            u_idx, i_idx = u_idx[first], i_idx[first]
+
+            preds = (model["global_mean"] + model["user_bias"][u_idx] + model["item_bias"][i_idx]
+                     + np.einsum("ij,ij->i", model["user_factors"][u_idx], model["item_factors"][i_idx]))
+            preds += rng.normal(0, 0.5, len(preds))
+
+            chunk = pd.DataFrame({
+                "user_id": u_idx + 1,
+                "movie_id": i_idx + 1,
+                "rating": assign_ratings(preds, m["rating_values"], m["rating_probs"]),
+                "timestamp": rng.integers(t_min, t_max, len(u_idx)),
+            })
+            chunk.to_csv(f, header=False, index=False)
+            total += len(chunk)
+    return total
+
+
+def generate(source_dir: str, output_dir: str, n_users: int, n_items: int,
+             max_per_user: int = 500, seed: int = 42):
+    """Generate a full synthetic artifact directory"""
+    start = time.time()
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Learning marginals from {source_dir}...")
+    m = learn_marginals(source_dir)
+    print(f"✓ Popularity exponent: {m['popularity_exponent']:.3f}, "
+          f"median ratings/user: {int(np.median(m['user_activity']))}")
+
+    movies = generate_movies(m, n_items, rng)
+    movies.to_csv(os.path.join(output_dir, "movies_metadata.csv"), index=False)
+    movies.to_csv(os.path.join(output_dir, "movies_processed.csv"), index=False)
+    generate_users(m, n_users, rng).to_csv(os.path.join(output_dir, "users_processed.csv"), index=False)
+    print(f"✓ Wrote {n_items:,} movies and {n_users:,} users")
+
+    model = generate_model(m, n_users, n_items, rng)
+    np.savez(os.path.join(output_dir, "funksvd_model.npz"), **model)
+
+    user_ids = range(1, n_users + 1)
+    movie_ids = range(1, n_items + 1)
+    save_id_maps(os.path.join(output_dir, ID_MAPS_FILE), IdMap.from_ids(user_ids), IdMap.from_ids(movie_ids))
+    print(f"✓ Wrote model artifacts ({m['n_factors']} factors)")
+
+    total = write_ratings(os.path.join(output_dir, "ratings_processed.csv"), m, model,
+                          n_users, n_items, max_per_user, rng)
+    print(f"✓ Wrote {total:,} ratings in {time.time() - start:.1f}s → {output_dir}")
+
+    # Typed Parquet copies of every table (what the API and offline jobs load)
+    for name in TABLES:
+        convert(output_dir, name)
+    print(f"✓ Converted {len(TABLES)} tables to Parquet")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic scaled-up MovieLens dataset")
+    parser.add_argument("--source", default=ROOT_DIR, help="Directory with the processed CSVs")
+    parser.add_argument("--output", required=True, help="Output artifact directory")
+    parser.add_argument("--users", type=int, default=60400, help="Number of synthetic users")
+    parser.add_argument("--items", type=int, default=37060, help="Number of synthetic movies")
+    parser.add_argument("--max-ratings-per-user", type=int, default=500, help="Cap on sampled user activity")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    generate(args.source, args.output, args.users, args.items, args.max_ratings_per_user, args.seed)
+
+
+if __name__ == "__main__":
+    main()
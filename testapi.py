@@ -140,6 +140,97 @@ def test_recommendations_invalid_n():
     print_response("Test 9: Invalid n Parameter (Should Fail)", response)
     return response.status_code == 400
 
+def test_movie_search():
+    """Test 10: Search movies by title (typo tolerant)"""
+    response = requests.get(f"{BASE_URL}/movies/search", params={"q": "toy stroy", "n": 5})
+    print_response("Test 10: Movie Search", response)
+    
+    if response.status_code == 200:
+        data = response.json()
+        print(f"✓ Got {data['count']} results for '{data['query']}'")
+        return data['count'] > 0
+    return False
+
+def test_similar_movies():
+    """Test 11: Get movies similar to a given movie"""
+    response = requests.get(f"{BASE_URL}/movies/1/similar?n=5")
+    print_response("Test 11: Similar Movies", response)
+    
+    if response.status_code == 200:
+        data = response.json()
+        print(f"✓ Got {data['count']} movies similar to {data['title']}")
+        return data['count'] > 0
+    return False
+
+def test_bulk_ratings():
+    """Test 12: Bulk-upload NDJSON ratings (invalid rows are skipped and reported)"""
+    rows = [
+        {"user_id": 66666, "movie_id": 1, "rating": 4.0},
+        {"user_id": 66666, "movie_id": 2, "rating": 3.5},
+        {"user_id": 66666, "movie_id": 3, "rating": 5.0},
+        {"user_id": 66666, "movie_id": 4, "rating": 7.0},  # Invalid: > 5.0
+    ]
+    body = "\n".join(json.dumps(row) for row in rows) + "\n"
+    
+    response = requests.post(
+        f"{BASE_URL}/ratings/bulk", data=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    print_response("Test 12: Bulk Ratings Upload", response)
+    
+    if response.status_code == 200:
+        data = response.json()
+        print(f"✓ Accepted {data['rows_accepted']}, rejected {data['rows_rejected']}")
+        return data['rows_accepted'] == 3 and data['rows_rejected'] == 1
+    return False
+
+def test_export_ratings():
+    """Test 13: Export stored ratings as CSV"""
+    response = requests.get(f"{BASE_URL}/export/ratings?format=csv&limit=5")
+    print(f"\n{'='*60}")
+    print("🔍 Test 13: Export Ratings (CSV)")
+    print(f"{'='*60}")
+    print(f"Status Code: {response.status_code}")
+    print(f"Response:\n{response.text}")
+    
+    if response.status_code == 200:
+        lines = response.text.splitlines()
+        print(f"✓ Got {len(lines) - 1} rows")
+        return lines[0] == "user_id,movie_id,rating"
+    return False
+
+def test_export_recommendations():
+    """Test 14: Export recommendations for a batch of users as NDJSON"""
+    response = requests.get(f"{BASE_URL}/export/recommendations?user_ids=1,2&n=3")
+    print(f"\n{'='*60}")
+    print("🔍 Test 14: Export Recommendations (NDJSON)")
+    print(f"{'='*60}")
+    print(f"Status Code: {response.status_code}")
+    print(f"Response:\n{response.text}")
+    
+    if response.status_code == 200:
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        print(f"✓ Got {len(rows)} rows")
+        return len(rows) == 6 and {row['user_id'] for row in rows} == {1, 2}
+    return False
+
+def test_recommendations_pagination():
+    """Test 15: Page through recommendations with a cursor"""
+    first = requests.get(f"{BASE_URL}/recommend?user_id=77777&n=5&offset=0")
+    print_response("Test 15: Recommendations - First Page", first)
+    if first.status_code != 200 or not first.json()['next_cursor']:
+        return False
+    
+    cursor = first.json()['next_cursor']
+    second = requests.get(f"{BASE_URL}/recommend", params={"user_id": 77777, "n": 5, "cursor": cursor})
+    print_response("Test 15: Recommendations - Second Page", second)
+    
+    if second.status_code == 200:
+        first_ids = {rec['movie_id'] for rec in first.json()['recommendations']}
+        second_ids = {rec['movie_id'] for rec in second.json()['recommendations']}
+        print(f"✓ Second page starts at offset {second.json()['offset']}")
+        return second.json()['offset'] == 5 and not first_ids & second_ids
+    return False
+
 def run_all_tests():
     """Run all tests and report results"""
     print("\n" + "🎬"*30)
@@ -156,6 +247,12 @@ def run_all_tests():
         ("Recommendations (Personalized)", test_recommendations_personalized),
         ("User Statistics", test_user_stats),
         ("Invalid n Parameter", test_recommendations_invalid_n),
+        ("Movie Search", test_movie_search),
+        ("Similar Movies", test_similar_movies),
+        ("Bulk Ratings Upload", test_bulk_ratings),
+        ("Export Ratings", test_export_ratings),
+        ("Export Recommendations", test_export_recommendations),
+        ("Recommendations (Pagination)", test_recommendations_pagination),
     ]
     
     results = []
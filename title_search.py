@@ -0,0 +1,108 @@
+"""
+In-memory trigram index for movie title search
+
+Titles are normalized (lowercase, no punctuation, release year dropped,
+trailing articles like "Matrix, The" moved to the front) and split into
+padded character trigrams. Each trigram maps to a sorted int32 array of
+movie positions, so a query only touches the postings of its own trigrams.
+
+Ranking blends trigram similarity (Dice coefficient, tolerant to typos),
+a prefix/substring bonus and log-scaled popularity.
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+YEAR_SUFFIX = re.compile(r"\s*\(\d{4}\)\s*$")
+TRAILING_ARTICLE = re.compile(r"^(.*), (the|a|an|les|la|le|il|el|das|der|die)$")
+NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+
+
+def normalize_title(title: str) -> str:
+    """'Matrix, The (1999)' → 'the matrix'"""
+    text = YEAR_SUFFIX.sub("", str(title)).strip().lower()
+    match = TRAILING_ARTICLE.match(text)
+    if match:
+        text = f"{match.group(2)} {match.group(1)}"
+    return " ".join(NON_ALNUM.sub(" ", text).split())
+
+
+def trigrams(text: str) -> set:
+    """Padded character trigrams of each word ('cat' → '  c', ' ca', 'cat', 'at ')"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TitleSearchIndex:
+    """Inverted trigram index over titles with popularity-aware ranking"""
+
+    def __init__(self, movie_ids: np.ndarray, titles: List[str], genres: List[str], popularity: np.ndarray,
+                 popularity_weight: float = 0.15, min_similarity: float = 0.25):
+        self.movie_ids = movie_ids
+        self.titles = titles
+        self.genres = genres
+        self.normalized = [normalize_title(t) for t in titles]
+        self.popularity_weight = popularity_weight
+        self.min_similarity = min_similarity
+
+        log_pop = np.log1p(popularity.astype(np.float64))
+        self.popularity = (log_pop / log_pop.max()) if log_pop.max() > 0 else log_pop
+
+        postings = defaultdict(list)
+        self.gram_counts = np.zeros(len(titles), dtype=np.int32)
+        for pos, text in enumerate(self.normalized):
+            grams = trigrams(text)
+            self.gram_counts[pos] = len(grams)
+            for g in grams:
+                postings[g].append(pos)
+        self.postings: Dict[str, np.ndarray] = {g: np.array(p, dtype=np.int32) for g, p in postings.items()}
+
+    @classmethod
+    def from_movies(cls, movies: pd.DataFrame, rating_counts: Dict[int, int], **kwargs):
+        movie_ids = movies["movie_id"].to_numpy()
+        popularity = np.array([rating_counts.get(int(m), 0) for m in movie_ids])
+        return cls(movie_ids, movies["title"].tolist(), movies["genres"].tolist(), popularity, **kwargs)
+
+    def search(self, query: str, n: int = 10) -> List[dict]:
+        """Top-n matches for `query` as dicts with movie_id, title, genres and score"""
+        text = normalize_title(query)
+        grams = trigrams(text)
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        if not lists:
+            return []
+
+        positions, shared = np.unique(np.concatenate(lists), return_counts=True)
+        similarity = 2.0 * shared / (len(grams) + self.gram_counts[positions])
+
+        keep = similarity >= self.min_similarity
+        positions, similarity = positions[keep], similarity[keep]
+        if not len(positions):
+            return []
+
+        # Only the best few candidates get the (Python-level) substring check
+        k = min(len(positions), n * 5)
+        top = np.argpartition(-similarity, k - 1)[:k]
+        results = []
+        for pos, sim in zip(positions[top].tolist(), similarity[top].tolist()):
+            title = self.normalized[pos]
+            bonus = 0.3 if title.startswith(text) else 0.15 if text in title else 0.0
+            score = (sim + bonus) * (1 + self.popularity_weight * self.popularity[pos])
+            results.append((score, pos))
+
+        results.sort(reverse=True)
+        return [
+            {
+                "movie_id": int(self.movie_ids[pos]),
+                "title": self.titles[pos],
+                "genres": self.genres[pos],
+                "score": round(score, 4),
+            }
+            for score, pos in results[:n]
+        ]
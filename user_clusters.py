@@ -0,0 +1,148 @@
+"""
+User-cluster approximate serving: one precomputed ranked list per cluster
+
+Offline job: k-means over user_factors, then for every centroid the top-N
+items by item_bias + centroid·item. At request time a user is mapped to their
+cluster (a stored assignment, or the nearest centroid for a folded-in
+vector) and served the cluster list after exclusions - no scoring at all.
+The API uses it when asked (engine=cluster), automatically under load, and
+for users outside the training data, whose vector is folded in from their
+stored ratings (fold_in).
+
+Quality vs exact scoring is measured on a user sample and printed:
+    python user_clusters.py --clusters 256 --top-n 500      # writes user_clusters.npz
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ann_index import kmeans
+from artifacts import ROOT_DIR, load_model, model_fingerprint
+
+USER_CLUSTERS_FILE = "user_clusters.npz"
+
+
+class UserClusterLists:
+    """Cluster centroids, per-user assignments and per-cluster ranked item lists"""
+
+    def __init__(self, centroids, assignments, lists, partial_scores, fingerprint=""):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.lists = lists
+        self.partial_scores = partial_scores
+        self.fingerprint = str(fingerprint)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, model: dict, n_clusters: int = 256, top_n: int = 500, n_iter: int = 20, seed: int = 42):
+        user_factors = model["user_factors"].astype(np.float32)
+        n_clusters = min(n_clusters, len(user_factors))
+        centroids, assignments = kmeans(user_factors, n_clusters, n_iter, seed)
+
+        partial = model["item_bias"][None, :] + centroids @ model["item_factors"].T
+        top_n = min(top_n, partial.shape[1])
+        top = np.argpartition(-partial, top_n - 1, axis=1)[:, :top_n]
+        top_partial = np.take_along_axis(partial, top, axis=1)
+        order = np.argsort(-top_partial, axis=1)
+        fingerprint = model_fingerprint(model["user_factors"], model["user_bias"],
+                                        model["item_factors"], model["item_bias"])
+        return cls(centroids, assignments,
+                   np.take_along_axis(top, order, axis=1).astype(np.int32),
+                   np.take_along_axis(top_partial, order, axis=1).astype(np.float16),
+                   fingerprint)
+
+    def save(self, path: str):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments, lists=self.lists,
+                     partial_scores=self.partial_scores, fingerprint=self.fingerprint)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            return cls(f["centroids"], f["assignments"], f["lists"], f["partial_scores"], str(f["fingerprint"]))
+
+    def nearest(self, user_vector: np.ndarray) -> int:
+        """Cluster of an arbitrary (e.g. folded-in) user vector"""
+        return int(np.argmin(((self.centroids - user_vector) ** 2).sum(axis=1)))
+
+    def search(self, cluster: int, k: int, exclude: np.ndarray = None, allowed: np.ndarray = None) -> tuple:
+        """Top-k (item indices, partial scores) of a cluster list, best first, after exclusions"""
+        items = self.lists[cluster]
+        keep = np.ones(len(items), dtype=bool)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(items, exclude)
+        if allowed is not None:
+            keep &= allowed[items]
+        return items[keep][:k], self.partial_scores[cluster][keep][:k].astype(np.float64)
+
+    def memory_bytes(self) -> int:
+        return sum(a.nbytes for a in (self.centroids, self.assignments, self.lists, self.partial_scores))
+
+
+def fold_in(item_factors: np.ndarray, item_bias: np.ndarray, global_mean: float, item_idx: np.ndarray,
+            ratings: np.ndarray, reg: float = 10.0) -> tuple:
+    """
+    (user_vector, user_bias) for a user outside the training data
+
+    Ridge least squares of rating - global_mean - item_bias on the rated items'
+    factors (plus a bias column), with the item side of the model held fixed.
+    The default reg is strong because a new user has a handful of ratings
+    against n_factors + 1 unknowns.
+    """
+    q = np.hstack([item_factors[item_idx], np.ones((len(item_idx), 1))])
+    target = ratings - global_mean - item_bias[item_idx]
+    solution = np.linalg.solve(q.T @ q + reg * np.eye(q.shape[1]), q.T @ target)
+    return solution[:-1], float(solution[-1])
+
+
+def quality_vs_exact(clusters: UserClusterLists, model: dict, k: int = 10, n_users: int = 500, seed: int = 0) -> dict:
+    """
+    Compare cluster lists with exact per-user top-k on a user sample
+
+    Returns:
+        recall@k (overlap with the exact top-k) and the mean predicted-rating
+        loss of the served top-k relative to the exact top-k
+    """
+    rng = np.random.default_rng(seed)
+    users = rng.choice(len(model["user_factors"]), min(n_users, len(model["user_factors"])), replace=False)
+    recalls, losses = [], []
+    for u in users:
+        exact = model["item_bias"] + model["item_factors"] @ model["user_factors"][u]
+        truth = np.argpartition(-exact, k - 1)[:k]
+        served, _ = clusters.search(int(clusters.assignments[u]), k)
+        recalls.append(len(np.intersect1d(truth, served)) / k)
+        losses.append(exact[truth].mean() - exact[served].mean())
+    return {f"recall@{k}": float(np.mean(recalls)), "rating_loss": float(np.mean(losses))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-cluster ranked lists over user factors")
+    parser.add_argument("--root", default=ROOT_DIR, help="Directory containing funksvd_model.npz")
+    parser.add_argument("--clusters", type=int, default=256, help="Number of user clusters")
+    parser.add_argument("--top-n", type=int, default=500, help="Items kept per cluster list")
+    parser.add_argument("--iters", type=int, default=20, help="k-means iterations")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for the quality report")
+    args = parser.parse_args()
+
+    model = load_model(args.root)
+    start = time.time()
+    clusters = UserClusterLists.build(model, args.clusters, args.top_n, args.iters)
+    path = os.path.join(args.root, USER_CLUSTERS_FILE)
+    clusters.save(path)
+    print(f"✓ Built {clusters.n_clusters} cluster lists (top-{clusters.lists.shape[1]}) "
+          f"in {time.time() - start:.1f}s → {path}")
+
+    quality = quality_vs_exact(clusters, model, args.k)
+    print(f"  recall@{args.k} vs exact: {quality[f'recall@{args.k}']:.4f}  "
+          f"mean predicted-rating loss of top-{args.k}: {quality['rating_loss']:.4f}")
+
+
+if __name__ == "__main__":
+    main()